@@ -0,0 +1,58 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class ExportView(GenericAPIView):
+    """
+    Streams the filtered queryset as CSV or NDJSON (?output=csv|ndjson).
+    Subclasses set `columns` and `filename` and yield plain dicts from
+    get_rows(); rows are read with .iterator() so memory stays flat.
+    """
+    columns = ()
+    filename = 'export'
+
+    def get_rows(self, queryset):
+        return queryset.values(*self.columns).iterator(chunk_size=CHUNK_SIZE)
+
+    def csv_row(self, row):
+        return [row[column] for column in self.columns]
+
+    def csv_lines(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for row in rows:
+            yield writer.writerow(self.csv_row(row))
+
+    def ndjson_lines(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        if output not in CONTENT_TYPES:
+            return Response({"error": f"output must be one of {', '.join(CONTENT_TYPES)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = self.get_rows(self.filter_queryset(self.get_queryset()))
+        lines = self.csv_lines(rows) if output == 'csv' else self.ndjson_lines(rows)
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{output}"'
+        return response
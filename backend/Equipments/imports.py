@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+
+from rest_framework import serializers
+
+from . import search
+from .models import Branch, Equipment
+from .serializers import EquipmentImportRowSerializer
+
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_ROWS = 20000
+
+
+def read_rows(request):
+    """Rows from an uploaded CSV/JSON `file`, or a JSON list (or {"rows": [...]}) body."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        if upload.name.lower().endswith('.json'):
+            try:
+                rows = json.load(upload)
+            except (ValueError, UnicodeDecodeError):
+                raise serializers.ValidationError("The file is not valid UTF-8 JSON.")
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig'))
+            try:
+                # blank CSV cells mean "not given", not an empty value
+                rows = [{k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()} for row in reader]
+            except (ValueError, UnicodeDecodeError, csv.Error):
+                raise serializers.ValidationError("The file is not a valid UTF-8 CSV.")
+    else:
+        rows = request.data.get('rows') if isinstance(request.data, dict) else request.data
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise serializers.ValidationError("Upload a CSV/JSON file or send a JSON list of rows.")
+    if not rows:
+        raise serializers.ValidationError("No rows to import.")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise serializers.ValidationError(f"At most {MAX_IMPORT_ROWS} rows can be imported at once.")
+    return rows
+
+
+def validate_rows(rows):
+    """
+    Validate rows chunk by chunk. Field checks run per row in Python;
+    uniqueness and branch lookups are one `__in` query per chunk.
+    Returns (valid rows, per-row errors), rows numbered from 1.
+    """
+    valid = []
+    errors = []
+    seen_tags = {}
+    seen_serials = {}
+
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        cleaned = {}
+        row_errors = {}
+        for number, row in enumerate(rows[start:start + IMPORT_CHUNK_SIZE], start=start + 1):
+            serializer = EquipmentImportRowSerializer(data=row)
+            if serializer.is_valid():
+                cleaned[number] = serializer.validated_data
+            else:
+                row_errors[number] = serializer.errors
+
+        tags = {data['tag_number'] for data in cleaned.values()}
+        serials = {data['serial_number'] for data in cleaned.values()}
+        taken_tags = set(Equipment.objects.filter(tag_number__in=tags).values_list('tag_number', flat=True))
+        taken_serials = set(Equipment.objects.filter(serial_number__in=serials).values_list('serial_number', flat=True))
+        branch_ids = set(Branch.objects.filter(
+            id__in={data['branch'] for data in cleaned.values() if 'branch' in data}
+        ).values_list('id', flat=True))
+        branch_names = dict(Branch.objects.filter(
+            name__in={data['branch_name'] for data in cleaned.values() if 'branch' not in data}
+        ).values_list('name', 'id'))
+
+        for number, data in cleaned.items():
+            problems = {}
+            tag, serial = data['tag_number'], data['serial_number']
+            if tag in taken_tags:
+                problems['tag_number'] = ["equipment with this tag number already exists."]
+            elif tag in seen_tags:
+                problems['tag_number'] = [f"Duplicate of row {seen_tags[tag]}."]
+            if serial in taken_serials:
+                problems['serial_number'] = ["equipment with this serial number already exists."]
+            elif serial in seen_serials:
+                problems['serial_number'] = [f"Duplicate of row {seen_serials[serial]}."]
+
+            if 'branch' in data:
+                branch_id = data['branch'] if data['branch'] in branch_ids else None
+                if branch_id is None:
+                    problems['branch'] = [f"Branch {data['branch']} does not exist."]
+            else:
+                branch_id = branch_names.get(data['branch_name'])
+                if branch_id is None:
+                    problems['branch_name'] = [f"Branch '{data['branch_name']}' does not exist."]
+
+            if problems:
+                row_errors[number] = problems
+                continue
+            seen_tags[tag] = number
+            seen_serials[serial] = number
+            valid.append({
+                'tag_number': tag,
+                'serial_number': serial,
+                'item_category': data['item_category'],
+                'status': data['status'],
+                'remark': data['remark'],
+                'branch_id': branch_id,
+            })
+
+        errors.extend({'row': number, 'errors': row_errors[number]} for number in sorted(row_errors))
+    return valid, errors
+
+
+def create_equipment(valid_rows, user):
+    created = Equipment.objects.bulk_create(
+        [Equipment(added_by=user, **row) for row in valid_rows],
+        batch_size=IMPORT_CHUNK_SIZE,
+    )
+    # bulk_create sends no post_save
+    search.index_equipment((e.pk for e in created), new=True)
+    return created
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Equipments import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the equipment and repair full-text search index from the source tables."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.create_schema()
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
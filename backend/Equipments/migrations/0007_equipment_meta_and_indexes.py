@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0006_alter_equipment_item_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='equipment',
+            options={'ordering': ['-created_at'], 'verbose_name': 'Equipment', 'verbose_name_plural': 'Equipments'},
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['-created_at', '-id'], name='equipment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['branch', 'status', 'item_category'], name='equipment_branch_status_idx'),
+        ),
+    ]
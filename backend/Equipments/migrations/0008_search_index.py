@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from Equipments import search
+    search.create_schema()
+    search.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    from Equipments import search
+    search.drop_schema()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0007_equipment_meta_and_indexes'),
+        ('Repairs', '0007_hot_path_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
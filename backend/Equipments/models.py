@@ -55,8 +55,14 @@ class Equipment(models.Model):
     def __str__(self):
         return f"{self.tag_number} - {self.item_type}"
 
-class Meta:
-    verbose_name_plural = 'Equipments'
-    verbose_name = 'Equipment'
-    ordering = ['-created_at']
+    class Meta:
+        verbose_name_plural = 'Equipments'
+        verbose_name = 'Equipment'
+        ordering = ['-created_at']
+        indexes = [
+            # EquipmentListView cursor pages and exports
+            models.Index(fields=['-created_at', '-id'], name='equipment_created_idx'),
+            # EquipmentListView filterset_fields
+            models.Index(fields=['branch', 'status', 'item_category'], name='equipment_branch_status_idx'),
+        ]
 
@@ -0,0 +1,146 @@
+import operator
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from functools import reduce
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+# position: the value of every ordering field of the row the page starts after
+Cursor = namedtuple('Cursor', 'reverse position')
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+def after(ordering, position):
+    """The rows that come strictly after `position` in `ordering`."""
+    conditions, equal = [], Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        conditions.append(equal & Q(**{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value}))
+        equal &= Q(**{name: value})
+    first = ordering[0]
+    # the range on the first field alone lets the database seek with its index
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+    return bound & reduce(operator.or_, conditions)
+
+
+class EquipmentCursorPagination(CursorPagination):
+    """
+    Keyset pagination. The ordering always ends in id, the cursor holds
+    the last row's value of every ordering field, and the next page
+    starts strictly after that row, however many rows share a status or
+    created_at. (DRF's CursorPagination keeps only the first field and
+    steps over ties with an offset, which it caps.)
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(
+            field.replace('pk', 'id') if field.lstrip('-') == 'pk' else field
+            for field in super().get_ordering(request, queryset, view)
+        )
+        for i, field in enumerate(ordering):
+            if field.lstrip('-') == 'id':
+                return ordering[:i + 1]
+        return ordering + ('-id' if ordering[0].startswith('-') else 'id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        query = self.page_query(queryset, request, view)
+        return None if query is None else self.set_page(list(query))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() that reads the page with the async ORM."""
+        query = self.page_query(queryset, request, view)
+        return None if query is None else self.set_page([row async for row in query])
+
+    def page_query(self, queryset, request, view=None):
+        """The unevaluated query for the page the request asks for, which set_page() takes the rows of."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request) or Cursor(reverse=False, position=None)
+
+        # a previous page is read backwards from the first row of the page the cursor came from
+        ordering = reverse_ordering(self.ordering) if self.cursor.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor.position is not None:
+            try:
+                queryset = queryset.filter(after(ordering, self.cursor.position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        # one row past the page tells whether another follows
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.page = list(results[:self.page_size])
+        more = len(results) > len(self.page)
+        started = self.cursor.position is not None
+
+        if self.cursor.reverse:
+            # the query ran in reverse, so put the rows back in order
+            self.page.reverse()
+            self.has_next, self.has_previous = started, more
+        else:
+            self.has_next, self.has_previous = more, started
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def position(self, row):
+        return [
+            str(row[field] if isinstance(row, dict) else getattr(row, field))
+            for field in (field.lstrip('-') for field in self.ordering)
+        ]
+
+    # an empty page (the rows around the cursor were deleted) links to the
+    # first or last page, which a cursor without a position stands for
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(reverse=False, position=self.position(self.page[-1]) if self.page else None))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(reverse=True, position=self.position(self.page[0]) if self.page else None))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode(), keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        position = tokens.get('p')
+        if position is not None and len(position) != len(self.ordering):
+            # made for another ordering
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        if cursor.position is not None:
+            tokens['p'] = cursor.position
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
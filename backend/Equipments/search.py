@@ -0,0 +1,269 @@
+"""
+Full-text search over equipment and repair notes.
+
+The index lives in two derived tables, search_equipment and search_repair,
+keyed by the equipment / repair id. On SQLite they are FTS5 virtual tables
+ranked with bm25(); on PostgreSQL they hold a weighted tsvector with a GIN
+index, ranked with ts_rank_cd(). Rows are refreshed from post_save and
+post_delete signals (see signals.py), bulk inserts call index_equipment()
+themselves, and rebuild() recreates everything from the source tables.
+"""
+import re
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Equipment
+
+MAX_TERMS = 8
+INDEX_CHUNK_SIZE = 500
+PREFIX_LOOKUP_DIGITS = 10
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_equipment USING fts5(
+        tag_number, serial_number, item_category, branch, remark, prefix='2 3 4')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_repair USING fts5(report, remark, prefix='2 3 4')""",
+]
+POSTGRES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS search_equipment (id bigint PRIMARY KEY, document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS search_equipment_document ON search_equipment USING GIN (document)",
+    "CREATE TABLE IF NOT EXISTS search_repair (id bigint PRIMARY KEY, document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS search_repair_document ON search_repair USING GIN (document)",
+    # lets serial_number LIKE 'prefix%' use an index whatever the collation
+    'CREATE INDEX IF NOT EXISTS equipment_serial_prefix ON "Equipments_equipment" (serial_number varchar_pattern_ops)',
+]
+DROP_SCHEMA = [
+    "DROP TABLE IF EXISTS search_equipment",
+    "DROP TABLE IF EXISTS search_repair",
+    "DROP INDEX IF EXISTS equipment_serial_prefix",
+]
+
+# column weights, most significant first
+SQLITE_EQUIPMENT_RANK = 'bm25(search_equipment, 10.0, 10.0, 3.0, 3.0, 1.0)'
+SQLITE_REPAIR_RANK = 'bm25(search_repair, 2.0, 1.0)'
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def id_filter(alias, ids):
+    if ids is None:
+        return '', []
+    return f"WHERE {alias}.id IN ({', '.join(['%s'] * len(ids))})", ids
+
+
+def equipment_source(ids=None):
+    equipment, branch = table(Equipment), table(apps.get_model('Equipments', 'Branch'))
+    if is_postgres():
+        document = (
+            "setweight(to_tsvector('simple', e.tag_number::text || ' ' || e.serial_number), 'A') || "
+            "setweight(to_tsvector('simple', e.item_category || ' ' || b.name), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(e.remark, '')), 'C')"
+        )
+        columns = f"e.id, {document}"
+    else:
+        columns = "e.id, e.tag_number, e.serial_number, e.item_category, b.name, coalesce(e.remark, '')"
+    where, params = id_filter('e', ids)
+    return f"SELECT {columns} FROM {equipment} e JOIN {branch} b ON b.id = e.branch_id {where}", params
+
+
+def repair_source(ids=None):
+    repair = table(apps.get_model('Repairs', 'Repair'))
+    if is_postgres():
+        document = (
+            "setweight(to_tsvector('simple', coalesce(r.report, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(r.remark, '')), 'B')"
+        )
+        columns = f"r.id, {document}"
+    else:
+        columns = "r.id, coalesce(r.report, ''), coalesce(r.remark, '')"
+    where, params = id_filter('r', ids)
+    return f"SELECT {columns} FROM {repair} r {where}", params
+
+
+def create_schema():
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_SCHEMA if is_postgres() else SQLITE_SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_schema():
+    with connection.cursor() as cursor:
+        for statement in DROP_SCHEMA:
+            cursor.execute(statement)
+
+
+def _reindex(index, source, ids=None, new=False):
+    """
+    Replace the index rows for `ids`, or for everything when ids is None.
+    `new` rows have nothing to replace.
+    """
+    select, params = source(ids)
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(f"DELETE FROM {index}")
+        elif not new:
+            _unindex(index, ids, cursor)
+        cursor.execute(f"INSERT INTO {index} ({key_column()}, {columns_of(index)}) {select}", params)
+
+
+def key_column():
+    return 'id' if is_postgres() else 'rowid'
+
+
+def columns_of(index):
+    if is_postgres():
+        return 'document'
+    if index == 'search_equipment':
+        return 'tag_number, serial_number, item_category, branch, remark'
+    return 'report, remark'
+
+
+def _unindex(index, ids, cursor=None):
+    ids = list(ids)
+    if not ids:
+        return
+    sql = f"DELETE FROM {index} WHERE {key_column()} IN ({', '.join(['%s'] * len(ids))})"
+    if cursor is not None:
+        cursor.execute(sql, ids)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ids)
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), INDEX_CHUNK_SIZE):
+        yield ids[start:start + INDEX_CHUNK_SIZE]
+
+
+def index_equipment(ids, new=False):
+    for chunk in chunks(ids):
+        _reindex('search_equipment', equipment_source, chunk, new)
+
+
+def index_repairs(ids, new=False):
+    for chunk in chunks(ids):
+        _reindex('search_repair', repair_source, chunk, new)
+
+
+def unindex_equipment(ids):
+    _unindex('search_equipment', ids)
+
+
+def unindex_repairs(ids):
+    _unindex('search_repair', ids)
+
+
+def rebuild():
+    _reindex('search_equipment', equipment_source)
+    _reindex('search_repair', repair_source)
+
+
+def terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+def match_expression(words):
+    """Every word must match, each as a prefix so partial input still finds results."""
+    if is_postgres():
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching(index, words):
+    """(sql, params) selecting the ids in `index` that match every word."""
+    if is_postgres():
+        return f"SELECT id FROM {index} WHERE document @@ to_tsquery('simple', %s)", [match_expression(words)]
+    return f"SELECT rowid FROM {index} WHERE {index} MATCH %s", [match_expression(words)]
+
+
+def ranked(index, words, limit):
+    """[(id, rank)] best first."""
+    if not words:
+        return []
+    if is_postgres():
+        sql = (f"SELECT id, ts_rank_cd(document, query) AS score "
+               f"FROM {index}, to_tsquery('simple', %s) query WHERE document @@ query "
+               f"ORDER BY score DESC, id LIMIT %s")
+    else:
+        rank = SQLITE_EQUIPMENT_RANK if index == 'search_equipment' else SQLITE_REPAIR_RANK
+        # bm25 is lower-is-better; negate it so both backends rank higher-is-better
+        sql = (f"SELECT rowid, -{rank} AS score FROM {index} WHERE {index} MATCH %s "
+               f"ORDER BY score DESC, rowid LIMIT %s")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match_expression(words), limit])
+        return cursor.fetchall()
+
+
+def search(text, limit=20):
+    """Ranked equipment and repairs matching `text`, in four queries."""
+    words = terms(text)
+    Repair = apps.get_model('Repairs', 'Repair')
+
+    equipment_ranks = dict(ranked('search_equipment', words, limit))
+    equipment = Equipment.objects.filter(pk__in=equipment_ranks).values(
+        'id', 'tag_number', 'serial_number', 'item_category', 'status', 'branch_id', 'branch__name',
+    )
+    repair_ranks = dict(ranked('search_repair', words, limit))
+    repairs = Repair.objects.filter(pk__in=repair_ranks).values(
+        'id', 'status', 'remark', 'report', 'created_at', 'completed_at',
+        'equipment_id', 'equipment__tag_number', 'equipment__serial_number',
+    )
+
+    def with_rank(rows, ranks):
+        rows = [{**row, 'rank': round(ranks[row['id']], 4)} for row in rows]
+        return sorted(rows, key=lambda row: (-row['rank'], row['id']))
+
+    return {
+        'equipment': with_rank(equipment, equipment_ranks),
+        'repairs': with_rank(repairs, repair_ranks),
+    }
+
+
+def prefix_lookup(text, limit=20):
+    """
+    Equipment whose tag number or serial number starts with `text`, for
+    barcode scanners and type-ahead. Each branch of the OR is a range scan
+    on the unique index of that column.
+    """
+    text = text.strip()
+    if not text:
+        return Equipment.objects.none()
+
+    query = Q()
+    if text.isdigit() and len(text) <= PREFIX_LOOKUP_DIGITS:
+        # "12" is 12, 120-129, 1200-1299, ... as integer ranges
+        start = int(text)
+        query |= Q(tag_number=start)
+        for digits in range(1, PREFIX_LOOKUP_DIGITS - len(text) + 1):
+            scale = 10 ** digits
+            query |= Q(tag_number__gte=start * scale, tag_number__lt=(start + 1) * scale)
+
+    if is_postgres():
+        # served by the equipment_serial_prefix index
+        query |= Q(serial_number__startswith=text)
+    else:
+        # SQLite's LIKE is case-insensitive and skips the index; a binary range does not
+        query |= Q(serial_number__gte=text, serial_number__lt=text + '\U0010ffff')
+
+    return Equipment.objects.filter(query).select_related('branch').order_by('tag_number')[:limit]
+
+
+class FullTextSearchFilter(SearchFilter):
+    """SearchFilter backed by the search_equipment index instead of icontains scans."""
+
+    def filter_queryset(self, request, queryset, view):
+        words = terms(' '.join(self.get_search_terms(request)))
+        if not words:
+            return queryset
+        sql, params = matching('search_equipment', words)
+        return queryset.filter(pk__in=RawSQL(sql, params))
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from config.rows import RowSerializer, format_datetime
 from .models import Equipment
 from .models import Branch
 
@@ -21,4 +22,45 @@ class EquipmentSerializer(serializers.ModelSerializer):
 
     def get_status_display(self, obj):
      return obj.get_status_display()
-    
+
+
+class EquipmentRowSerializer(RowSerializer):
+    """EquipmentSerializer from .values() rows."""
+    values = (
+        'id', 'branch__name', 'added_by__first_name', 'tag_number', 'serial_number', 'item_category',
+        'status', 'remark', 'created_at', 'branch', 'added_by',
+    )
+    # get_status_display() falls back to the stored value, as the 'Working' default is not a key
+    STATUS_LABELS = dict(Equipment.STATUS_CHOICES)
+
+    @classmethod
+    def item(cls, row):
+        item = {'id': row['id'], 'branch_name': row['branch__name']}
+        # EquipmentSerializer leaves added_by_name out when nobody is recorded
+        if row['added_by'] is not None:
+            item['added_by_name'] = row['added_by__first_name']
+        item['status_display'] = cls.STATUS_LABELS.get(row['status'], row['status'])
+        item['tag_number'] = row['tag_number']
+        item['serial_number'] = row['serial_number']
+        item['item_category'] = row['item_category']
+        item['status'] = row['status']
+        item['remark'] = row['remark']
+        item['created_at'] = format_datetime(row['created_at'])
+        item['branch'] = row['branch']
+        item['added_by'] = row['added_by']
+        return item
+
+
+class EquipmentImportRowSerializer(serializers.Serializer):
+    tag_number = serializers.IntegerField()
+    serial_number = serializers.CharField(max_length=100)
+    item_category = serializers.ChoiceField(choices=Equipment.ITEM_CATEGORY_CHOICES)
+    status = serializers.ChoiceField(choices=Equipment.STATUS_CHOICES, default='working')
+    remark = serializers.CharField(required=False, allow_blank=True, default='')
+    branch = serializers.IntegerField(required=False)
+    branch_name = serializers.CharField(required=False, max_length=256)
+
+    def validate(self, data):
+        if 'branch' not in data and 'branch_name' not in data:
+            raise serializers.ValidationError({'branch': ['Give a branch id or a branch_name.']})
+        return data
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .models import Branch, Equipment
+
+
+@receiver(post_save, sender=Equipment)
+def index_equipment(sender, instance, created, **kwargs):
+    search.index_equipment([instance.pk], new=created)
+
+
+@receiver(post_delete, sender=Equipment)
+def unindex_equipment(sender, instance, **kwargs):
+    search.unindex_equipment([instance.pk])
+
+
+@receiver(post_save, sender=Branch)
+def reindex_branch_equipment(sender, instance, created, **kwargs):
+    # equipment documents carry the branch name
+    if not created:
+        search.index_equipment(Equipment.objects.filter(branch=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender='Repairs.Repair')
+def index_repair(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or {'remark', 'report'} & set(update_fields):
+        search.index_repairs([instance.pk], new=created)
+
+
+@receiver(post_delete, sender='Repairs.Repair')
+def unindex_repair(sender, instance, **kwargs):
+    search.unindex_repairs([instance.pk])
@@ -1,3 +1,368 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tracemalloc
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from Repairs.models import Repair
+from Staff.models import Staff
+from . import search
+from .models import Branch, Equipment
+from .views import (
+    EquipmentListView, AsyncEquipmentListView, EquipmentExportView, EquipmentImportView, SearchView,
+    EquipmentLookupView,
+)
+
+
+def seed_equipment(branches, staff, start, stop):
+    Equipment.objects.bulk_create(
+        [
+            Equipment(
+                tag_number=i,
+                serial_number=f'SN-{i:07d}',
+                item_category='Computer' if i % 2 else 'Printer',
+                branch=branches[i % len(branches)],
+                status='working' if i % 3 else 'need_repair',
+                added_by=staff,
+            )
+            for i in range(start, stop)
+        ],
+        batch_size=5000,
+    )
+    search.rebuild()
+
+
+class EquipmentListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            username='tech', email='tech@gmail.com', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+        cls.branches = [Branch.objects.create(name=f'Branch {i}') for i in range(3)]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.view = EquipmentListView.as_view()
+
+    def get(self, params=None):
+        request = self.factory.get('/api/equipment/show/', params or {})
+        force_authenticate(request, user=self.staff)
+        return self.view(request)
+
+    def get_async(self, params=None):
+        request = self.factory.get('/api/equipment/show/async/', params or {})
+        force_authenticate(request, user=self.staff)
+        return async_to_sync(AsyncEquipmentListView.as_view())(request)
+
+    def get_with_queries(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def walk_pages(self, params, get=None, link='next'):
+        get = get or self.get
+        seen = []
+        response = get(params)
+        while True:
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data[link]:
+                return seen
+            cursor = parse_qs(urlparse(response.data[link]).query)['cursor'][0]
+            response = get({**params, 'cursor': cursor})
+
+    def test_rows_carry_related_names(self):
+        seed_equipment(self.branches, self.staff, 0, 3)
+        response = self.get()
+        row = response.data['results'][0]
+        self.assertIn(row['branch_name'], {b.name for b in self.branches})
+        self.assertEqual(row['added_by_name'], 'Abebe')
+
+    def test_query_count_flat_from_100_to_10k_rows(self):
+        counts, filtered_counts = {}, {}
+        seeded = 0
+        for size in (100, 1_000, 10_000):
+            seed_equipment(self.branches, self.staff, seeded, size)
+            seeded = size
+            _, counts[size] = self.get_with_queries({'page_size': 500})
+            _, filtered_counts[size] = self.get_with_queries({'status': 'working', 'branch': self.branches[0].pk})
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        self.assertEqual(len(set(filtered_counts.values())), 1, filtered_counts)
+
+    def test_cursor_walk_visits_every_row_once(self):
+        seed_equipment(self.branches, self.staff, 0, 230)
+        seen = self.walk_pages({'page_size': 50})
+        self.assertEqual(len(seen), 230)
+        self.assertEqual(len(set(seen)), 230)
+
+    def test_cursor_walk_through_ties_visits_every_row_once(self):
+        seed_equipment(self.branches, self.staff, 0, 2500)
+        Equipment.objects.update(status='working')
+        params = {'ordering': 'status', 'page_size': 100}
+        seen = self.walk_pages(params)
+        self.assertEqual(len(seen), 2500)
+        self.assertEqual(len(set(seen)), 2500)
+
+        # and back again from the last page
+        last = self.get(params)
+        while last.data['next']:
+            last = self.get({**params, 'cursor': parse_qs(urlparse(last.data['next']).query)['cursor'][0]})
+        cursor = parse_qs(urlparse(last.data['previous']).query)['cursor'][0]
+        backwards = self.walk_pages({**params, 'cursor': cursor}, link='previous')
+        self.assertEqual(sorted(backwards + [row['id'] for row in last.data['results']]), sorted(seen))
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        seed_equipment(self.branches, self.staff, 0, 10)
+        response = self.get({'page_size': 3, 'ordering': 'status'})
+        cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        self.assertEqual(self.get({'cursor': cursor, 'ordering': 'status'}).status_code, 200)
+        # a value the field can't hold, and a position of the wrong length
+        self.assertEqual(self.get({'cursor': cursor, 'ordering': 'tag_number'}).status_code, 404)
+        self.assertEqual(self.get({'cursor': cursor, 'ordering': 'status,tag_number'}).status_code, 404)
+
+    def test_cursor_walk_with_filter_search_and_ordering(self):
+        seed_equipment(self.branches, self.staff, 0, 120)
+        params = {'item_category': 'Computer', 'ordering': 'status', 'search': 'SN-', 'page_size': 7}
+        seen = self.walk_pages(params)
+        expected = Equipment.objects.filter(item_category='Computer').values_list('id', flat=True)
+        self.assertEqual(sorted(seen), sorted(expected))
+
+    def test_async_view_pages_like_the_sync_one(self):
+        seed_equipment(self.branches, self.staff, 0, 120)
+        for params in ({'page_size': 25}, {'branch': self.branches[1].pk, 'ordering': 'status', 'page_size': 9},
+                       {'search': 'SN-00000', 'ordering': '-tag_number', 'page_size': 4}):
+            self.assertEqual(self.walk_pages(params, self.get_async), self.walk_pages(params), params)
+
+        response = self.get({'page_size': 5})
+        for fast in (False, True):
+            with override_settings(FAST_READ_SERIALIZERS=fast):
+                self.assertEqual(
+                    json.loads(self.get_async({'page_size': 5}).content)['results'],
+                    json.loads(response.render().content)['results'],
+                )
+        previous = self.get_async({'cursor': parse_qs(urlparse(response.data['next']).query)['cursor'][0]})
+        self.assertIsNotNone(previous.data['previous'])
+        self.assertEqual(self.get_async({'cursor': 'garbage'}).status_code, 404)
+        self.assertEqual(self.get_async({'branch': 999}).status_code, 400)
+
+
+class EquipmentExportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            username='tech', email='tech@gmail.com', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+        cls.branches = [Branch.objects.create(name=f'Branch {i}') for i in range(3)]
+
+    def export(self, params):
+        request = APIRequestFactory().get('/api/equipment/export/', params)
+        force_authenticate(request, user=self.staff)
+        response = EquipmentExportView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_honours_list_filters(self):
+        seed_equipment(self.branches, self.staff, 0, 60)
+        rows = list(csv.DictReader(io.StringIO(self.export({'branch': self.branches[1].pk, 'status': 'working'}))))
+        expected = Equipment.objects.filter(branch=self.branches[1], status='working')
+        self.assertEqual(sorted(int(r['id']) for r in rows), sorted(expected.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['branch__name'], 'Branch 1')
+        self.assertEqual(rows[0]['added_by__first_name'], 'Abebe')
+
+    def test_ndjson(self):
+        seed_equipment(self.branches, self.staff, 0, 10)
+        rows = [json.loads(line) for line in self.export({'output': 'ndjson', 'item_category': 'Printer'}).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(r['item_category'] == 'Printer' for r in rows))
+
+    def test_rejects_unknown_output(self):
+        request = APIRequestFactory().get('/api/equipment/export/', {'output': 'xml'})
+        force_authenticate(request, user=self.staff)
+        self.assertEqual(EquipmentExportView.as_view()(request).status_code, 400)
+
+    def peak_memory(self, params):
+        request = APIRequestFactory().get('/api/equipment/export/', params)
+        force_authenticate(request, user=self.staff)
+        tracemalloc.start()
+        size = sum(len(chunk) for chunk in EquipmentExportView.as_view()(request).streaming_content)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, peak
+
+    def test_memory_flat_from_4k_to_40k_rows(self):
+        seed_equipment(self.branches, self.staff, 0, 4_000)
+        small_size, small_peak = self.peak_memory({'output': 'ndjson'})
+        seed_equipment(self.branches, self.staff, 4_000, 40_000)
+        large_size, large_peak = self.peak_memory({'output': 'ndjson'})
+        self.assertGreater(large_size, small_size * 9)
+        self.assertLess(large_peak, small_peak * 2)
+
+
+class EquipmentImportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            username='tech', email='tech@gmail.com', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+        cls.branch = Branch.objects.create(name='Bole')
+
+    def post(self, data, params='', fmt='json'):
+        request = APIRequestFactory().post(f'/api/equipment/import/{params}', data, format=fmt)
+        force_authenticate(request, user=self.staff)
+        return EquipmentImportView.as_view()(request)
+
+    def rows(self, start, stop):
+        return [
+            {'tag_number': i, 'serial_number': f'SN-{i}', 'item_category': 'Computer', 'branch': self.branch.pk}
+            for i in range(start, stop)
+        ]
+
+    def test_json_rows_are_created(self):
+        response = self.post(self.rows(0, 20))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(Equipment.objects.filter(added_by=self.staff, status='working').count(), 20)
+
+    def test_csv_upload_with_branch_names(self):
+        content = 'tag_number,serial_number,item_category,branch_name,remark\n1,A-1,Printer,Bole,\n2,A-2,Scanner,Bole,spare\n'
+        upload = SimpleUploadedFile('machines.csv', content.encode(), content_type='text/csv')
+        response = self.post({'file': upload}, fmt='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(Equipment.objects.order_by('tag_number').values_list('serial_number', 'branch__name', 'remark')),
+            [('A-1', 'Bole', ''), ('A-2', 'Bole', 'spare')],
+        )
+
+    def test_unreadable_uploads_are_rejected(self):
+        for name, content in (('machines.json', b'{not json'), ('machines.json', b'[{"tag_number": "\xff"}]'),
+                              ('machines.csv', b'tag_number,serial_number\n1,\xff\n')):
+            response = self.post({'file': SimpleUploadedFile(name, content)}, fmt='multipart')
+            self.assertEqual(response.status_code, 400, name)
+        self.assertFalse(Equipment.objects.exists())
+
+    def test_errors_are_reported_per_row_and_nothing_is_created(self):
+        seed_equipment([self.branch], self.staff, 0, 1)
+        rows = self.rows(10, 13) + [
+            {'tag_number': 0, 'serial_number': 'new', 'item_category': 'Computer', 'branch': self.branch.pk},
+            {'tag_number': 10, 'serial_number': 'SN-x', 'item_category': 'Laptop', 'branch': 999},
+            {'tag_number': 11, 'serial_number': 'SN-y', 'item_category': 'Computer', 'branch_name': 'Nowhere'},
+        ]
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 400)
+        errors = {e['row']: e['errors'] for e in response.data['errors']}
+        self.assertEqual(set(errors), {4, 5, 6})
+        self.assertIn('tag_number', errors[4])
+        self.assertIn('item_category', errors[5])
+        self.assertIn('Duplicate of row 2', str(errors[6]['tag_number']))
+        self.assertIn('branch_name', errors[6])
+        self.assertEqual(Equipment.objects.count(), 1)
+
+    def test_dry_run_validates_without_writing(self):
+        response = self.post(self.rows(0, 5), params='?dry_run=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['valid'], response.data['created']), (5, 0))
+        self.assertFalse(Equipment.objects.exists())
+
+    def test_validation_queries_do_not_grow_per_row(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.rows(0, 10), params='?dry_run=1')
+        with CaptureQueriesContext(connection) as large:
+            self.post(self.rows(0, 450), params='?dry_run=1')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            username='tech', email='tech@gmail.com', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+        cls.bole = Branch.objects.create(name='Bole')
+        cls.piassa = Branch.objects.create(name='Piassa')
+        cls.printer = Equipment.objects.create(
+            tag_number=1204, serial_number='HP-LJ-2200', item_category='Printer', branch=cls.bole,
+            remark='Toner door sticks', added_by=cls.staff,
+        )
+        cls.computer = Equipment.objects.create(
+            tag_number=12, serial_number='DELL-7010', item_category='Computer', branch=cls.piassa,
+            added_by=cls.staff,
+        )
+        cls.repair = Repair.objects.create(
+            equipment=cls.printer, staff=cls.staff, remark='Paper jam on every print',
+            report='Replaced the fuser roller',
+        )
+
+    def search(self, q, **params):
+        request = APIRequestFactory().get('/api/search/', {'q': q, **params})
+        force_authenticate(request, user=self.staff)
+        return SearchView.as_view()(request)
+
+    def lookup(self, q):
+        request = APIRequestFactory().get('/api/equipment/lookup/', {'q': q})
+        force_authenticate(request, user=self.staff)
+        response = EquipmentLookupView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return [row['tag_number'] for row in response.data]
+
+    def ids(self, q, kind='equipment'):
+        return [row['id'] for row in self.search(q).data[kind]]
+
+    def test_ranked_search_over_equipment_and_repairs(self):
+        response = self.search('print')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['equipment']], [self.printer.pk])
+        self.assertEqual([row['id'] for row in response.data['repairs']], [self.repair.pk])
+        self.assertEqual(self.ids('fuser roller', 'repairs'), [self.repair.pk])
+        self.assertEqual(self.ids('fuser toner', 'repairs'), [])
+
+    def test_tag_and_serial_outrank_remark(self):
+        Equipment.objects.create(
+            tag_number=99, serial_number='X-1', item_category='Scanner', branch=self.bole,
+            remark='Sits next to the dell', added_by=self.staff,
+        )
+        self.assertEqual(self.ids('dell')[0], self.computer.pk)
+
+    def test_index_follows_saves_deletes_and_branch_renames(self):
+        self.printer.remark = 'Feeds crooked'
+        self.printer.save()
+        self.assertEqual(self.ids('toner'), [])
+        self.assertEqual(self.ids('crooked'), [self.printer.pk])
+
+        self.piassa.name = 'Merkato'
+        self.piassa.save()
+        self.assertEqual(self.ids('merkato'), [self.computer.pk])
+
+        self.repair.delete()
+        self.assertEqual(self.ids('fuser', 'repairs'), [])
+        self.computer.delete()
+        self.assertEqual(self.ids('merkato'), [])
+
+    def test_imported_equipment_is_indexed(self):
+        rows = [{'tag_number': 500, 'serial_number': 'EPSON-1', 'item_category': 'Printer', 'branch': self.bole.pk}]
+        request = APIRequestFactory().post('/api/equipment/import/', rows, format='json')
+        force_authenticate(request, user=self.staff)
+        self.assertEqual(EquipmentImportView.as_view()(request).status_code, 201)
+        self.assertEqual(len(self.ids('epson')), 1)
+
+    def test_list_search_uses_the_index(self):
+        request = APIRequestFactory().get('/api/equipment/show/', {'search': 'toner'})
+        force_authenticate(request, user=self.staff)
+        response = EquipmentListView.as_view()(request)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.printer.pk])
+
+    def test_prefix_lookup_by_tag_and_serial(self):
+        self.assertEqual(self.lookup('12'), [12, 1204])
+        self.assertEqual(self.lookup('120'), [1204])
+        self.assertEqual(self.lookup('DELL-'), [12])
+        self.assertEqual(self.lookup('dell-'), [])
+        self.assertEqual(self.lookup(''), [])
+
+    def test_rejects_bad_limit(self):
+        self.assertEqual(self.search('print', limit='many').status_code, 400)
@@ -1,11 +1,16 @@
 from django.urls import path
-from .views import EquipmentCreateView , BranchCreateView , EquipmentDeleteView , EquipmentListView , EquipmentDetailView 
+from .views import EquipmentCreateView , BranchCreateView , EquipmentDeleteView , EquipmentListView , EquipmentDetailView , EquipmentExportView , EquipmentImportView , SearchView , EquipmentLookupView , AsyncEquipmentListView
 
 urlpatterns = [
     path('equipment/create/', EquipmentCreateView.as_view(), name='equipment-create'),
+    path('equipment/import/', EquipmentImportView.as_view(), name='equipment-import'),
     path('branch/create/', BranchCreateView.as_view(), name='branch-create'),
     path('equipment/delete/<int:pk>/', EquipmentDeleteView.as_view(), name='delete-equipment'),
     path('equipment/show/', EquipmentListView.as_view(), name='equipment-list'),
+    path('equipment/show/async/', AsyncEquipmentListView.as_view(), name='equipment-list-async'),
     path('equipment/show/<int:pk>/', EquipmentDetailView.as_view(), name='equipment-detail'),
+    path('equipment/export/', EquipmentExportView.as_view(), name='equipment-export'),
+    path('equipment/lookup/', EquipmentLookupView.as_view(), name='equipment-lookup'),
+    path('search/', SearchView.as_view(), name='search'),
     
 ]
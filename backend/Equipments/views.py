@@ -1,7 +1,7 @@
 from rest_framework import generics
 from .models import Equipment ,Branch
 from .serializers import BranchSerializer
-from .serializers import EquipmentSerializer
+from .serializers import EquipmentSerializer , EquipmentRowSerializer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -10,6 +10,15 @@ from .permissions import IsStaffOrAdmin
 from rest_framework.generics import ListAPIView , RetrieveAPIView
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_yasg.utils import swagger_auto_schema
+from .pagination import EquipmentCursorPagination
+from .exports import ExportView
+from . import imports , search
+from django.db import IntegrityError, transaction
+from asgiref.sync import sync_to_async
+from config.async_api import AsyncAPIView
+from config.rows import RowSerializerMixin
+from django.conf import settings
 
 
 
@@ -31,25 +40,123 @@ class EquipmentCreateView(generics.CreateAPIView):
         
         serializer.save(added_by=self.request.user)
 
+class EquipmentImportView(APIView):
+    permission_classes = [IsAuthenticated, IsStaffOrAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Import many equipment rows from a CSV/JSON upload or a JSON list. "
+                              "Nothing is created unless every row is valid; ?dry_run=true only validates.",
+        responses={201: 'Rows created', 200: 'Dry run passed', 400: 'Per-row error report'}
+    )
+    def post(self, request):
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        rows = imports.read_rows(request)
+        valid, errors = imports.validate_rows(rows)
+        report = {"total": len(rows), "valid": len(valid), "created": 0, "dry_run": dry_run, "errors": errors}
+
+        if errors:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        if dry_run:
+            return Response(report, status=status.HTTP_200_OK)
+
+        try:
+            with transaction.atomic():
+                report["created"] = len(imports.create_equipment(valid, request.user))
+        except IntegrityError:
+            return Response(
+                {**report, "error": "Another request added some of these tag or serial numbers; re-run the import."},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(report, status=status.HTTP_201_CREATED)
+
+
 class EquipmentDeleteView(generics.DestroyAPIView):
     queryset = Equipment.objects.all()
     permission_classes = [IsAuthenticated, IsStaffOrAdmin]
     lookup_field = 'pk'
 
     
-class EquipmentListView(ListAPIView):
-    queryset = Equipment.objects.all()
-    serializer_class = EquipmentSerializer
-    permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+class EquipmentFilterMixin:
+    filter_backends = [DjangoFilterBackend, search.FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['item_category', 'status', 'branch']
     search_fields = ['serial_number', 'tag_number']
     ordering_fields = ['created_at', 'tag_number', 'status']
 
 
+class EquipmentListView(EquipmentFilterMixin, RowSerializerMixin, ListAPIView):
+    queryset = Equipment.objects.select_related('branch', 'added_by')
+    serializer_class = EquipmentSerializer
+    row_serializer_class = EquipmentRowSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = EquipmentCursorPagination
+
+
+class AsyncEquipmentListView(EquipmentFilterMixin, AsyncAPIView):
+    """
+    EquipmentListView for ASGI deployments, same filters, ordering and
+    cursors. The page is read with the async ORM; validating the filters
+    still takes a trip to a worker thread.
+    """
+    queryset = Equipment.objects.select_related('branch', 'added_by')
+    permission_classes = [IsAuthenticated]
+    pagination_class = EquipmentCursorPagination
+
+    async def get(self, request):
+        # django-filter checks ?branch= against the database while validating, which only the sync ORM can do
+        queryset = await sync_to_async(self.filter_queryset)(self.queryset.all())
+        paginator = self.pagination_class()
+        if settings.FAST_READ_SERIALIZERS:
+            page = await paginator.apaginate_queryset(EquipmentRowSerializer.rows(queryset), request, self)
+            return paginator.get_paginated_response(EquipmentRowSerializer.many(page))
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        return paginator.get_paginated_response(EquipmentSerializer(page, many=True).data)
+
+
+class EquipmentExportView(EquipmentFilterMixin, ExportView):
+    queryset = Equipment.objects.order_by('id')
+    permission_classes = [IsAuthenticated]
+    filename = 'equipment'
+    columns = (
+        'id', 'tag_number', 'serial_number', 'item_category', 'status', 'branch_id', 'branch__name',
+        'remark', 'created_at', 'added_by__first_name',
+    )
+
+
 class EquipmentDetailView(RetrieveAPIView):
-    queryset = Equipment.objects.all()
+    queryset = Equipment.objects.select_related('branch', 'added_by')
     serializer_class = EquipmentSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'pk'
 
+
+class SearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Ranked full-text search over equipment (tag, serial, category, branch, remark) "
+                              "and repair notes (report, remark). Every word must match as a prefix.",
+        responses={200: 'Ranked equipment and repairs'}
+    )
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"limit": "Must be a whole number."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(search.search(request.query_params.get('q', ''), limit=limit))
+
+
+class EquipmentLookupView(RowSerializerMixin, ListAPIView):
+    serializer_class = EquipmentSerializer
+    row_serializer_class = EquipmentRowSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    @swagger_auto_schema(
+        operation_description="Equipment whose tag or serial number starts with ?q=, for barcode scanners",
+        responses={200: EquipmentSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return search.prefix_lookup(self.request.query_params.get('q', '')).select_related('added_by')
@@ -0,0 +1,127 @@
+"""
+Automatic technician assignment. The Technician table is the queue: its
+workload column counts each technician's open repairs and moves through
+the stats counters, inside the transaction that changes a repair, and partial
+indexes on (workload, staff) and (branch, workload, staff) over available
+technicians make the least-loaded one a single index seek, however many
+technicians there are and however many approvals arrive at once.
+"""
+import heapq
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from Staff.models import Staff
+from .models import Repair, Technician
+
+# a technician's load: repairs they still have to finish
+OPEN_STATUSES = ['pending', 'approved', 'under_repair']
+
+
+class NoTechnicianAvailable(Exception):
+    pass
+
+
+def eligible(staff):
+    return staff.role == 'staff' and staff.is_active
+
+
+def least_loaded(branch_id=None):
+    """
+    The staff id of the available technician with the least open work,
+    preferring those based at `branch_id`. Ties go to the lowest id. The
+    row stays locked until the caller's transaction ends where the
+    database can do that, and concurrent approvals skip to the next one.
+    """
+    queue = Technician.objects.select_for_update(skip_locked=True).filter(available=True)
+    if branch_id is not None:
+        local = queue.filter(branch_id=branch_id).order_by('workload', 'staff_id').values_list('staff_id', flat=True)
+        staff_id = local.first()
+        if staff_id is not None:
+            return staff_id
+    staff_id = queue.order_by('workload', 'staff_id').values_list('staff_id', flat=True).first()
+    if staff_id is None:
+        raise NoTechnicianAvailable()
+    return staff_id
+
+
+def spread(branch_ids):
+    """
+    Technicians for a batch of repairs at `branch_ids`, in order, picked
+    the way successive least_loaded() calls would pick them: each one
+    counts towards the load of the technician it went to when the next
+    is picked. None where nobody is available. The queue is read once,
+    with one heap per branch and one over everybody; a heap entry whose
+    load has moved on is dropped when it reaches the top.
+    """
+    queue = list(
+        Technician.objects.select_for_update(skip_locked=True).filter(available=True)
+        .values_list('staff_id', 'branch_id', 'workload')
+    )
+    load = {staff_id: workload for staff_id, _, workload in queue}
+    home = {staff_id: branch_id for staff_id, branch_id, _ in queue}
+    everyone = [(workload, staff_id) for staff_id, _, workload in queue]
+    local = {}
+    for staff_id, branch_id, workload in queue:
+        if branch_id is not None:
+            local.setdefault(branch_id, []).append((workload, staff_id))
+    for heap in [everyone, *local.values()]:
+        heapq.heapify(heap)
+
+    def top(heap):
+        while heap and load[heap[0][1]] != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    picks = []
+    for branch_id in branch_ids:
+        staff_id = top(local.get(branch_id, [])) if branch_id is not None else None
+        if staff_id is None:
+            staff_id = top(everyone)
+        if staff_id is not None:
+            load[staff_id] += 1
+            heapq.heappush(everyone, (load[staff_id], staff_id))
+            if home[staff_id] is not None:
+                heapq.heappush(local[home[staff_id]], (load[staff_id], staff_id))
+        picks.append(staff_id)
+    return picks
+
+
+def enlist(staff, created=False):
+    """
+    Keep `staff` in step with the queue: a technician gets an entry the
+    first time they're seen, anyone who can't take repairs (another
+    role, deactivated) is withdrawn from it, and rejoins once they can
+    again. Availability an admin turned off stays off.
+    """
+    if not eligible(staff):
+        Technician.objects.filter(staff=staff, available=True).update(available=False, withdrawn=True)
+        return
+    workload = 0 if created else Repair.objects.filter(repair_staff=staff, status__in=OPEN_STATUSES).count()
+    Technician.objects.bulk_create(
+        [Technician(staff=staff, available=True, workload=workload)], ignore_conflicts=True
+    )
+    if not created:
+        Technician.objects.filter(staff=staff, withdrawn=True).update(available=True, withdrawn=False)
+
+
+def rebuild_queue():
+    """
+    Enlist every active technician, withdraw or restore entries whose
+    staff member changed without enlist() seeing it (queryset updates),
+    and recount every technician's open repairs.
+    """
+    Technician.objects.bulk_create(
+        [
+            Technician(staff_id=pk, available=True)
+            for pk in Staff.objects.filter(role='staff', is_active=True).values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    Technician.objects.filter(available=True).exclude(staff__role='staff', staff__is_active=True) \
+        .update(available=False, withdrawn=True)
+    Technician.objects.filter(withdrawn=True, staff__role='staff', staff__is_active=True) \
+        .update(available=True, withdrawn=False)
+    open_repairs = Repair.objects.filter(repair_staff=OuterRef('staff'), status__in=OPEN_STATUSES) \
+        .order_by().values('repair_staff').annotate(count=Count('id')).values('count')
+    Technician.objects.update(workload=Coalesce(Subquery(open_repairs[:1]), 0))
@@ -0,0 +1,423 @@
+import asyncio
+import json
+import subprocess
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import F
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Equipments.models import Equipment
+from Staff.models import Staff
+from .models import Repair, RepairPart, Part, PartStock
+from . import seeding
+
+Call = namedtuple('Call', 'method path data user')
+
+
+class Targets:
+    """Rows the scenarios address, loaded once so lookups stay out of the timings."""
+
+    def __init__(self, iterations):
+        self.admin = Staff.objects.filter(role='admin').order_by('pk').first()
+        self.equipment = list(Equipment.objects.order_by('pk').values_list('pk', 'tag_number', 'branch_id')[:200])
+        self.completed = list(
+            Repair.objects.filter(status='completed').order_by('-completed_at').values_list('pk', flat=True)[:200]
+        )
+        # the 'complete' scenario writes, so it only touches seeded repairs and parts
+        self.approved = list(
+            Repair.objects.filter(
+                status='approved', repair_staff__isnull=False,
+                equipment__branch__name__startswith=seeding.NAME_PREFIX,
+            ).select_related('repair_staff').order_by('pk')[:iterations]
+        )
+        self.parts = list(
+            Part.objects.filter(name__startswith=seeding.NAME_PREFIX).order_by('pk').values_list('pk', flat=True)[:20]
+        )
+
+    def stock_up(self):
+        """Enough stock of the parts completions use that none is refused for running out."""
+        PartStock.objects.filter(part_id__in=self.parts).update(quantity=F('quantity') + len(self.approved))
+
+    def pick(self, rows, i):
+        return rows[i % len(rows)] if rows else None
+
+
+def equipment_list(targets, i):
+    return Call('get', reverse('equipment-list'), None, targets.admin)
+
+
+def equipment_list_filtered(targets, i):
+    _, _, branch_id = targets.pick(targets.equipment, i)
+    return Call('get', reverse('equipment-list'), {'branch': branch_id, 'status': 'working'}, targets.admin)
+
+
+def repair_history(targets, i):
+    _, tag_number, _ = targets.pick(targets.equipment, i)
+    return Call('get', reverse('equipment-repair-history'), {'tag_number': tag_number}, targets.admin)
+
+
+def admin_stats(targets, i):
+    return Call('get', reverse('admin-stats'), None, targets.admin)
+
+
+def complete(targets, i):
+    # every call completes a different approved repair
+    if i >= len(targets.approved):
+        return None
+    repair = targets.approved[i]
+    parts = [{'part_id': part_id, 'quantity': 1} for part_id in targets.parts[i % 3:i % 3 + 2]]
+    data = {'status': 'completed', 'report': 'Benchmark repair', 'parts': parts}
+    return Call('patch', reverse('repair-complete', args=[repair.pk]), data, repair.repair_staff)
+
+
+def receipt_pdf(targets, i):
+    repair_id = targets.pick(targets.completed, i)
+    return Call('get', reverse('repair-receipt-pdf', args=[repair_id]), None, targets.admin)
+
+
+def equipment_pdf(targets, i):
+    equipment_id, _, _ = targets.pick(targets.equipment, i)
+    return Call('get', reverse('equipment-repair-pdf', args=[equipment_id]), None, targets.admin)
+
+
+def on_route(builder, route):
+    """The same calls as `builder`, sent to another route."""
+    def build(targets, i):
+        call = builder(targets, i)
+        return call and call._replace(path=reverse(route))
+    return build
+
+
+SCENARIOS = {
+    'equipment-list': equipment_list,
+    'equipment-list-filtered': equipment_list_filtered,
+    'repair-history': repair_history,
+    'admin-stats': admin_stats,
+    'complete': complete,
+    'receipt-pdf': receipt_pdf,
+    'equipment-pdf': equipment_pdf,
+    'equipment-list-async': on_route(equipment_list, 'equipment-list-async'),
+    'repair-history-async': on_route(repair_history, 'equipment-repair-history-async'),
+    'admin-stats-async': on_route(admin_stats, 'admin-stats-async'),
+}
+# scenarios that change data; they consume targets and are not warmed up
+WRITES = {'complete'}
+# read scenarios with an async view, and the scenario that calls it
+ASYNC_COUNTERPARTS = {
+    'equipment-list': 'equipment-list-async',
+    'repair-history': 'repair-history-async',
+    'admin-stats': 'admin-stats-async',
+}
+
+
+def percentile(ordered, p):
+    """Linear interpolation between closest ranks of an already sorted list."""
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def summarize(latencies, queries, errors, peak_memory):
+    ordered = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'latency_ms': {
+            'p50': ms(percentile(ordered, 50)),
+            'p95': ms(percentile(ordered, 95)),
+            'p99': ms(percentile(ordered, 99)),
+            'mean': ms(sum(ordered) / len(ordered)) if ordered else None,
+            'max': ms(ordered[-1]) if ordered else None,
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+        'peak_memory_kib': peak_memory,
+    }
+
+
+class Runner:
+    def __init__(self, iterations, warmup=3, memory_samples=3):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.memory_samples = memory_samples
+        self.targets = Targets(iterations + memory_samples)
+        self.tokens = {}
+
+    def auth_header(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = f'Bearer {AccessToken.for_user(user)}'
+        return self.tokens[user.pk]
+
+    def calls(self, name, start, count):
+        builder = SCENARIOS[name]
+        calls = []
+        for i in range(start, start + count):
+            call = builder(self.targets, i)
+            if call is None:
+                break
+            calls.append(call)
+        return calls
+
+    def run(self, names):
+        if 'complete' in names:
+            self.targets.stock_up()
+        results = {}
+        for name in names:
+            if name in WRITES:
+                timed = self.calls(name, 0, self.iterations)
+                sampled = self.calls(name, self.iterations, self.memory_samples)
+            else:
+                for call in self.calls(name, 0, self.warmup):
+                    self.send(call)
+                timed = self.calls(name, 0, self.iterations)
+                sampled = self.calls(name, 0, self.memory_samples)
+            results[name] = self.measure(timed, sampled)
+        return results
+
+
+def server_name():
+    return next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+
+class ClientRunner(Runner):
+    """Drives the URL routes in-process through Django's test client."""
+    mode = 'client'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = Client(HTTP_HOST=server_name(), raise_request_exception=False)
+
+    def send(self, call):
+        kwargs = {'HTTP_AUTHORIZATION': self.auth_header(call.user)}
+        if call.method == 'get':
+            response = self.client.get(call.path, call.data, **kwargs)
+        else:
+            response = getattr(self.client, call.method)(call.path, call.data, content_type='application/json', **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def measure(self, timed, sampled):
+        latencies, queries, errors = [], [], 0
+        for call in timed:
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                status_code = self.send(call)
+                latencies.append(time.perf_counter() - started)
+            queries.append(len(ctx.captured_queries))
+            errors += status_code >= 400
+
+        peak = None
+        if sampled:
+            # tracemalloc slows every allocation, so memory gets its own pass
+            tracemalloc.start()
+            for call in sampled:
+                tracemalloc.reset_peak()
+                self.send(call)
+                peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            peak = round(peak / 1024, 1)
+        return summarize(latencies, queries, errors, peak)
+
+
+class HttpRunner(Runner):
+    """
+    Drives a running server over HTTP with a thread pool. Query counts and
+    memory belong to the server process, so only latency is reported.
+    """
+    mode = 'http'
+
+    def __init__(self, base_url, concurrency=1, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.memory_samples = 0
+
+    def send(self, call):
+        url = self.base_url + call.path
+        body = None
+        if call.method == 'get' and call.data:
+            url += '?' + urllib.parse.urlencode(call.data)
+        elif call.data is not None:
+            body = json.dumps(call.data).encode()
+        request = urllib.request.Request(url, data=body, method=call.method.upper(), headers={
+            'Authorization': self.auth_header(call.user),
+            'Content-Type': 'application/json',
+        })
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def timed_send(self, call):
+        started = time.perf_counter()
+        status_code = self.send(call)
+        return time.perf_counter() - started, status_code
+
+    def measure(self, timed, sampled):
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            outcomes = list(pool.map(self.timed_send, timed))
+        return summarize([o[0] for o in outcomes], [], sum(o[1] >= 400 for o in outcomes), None)
+
+
+class DeploymentRunner(Runner):
+    """
+    Compares each read scenario on the WSGI stack with its async view on
+    the ASGI stack, `concurrency` requests at a time, in this process:
+    WSGI requests come from a thread pool the way a threaded server sends
+    them, ASGI requests are tasks on one event loop the way uvicorn sends
+    them. Nothing but the Django handlers is timed, so the numbers show
+    what each stack costs without a server in front.
+    """
+    mode = 'deployment'
+
+    def __init__(self, concurrency, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+        self.host = server_name()
+        self.factory = RequestFactory(HTTP_HOST=self.host)
+        self.wsgi = WSGIHandler()
+        self.asgi = ASGIHandler()
+
+    def run(self, names):
+        results = {}
+        for name in names:
+            counterpart = ASYNC_COUNTERPARTS[name]
+            self.measure_wsgi(self.calls(name, 0, self.warmup))
+            self.measure_asgi(self.calls(counterpart, 0, self.warmup))
+            results[name] = {
+                'wsgi': self.measure_wsgi(self.calls(name, 0, self.iterations)),
+                'asgi': self.measure_asgi(self.calls(counterpart, 0, self.iterations)),
+            }
+        return results
+
+    def environ(self, call):
+        return self.factory.get(call.path, call.data, HTTP_AUTHORIZATION=self.auth_header(call.user)).environ
+
+    def wsgi_send(self, environ):
+        statuses = []
+        started = time.perf_counter()
+        body = self.wsgi(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in body:
+                pass
+        finally:
+            # fires request_finished, which returns the thread's connection
+            body.close()
+        return time.perf_counter() - started, int(statuses[0].split()[0])
+
+    def measure_wsgi(self, calls):
+        environs = [self.environ(call) for call in calls]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            outcomes = list(pool.map(self.wsgi_send, environs))
+        return throughput(outcomes, time.perf_counter() - started)
+
+    def scope(self, call):
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': call.path, 'raw_path': call.path.encode(), 'root_path': '',
+            'query_string': urllib.parse.urlencode(call.data or {}).encode(),
+            'headers': [(b'host', self.host.encode()), (b'authorization', self.auth_header(call.user).encode())],
+            'client': ('127.0.0.1', 0), 'server': (self.host, 80),
+        }
+
+    async def asgi_send(self, scope, slots):
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        statuses = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # the client never disconnects; Django cancels this once the response is sent
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        async with slots:
+            started = time.perf_counter()
+            await self.asgi(scope, receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+    def measure_asgi(self, calls):
+        scopes = [self.scope(call) for call in calls]
+
+        async def fire():
+            slots = asyncio.Semaphore(self.concurrency)
+            return await asyncio.gather(*(self.asgi_send(scope, slots) for scope in scopes))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(fire())
+        return throughput(outcomes, time.perf_counter() - started)
+
+
+def throughput(outcomes, elapsed):
+    result = summarize([o[0] for o in outcomes], [], sum(o[1] >= 400 for o in outcomes), None)
+    result['requests_per_second'] = round(len(outcomes) / elapsed, 1) if elapsed else None
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(runner, names):
+    scenarios = runner.run(names)
+    return {
+        'created_at': timezone.now().isoformat(),
+        'git_commit': git_commit(),
+        'mode': runner.mode,
+        'database': connection.vendor,
+        'iterations': runner.iterations,
+        'data': {
+            'equipment': Equipment.objects.count(),
+            'repairs': Repair.objects.count(),
+            'repair_parts': RepairPart.objects.count(),
+        },
+        'scenarios': scenarios,
+    }
+
+
+def compare(baseline, current):
+    """Per-scenario p95 latency and mean query deltas against an earlier report."""
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        rows.append({
+            'scenario': name,
+            'p95_ms': (before['latency_ms']['p95'], result['latency_ms']['p95']),
+            'queries': (before['queries']['mean'], result['queries']['mean']),
+        })
+    return rows
@@ -0,0 +1,196 @@
+"""
+The repair event log. Every status change appends a RepairEvent in the
+transaction that makes it; the timeline of a repair is one range of the
+repairevent_timeline_idx index, and turnaround and SLA figures are
+aggregated over the log in SQL rather than rebuilt repair by repair.
+Once the transaction commits, each event is also published to the
+broker for the live repair stream.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from config.broker import broker
+from .models import RepairEvent
+
+# events read from the log per query while a reconnecting stream catches up
+REPLAY_LIMIT = 500
+
+
+def record(repair, from_status, actor=None, at=None):
+    """Append the transition of `repair` from `from_status` to its current status."""
+    event = RepairEvent.objects.create(
+        repair=repair,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        from_status=from_status or '',
+        to_status=repair.status,
+        created_at=at or timezone.now(),
+    )
+    publish([message(event, repair)])
+    return event
+
+
+def record_all(repairs, from_status, actor=None, at=None):
+    """record() for every repair in `repairs`, all moving from `from_status`, in one INSERT."""
+    actor = actor if actor is not None and actor.is_authenticated else None
+    at = at or timezone.now()
+    created = RepairEvent.objects.bulk_create([
+        RepairEvent(repair=repair, actor=actor, from_status=from_status or '', to_status=repair.status, created_at=at)
+        for repair in repairs
+    ])
+    publish([message(event, repair) for event, repair in zip(created, repairs)])
+    return created
+
+
+def message(event, repair):
+    """What the live stream sends for `event`. The repair's equipment is expected to be loaded already."""
+    return {
+        'id': event.pk,
+        'repair': repair.pk,
+        'equipment': repair.equipment_id,
+        'branch': repair.equipment.branch_id,
+        'repair_staff': repair.repair_staff_id,
+        'from_status': event.from_status,
+        'to_status': event.to_status,
+        'at': event.created_at.isoformat(),
+    }
+
+
+def publish(messages):
+    transaction.on_commit(lambda: [broker.publish(m) for m in messages])
+
+
+def since(last_id, branch_id=None, staff_id=None, limit=REPLAY_LIMIT):
+    """
+    Stream messages for the events after `last_id`, oldest first, for a
+    client catching up after a reconnect. The repair's current assignee
+    stands in for the one it had at the time.
+    """
+    rows = RepairEvent.objects.filter(pk__gt=last_id)
+    if branch_id is not None:
+        rows = rows.filter(repair__equipment__branch_id=branch_id)
+    if staff_id is not None:
+        rows = rows.filter(repair__repair_staff_id=staff_id)
+    rows = rows.order_by('pk').values(
+        'pk', 'repair_id', 'repair__equipment_id', 'repair__equipment__branch_id', 'repair__repair_staff_id',
+        'from_status', 'to_status', 'created_at',
+    )[:limit]
+    return [
+        {
+            'id': row['pk'],
+            'repair': row['repair_id'],
+            'equipment': row['repair__equipment_id'],
+            'branch': row['repair__equipment__branch_id'],
+            'repair_staff': row['repair__repair_staff_id'],
+            'from_status': row['from_status'],
+            'to_status': row['to_status'],
+            'at': row['created_at'].isoformat(),
+        }
+        for row in rows
+    ]
+
+
+def reconstruct(repair):
+    """
+    The events a repair's own timestamps imply, for rows written without
+    going through the workflow (seeded data). Approvals and rejections
+    have no recorded actor.
+    """
+    events = [RepairEvent(repair=repair, actor_id=repair.staff_id, to_status='pending', created_at=repair.created_at)]
+    if repair.status == 'rejected':
+        events.append(RepairEvent(
+            repair=repair, from_status='pending', to_status='rejected', created_at=repair.approved_at or repair.created_at
+        ))
+    elif repair.approved_at:
+        events.append(RepairEvent(repair=repair, from_status='pending', to_status='approved', created_at=repair.approved_at))
+    if repair.status == 'completed' and repair.completed_at:
+        events.append(RepairEvent(
+            repair=repair, actor_id=repair.repair_staff_id, from_status='approved', to_status='completed',
+            created_at=repair.completed_at,
+        ))
+    return events
+
+
+def timeline(repair_id):
+    """A repair's transitions, oldest first, with the time spent before each."""
+    rows = RepairEvent.objects.filter(repair_id=repair_id).order_by('created_at', 'id').values(
+        'from_status', 'to_status', 'created_at', 'actor_id', 'actor__first_name', 'actor__last_name'
+    )
+    events, previous = [], None
+    for row in rows:
+        events.append({
+            'from_status': row['from_status'],
+            'to_status': row['to_status'],
+            'at': row['created_at'],
+            'seconds_since_previous': (row['created_at'] - previous).total_seconds() if previous else None,
+            'actor': row['actor_id'],
+            'actor_name': f"{row['actor__first_name']} {row['actor__last_name']}" if row['actor_id'] else None,
+        })
+        previous = row['created_at']
+    return events
+
+
+def milestones(events=None):
+    """One row per repair with when it was requested, decided, approved and first completed."""
+    events = RepairEvent.objects.all() if events is None else events
+    return events.values('repair_id').annotate(
+        requested=Min('created_at', filter=Q(to_status='pending')),
+        decided=Min('created_at', filter=Q(to_status__in=['approved', 'rejected'])),
+        approved=Min('created_at', filter=Q(to_status='approved')),
+        completed=Min('created_at', filter=Q(to_status='completed')),
+    ).order_by()
+
+
+def seconds_between(start, end):
+    if connection.vendor == 'postgresql':
+        return f"EXTRACT(EPOCH FROM ({end} - {start}))"
+    return f"((julianday({end}) - julianday({start})) * 86400.0)"
+
+
+def sla_summary(events=None, now=None):
+    """
+    Averages and SLA counts over every repair in `events` (default: all),
+    in one query aggregating the per-repair milestones. Repairs still
+    waiting past a deadline count as open_breached.
+    """
+    now = connection.ops.adapt_datetimefield_value(now or timezone.now())
+    decision_sla = settings.REPAIR_DECISION_SLA.total_seconds()
+    turnaround_sla = settings.REPAIR_TURNAROUND_SLA.total_seconds()
+    # the ORM can't aggregate over aggregates, so the outer level is written out
+    inner, params = milestones(events).query.sql_with_params()
+    decision = seconds_between('requested', 'decided')
+    repair = seconds_between('approved', 'completed')
+    turnaround = seconds_between('requested', 'completed')
+    age = seconds_between('requested', '%s')
+    sql = f"""
+        SELECT COUNT(requested), COUNT(decided), COUNT(completed),
+               AVG({decision}), AVG({repair}), AVG({turnaround}),
+               COALESCE(SUM(CASE WHEN {decision} > %s THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN {turnaround} > %s THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN decided IS NULL AND {age} > %s THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN approved IS NOT NULL AND completed IS NULL AND {age} > %s THEN 1 ELSE 0 END), 0)
+        FROM ({inner}) milestones
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [decision_sla, turnaround_sla, now, decision_sla, now, turnaround_sla, *params])
+        (requests, decided, completed, avg_decision, avg_repair, avg_turnaround,
+         decided_late, completed_late, awaiting_decision, awaiting_completion) = cursor.fetchone()
+
+    return {
+        'requests': requests,
+        'decided': decided,
+        'completed': completed,
+        'average_seconds': {
+            'decision': rounded(avg_decision),
+            'repair': rounded(avg_repair),
+            'turnaround': rounded(avg_turnaround),
+        },
+        'sla_seconds': {'decision': round(decision_sla), 'turnaround': round(turnaround_sla)},
+        'breached': {'decision': decided_late, 'turnaround': completed_late},
+        'open_breached': {'decision': awaiting_decision, 'turnaround': awaiting_completion},
+    }
+
+
+def rounded(value):
+    return round(float(value)) if value is not None else None
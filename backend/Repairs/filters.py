@@ -0,0 +1,34 @@
+import django_filters
+
+from .models import Repair, RepairPart, RepairEvent
+
+
+class RepairExportFilter(django_filters.FilterSet):
+    item_category = django_filters.CharFilter(field_name='equipment__item_category')
+    branch = django_filters.NumberFilter(field_name='equipment__branch')
+
+    class Meta:
+        model = Repair
+        fields = ['status', 'item_category', 'branch']
+
+
+class RepairPartExportFilter(django_filters.FilterSet):
+    status = django_filters.CharFilter(field_name='repair__status')
+    item_category = django_filters.CharFilter(field_name='repair__equipment__item_category')
+    branch = django_filters.NumberFilter(field_name='repair__equipment__branch')
+
+    class Meta:
+        model = RepairPart
+        fields = ['status', 'item_category', 'branch']
+
+
+class RepairEventFilter(django_filters.FilterSet):
+    """Picks the repairs whose events the SLA figures are computed over."""
+    branch = django_filters.NumberFilter(field_name='repair__equipment__branch')
+    item_category = django_filters.CharFilter(field_name='repair__equipment__item_category')
+    requested_after = django_filters.IsoDateTimeFilter(field_name='repair__created_at', lookup_expr='gte')
+    requested_before = django_filters.IsoDateTimeFilter(field_name='repair__created_at', lookup_expr='lt')
+
+    class Meta:
+        model = RepairEvent
+        fields = ['branch', 'item_category', 'requested_after', 'requested_before']
@@ -0,0 +1,121 @@
+"""
+Part stock. A part is tracked once it has a PartStock row; a completion
+draws on the row for the repaired equipment's branch, or on the central
+store (branch NULL) where the branch has none. Untracked parts are used
+without a stock check, as before stock existed.
+"""
+import logging
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from Staff import outbox
+from Staff.models import Staff
+from .models import PartStock
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, available):
+        # part_id -> units left
+        self.available = available
+        super().__init__(f"Not enough stock for parts {sorted(available)}")
+
+
+def low_stock():
+    """Rows at or under their reorder level; the low-stock partial indexes hold only these."""
+    return PartStock.objects.filter(quantity__lte=F('reorder_level'))
+
+
+def drawn_from(part_ids, branch_id):
+    """part_id -> the PartStock row a completion at `branch_id` takes it from."""
+    rows = {}
+    for row in PartStock.objects.filter(Q(branch_id=branch_id) | Q(branch__isnull=True), part_id__in=part_ids):
+        if row.branch_id is not None or row.part_id not in rows:
+            rows[row.part_id] = row
+    return rows
+
+
+def add(deltas):
+    """
+    Apply {stock row pk: units to add} in one UPDATE. Negative deltas take
+    stock out; the quantity >= 0 CHECK makes the whole statement fail if
+    any row would go below zero, however many completions race for it.
+    """
+    whens = [When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()]
+    PartStock.objects.filter(pk__in=deltas).update(
+        quantity=F('quantity') + Case(*whens, default=Value(0)), updated_at=timezone.now()
+    )
+
+
+def consume(branch_id, before, after):
+    """
+    Move stock for a completion. `before` and `after` map part_id to the
+    quantity the repair had recorded and now records, so completing a
+    repair again only moves the difference. Raises InsufficientStock,
+    with nothing changed, if a tracked part runs short.
+    """
+    changes = {part_id: after.get(part_id, 0) - before.get(part_id, 0) for part_id in before.keys() | after.keys()}
+    rows = drawn_from([part_id for part_id, change in changes.items() if change], branch_id)
+    if not rows:
+        return
+    deltas = {row.pk: -changes[part_id] for part_id, row in rows.items()}
+
+    try:
+        with transaction.atomic():
+            add(deltas)
+    except IntegrityError:
+        current = dict(PartStock.objects.filter(pk__in=deltas).values_list('pk', 'quantity'))
+        raise InsufficientStock({
+            row.part_id: current[row.pk] for row in rows.values() if current[row.pk] + deltas[row.pk] < 0
+        } or {row.part_id: current[row.pk] for row in rows.values()})
+
+    # judged on the quantities read above; a race at worst repeats an alert
+    crossed = [
+        row.pk for row in rows.values()
+        if row.quantity > row.reorder_level >= row.quantity + deltas[row.pk]
+    ]
+    if crossed:
+        transaction.on_commit(lambda: alert(crossed))
+
+
+def alert(stock_ids):
+    """Tell the admins, through the mail outbox, about rows that just fell to their reorder level."""
+    rows = list(PartStock.objects.select_related('part', 'branch').filter(pk__in=stock_ids))
+    lines = [
+        f"{row.part.name} at {row.branch.name if row.branch else 'the central store'}: "
+        f"{row.quantity} left (reorder level {row.reorder_level})"
+        for row in rows
+    ]
+    logger.warning("Low stock: %s", "; ".join(lines))
+    for email in Staff.objects.filter(role='admin', is_active=True).values_list('email', flat=True):
+        outbox.enqueue(email, f"Low stock: {', '.join(row.part.name for row in rows)}", "\n".join(lines))
+
+
+@transaction.atomic
+def restock(items):
+    """
+    Add stock from [{'part_id', 'branch_id', 'quantity', 'reorder_level'?}],
+    creating rows that don't exist yet. Returns the affected rows.
+    """
+    PartStock.objects.bulk_create(
+        [PartStock(part_id=item['part_id'], branch_id=item['branch_id']) for item in items],
+        ignore_conflicts=True,
+    )
+    keys = Q()
+    for item in items:
+        keys |= Q(part_id=item['part_id'], branch_id=item['branch_id'])
+    rows = {(row.part_id, row.branch_id): row.pk for row in PartStock.objects.filter(keys)}
+
+    add({rows[(item['part_id'], item['branch_id'])]: item['quantity'] for item in items})
+    levels = [
+        When(pk=rows[(item['part_id'], item['branch_id'])], then=Value(item['reorder_level']))
+        for item in items if item.get('reorder_level') is not None
+    ]
+    if levels:
+        PartStock.objects.filter(pk__in=rows.values()).update(
+            reorder_level=Case(*levels, default=F('reorder_level'), output_field=models.PositiveIntegerField())
+        )
+    return PartStock.objects.select_related('part', 'branch').filter(pk__in=rows.values())
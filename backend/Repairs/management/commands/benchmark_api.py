@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Repairs import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the REST routes against the current database and report latency percentiles, "
+            "queries per request and peak memory as JSON. The 'complete' scenario completes approved "
+            "repairs, and tops up the stock of the parts it uses, among seeded rows only (see seed_repair_data).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(benchmark.SCENARIOS)}. "
+                                                         f"Defaults to all of them.")
+        parser.add_argument('--iterations', type=int, default=100, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per read scenario.")
+        parser.add_argument('--memory-samples', type=int, default=3,
+                            help="Extra requests per scenario run under tracemalloc for peak memory.")
+        parser.add_argument('--base-url', help="Drive a running server over HTTP instead of the test client.")
+        parser.add_argument('--concurrency', type=int, default=1, help="Parallel HTTP requests with --base-url.")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', help="Earlier JSON report to print p95 and query deltas against.")
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(benchmark.SCENARIOS)
+        unknown = set(names) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        settings = dict(iterations=options['iterations'], warmup=options['warmup'],
+                        memory_samples=options['memory_samples'])
+        if options['base_url']:
+            runner = benchmark.HttpRunner(options['base_url'], options['concurrency'], **settings)
+        else:
+            runner = benchmark.ClientRunner(**settings)
+        if runner.targets.admin is None or not runner.targets.equipment:
+            raise CommandError("Nothing to benchmark; seed the database first with seed_repair_data.")
+
+        report = benchmark.report(runner, names)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output)
+            self.stdout.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<24} p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                f"queries {result['queries']['mean']}  peak {result['peak_memory_kib']} KiB  errors {result['errors']}"
+            )
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+            self.stdout.write(f"Against {baseline.get('git_commit')}:")
+            for row in benchmark.compare(baseline, report):
+                self.stdout.write(
+                    f"{row['scenario']:<24} p95 {row['p95_ms'][0]} -> {row['p95_ms'][1]} ms  "
+                    f"queries {row['queries'][0]} -> {row['queries'][1]}"
+                )
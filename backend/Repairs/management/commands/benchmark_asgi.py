@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Repairs import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Compare the read routes served by WSGI with their async views served by ASGI, many requests "
+            "at a time, inside this process. For numbers behind real servers, run benchmark_api with "
+            "--base-url and --concurrency once against a WSGI server (config.wsgi) with the plain "
+            "scenarios and once against an ASGI server (config.asgi) with the *-async ones.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(benchmark.ASYNC_COUNTERPARTS)}. "
+                                                         f"Defaults to all of them.")
+        parser.add_argument('--requests', type=int, default=500, help="Timed requests per scenario and stack.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per scenario and stack.")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(benchmark.ASYNC_COUNTERPARTS)
+        unknown = set(names) - set(benchmark.ASYNC_COUNTERPARTS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        runner = benchmark.DeploymentRunner(
+            options['concurrency'], iterations=options['requests'], warmup=options['warmup'], memory_samples=0,
+        )
+        if runner.targets.admin is None or not runner.targets.equipment:
+            raise CommandError("Nothing to benchmark; seed the database first with seed_repair_data.")
+
+        report = benchmark.report(runner, names)
+        report['concurrency'] = options['concurrency']
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output)
+            self.stdout.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        for name, result in report['scenarios'].items():
+            for stack in ('wsgi', 'asgi'):
+                row = result[stack]
+                self.stdout.write(
+                    f"{name:<16} {stack}  {row['requests_per_second']} req/s  p50 {row['latency_ms']['p50']} ms  "
+                    f"p95 {row['latency_ms']['p95']} ms  errors {row['errors']}"
+                )
@@ -0,0 +1,106 @@
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Equipments.models import Equipment
+from Repairs import stats
+from Repairs.benchmark import server_name
+from Repairs.models import Repair, Technician
+from Staff.models import Staff
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compare approving a morning's pending repairs one request at a time with deciding them through "
+            "the bulk endpoint. Both run on freshly filed requests inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repairs', type=int, default=200, help="Pending repairs decided by each approach.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Decisions per bulk request.")
+        parser.add_argument('--assign', action='store_true',
+                            help="Leave the technician out so every approval is assigned automatically.")
+
+    def handle(self, *args, **options):
+        admin = Staff.objects.filter(role='admin').order_by('pk').first()
+        equipment_ids = list(Equipment.objects.order_by('pk').values_list('pk', flat=True)[:500])
+        technicians = list(Technician.objects.filter(available=True).order_by('staff_id').values_list('staff_id', flat=True))
+        if admin is None or not equipment_ids or not technicians:
+            raise CommandError("Nothing to decide; seed the database first with seed_repair_data.")
+
+        self.client = Client(HTTP_HOST=server_name(), HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        count = options['repairs']
+        try:
+            with transaction.atomic():
+                pending = self.file(admin, equipment_ids, count * 2)
+
+                def decision(i, repair_id):
+                    data = {'repair_id': repair_id, 'status': 'rejected' if i % 10 == 9 else 'approved'}
+                    if not options['assign']:
+                        data['repair_staff_id'] = technicians[i % len(technicians)]
+                    return data
+
+                one_by_one = [decision(i, pk) for i, pk in enumerate(pending[:count])]
+                bulk = [decision(i, pk) for i, pk in enumerate(pending[count:])]
+                report = {
+                    'database': connection.vendor,
+                    'repairs': count,
+                    'assign': options['assign'],
+                    'per_request': self.measure(self.approve_each, one_by_one),
+                    'bulk': self.measure(self.approve_bulk, bulk, options['batch_size']),
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        report['speedup'] = round(report['per_request']['seconds'] / report['bulk']['seconds'], 1)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def file(self, admin, equipment_ids, count):
+        repairs = Repair.objects.bulk_create([
+            Repair(equipment_id=equipment_ids[i % len(equipment_ids)], staff=admin, remark='Bulk approval benchmark')
+            for i in range(count)
+        ])
+        filed = Counter()
+        for repair in Repair.objects.select_related('equipment').filter(pk__in=[r.pk for r in repairs]):
+            filed += stats.repair_counters(repair)
+        stats.record_change(Counter(), filed)
+        return [repair.pk for repair in repairs]
+
+    def measure(self, send, decisions, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            errors = send(decisions, *args)
+            elapsed = time.perf_counter() - started
+        return {
+            'seconds': round(elapsed, 3),
+            'repairs_per_second': round(len(decisions) / elapsed, 1),
+            'queries': len(ctx.captured_queries),
+            'errors': errors,
+        }
+
+    def approve_each(self, decisions):
+        errors = 0
+        for data in decisions:
+            path = reverse('repair-approve', args=[data.pop('repair_id')])
+            errors += self.client.patch(path, data, content_type='application/json').status_code >= 400
+        return errors
+
+    def approve_bulk(self, decisions, batch_size):
+        errors = 0
+        for start in range(0, len(decisions), batch_size):
+            response = self.client.post(
+                reverse('repair-approve-bulk'), {'decisions': decisions[start:start + batch_size]},
+                content_type='application/json',
+            )
+            errors += len(response.json()['failed']) if response.status_code == 200 else 1
+        return errors
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+
+from Equipments.models import Equipment
+from Repairs.benchmark import percentile
+from Repairs.models import Repair
+from Repairs.serializers import RepairCreateSerializer
+from Staff.models import Staff
+
+
+class Command(BaseCommand):
+    help = ("Measure concurrent write throughput of the configured database by filing repair requests "
+            "from several threads at once, each on its own connection. Run it once per DATABASE_ENGINE "
+            "to compare PostgreSQL with tuned SQLite. The requests it files are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help="Repair requests filed per thread.")
+        parser.add_argument('--keep', action='store_true', help="Keep the filed requests instead of deleting them.")
+
+    def handle(self, *args, **options):
+        user = Staff.objects.order_by('pk').first()
+        equipment_ids = list(Equipment.objects.order_by('pk').values_list('pk', flat=True)[:500])
+        if user is None or not equipment_ids:
+            raise CommandError("Nothing to write against; seed the database first with seed_repair_data.")
+
+        barrier = threading.Barrier(options['threads'] + 1)
+        outcomes = [{'ids': [], 'latencies': [], 'errors': 0} for _ in range(options['threads'])]
+        workers = [
+            threading.Thread(target=self.writer, args=(barrier, user, equipment_ids, options['writes'], outcome))
+            for outcome in outcomes
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        ids = [pk for outcome in outcomes for pk in outcome['ids']]
+        latencies = sorted(latency for outcome in outcomes for latency in outcome['latencies'])
+        report = {
+            'database': connection.vendor,
+            'settings': self.database_settings(),
+            'threads': options['threads'],
+            'writes': len(ids),
+            'errors': sum(outcome['errors'] for outcome in outcomes),
+            'seconds': round(elapsed, 3),
+            'writes_per_second': round(len(ids) / elapsed, 1),
+            'latency_ms': {p: round(percentile(latencies, q) * 1000, 3) if latencies else None
+                           for p, q in (('p50', 50), ('p95', 95), ('p99', 99))},
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if not options['keep']:
+            self.cleanup(ids)
+
+    def writer(self, barrier, user, equipment_ids, writes, outcome):
+        request = SimpleNamespace(user=user)
+        try:
+            barrier.wait()
+            for i in range(writes):
+                started = time.perf_counter()
+                try:
+                    serializer = RepairCreateSerializer(
+                        data={'equipment': equipment_ids[i % len(equipment_ids)], 'remark': 'Write benchmark'},
+                        context={'request': request},
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    outcome['ids'].append(serializer.save().pk)
+                except OperationalError:
+                    # SQLite gave up waiting for the write lock
+                    outcome['errors'] += 1
+                outcome['latencies'].append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def database_settings(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                pragmas = {}
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    # in-memory databases have no mmap_size
+                    row = cursor.fetchone()
+                    pragmas[pragma] = row and row[0]
+                return pragmas
+            return {
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'pool': bool(connection.settings_dict.get('OPTIONS', {}).get('pool')),
+            }
+
+    def cleanup(self, ids):
+        # deleting a repair takes it out of the stats rollups too
+        for start in range(0, len(ids), 1000):
+            Repair.objects.select_related('equipment').filter(pk__in=ids[start:start + 1000]).delete()
+        self.stdout.write(f"Deleted {len(ids)} benchmark repair requests.")
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from Equipments.models import Branch
+from Repairs import pdf_export, pdf_pool
+
+
+class Command(BaseCommand):
+    help = ("Render one branch's equipment histories with process pools of different sizes, bypassing the "
+            "PDF cache, and report how throughput scales with the number of processes. Needs WeasyPrint "
+            "and its system libraries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', type=int, help="Branch to export. Defaults to the one with the most equipment.")
+        parser.add_argument('--limit', type=int, default=100, help="Render at most this many histories per run.")
+        parser.add_argument('--processes', type=int, nargs='+',
+                            help="Pool sizes to compare; 0 renders in this process. "
+                                 "Defaults to 0, 1 and powers of two up to the number of cores.")
+
+    def handle(self, *args, **options):
+        branches = Branch.objects.annotate(size=Count('equipment_items')).order_by('-size', 'pk')
+        branch = branches.filter(pk=options['branch']).first() if options['branch'] else branches.first()
+        if branch is None:
+            raise CommandError("Nothing to export; seed the database first with seed_repair_data.")
+        histories = pdf_export.histories(branch)[:options['limit']]
+        if not histories:
+            raise CommandError(f"Branch {branch.pk} has no equipment.")
+
+        cores = os.cpu_count() or 1
+        sizes = options['processes'] or [0, 1] + [2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores]
+        runs = []
+        for processes in sizes:
+            if processes:
+                # start every worker before the clock does
+                pool = pdf_pool.get(processes)
+                list(pool.map(pdf_pool.html_to_pdf, ['<p>warm-up</p>'] * processes * 2))
+            started = time.perf_counter()
+            rendered = sum(1 for _ in pdf_export.documents(histories, processes, use_cache=False))
+            elapsed = time.perf_counter() - started
+            runs.append({
+                'processes': processes,
+                'documents': rendered,
+                'seconds': round(elapsed, 3),
+                'documents_per_second': round(rendered / elapsed, 2),
+            })
+            pdf_pool.discard(processes)
+
+        baseline = runs[0]['seconds']
+        for run in runs:
+            run['speedup'] = round(baseline / run['seconds'], 2)
+        self.stdout.write(json.dumps({
+            'branch': branch.pk,
+            'equipment': len(histories),
+            'repairs': sum(len(repairs) for _, repairs in histories),
+            'cpu_count': cores,
+            'runs': runs,
+        }, indent=2))
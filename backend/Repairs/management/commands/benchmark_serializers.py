@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from Equipments.models import Equipment
+from Equipments.serializers import EquipmentSerializer, EquipmentRowSerializer
+from Repairs.serializers import RepairHistorySerializer, RepairHistoryRowSerializer
+from Repairs.views import repair_history_queryset
+
+
+class Command(BaseCommand):
+    help = ("Serialize the newest equipment and repair history rows with the DRF serializers and with the "
+            ".values() row serializers FAST_READ_SERIALIZERS switches to, and report rows per second for "
+            "each. The queries are timed along with the serializing; both outputs must render identically.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Rows serialized per run.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per approach; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        equipment = Equipment.objects.select_related('branch', 'added_by').order_by('-created_at', '-id')[:rows]
+        repairs = repair_history_queryset().order_by('-created_at', '-id')[:rows]
+        if not equipment.exists():
+            raise CommandError("Nothing to serialize; seed the database first with seed_repair_data.")
+
+        self.repeat = options['repeat']
+        self.stdout.write(json.dumps({
+            'database': connection.vendor,
+            'repeat': self.repeat,
+            'equipment': self.compare(
+                lambda: EquipmentSerializer(equipment.all(), many=True).data,
+                lambda: EquipmentRowSerializer.many(EquipmentRowSerializer.rows(equipment.all())),
+            ),
+            'repair_history': self.compare(
+                lambda: RepairHistorySerializer(repairs.all(), many=True).data,
+                lambda: RepairHistoryRowSerializer.many(RepairHistoryRowSerializer.rows(repairs.all())),
+            ),
+        }, indent=2))
+
+    def compare(self, drf, fast):
+        report = {'rows': len(fast())}
+        for name, serialize in (('drf', drf), ('fast', fast)):
+            best = float('inf')
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                serialize()
+                best = min(best, time.perf_counter() - started)
+            report[name] = {
+                'seconds': round(best, 4),
+                'rows_per_second': round(report['rows'] / best) if best else None,
+            }
+        report['speedup'] = round(report['drf']['seconds'] / report['fast']['seconds'], 2)
+        report['identical'] = JSONRenderer().render(drf()) == JSONRenderer().render(fast())
+        return report
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from Repairs import query_plans, seeding
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot repair workflow queries and fail if any of them scans a whole table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Insert this many throwaway repairs first so the planner sees realistic "
+                                 "table sizes. Everything is rolled back afterwards.")
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help="Print every plan, not only the failing ones.")
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                ids = {}
+                if options['seed']:
+                    seeded = seeding.seed(repairs=options['seed'])
+                    ids = {key: seeded[key] for key in ('equipment_id', 'repair_id', 'branch_id', 'staff_id')}
+                if connection.vendor in ('sqlite', 'postgresql'):
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+
+                for name, queryset in query_plans.hot_queries(**ids).items():
+                    plan = query_plans.explain(queryset)
+                    scans = query_plans.full_scans(plan)
+                    if scans:
+                        failures.append(name)
+                        self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(scans)}"))
+                    else:
+                        self.stdout.write(f"{name}: ok")
+                    if scans or options['verbose_plans']:
+                        self.stdout.write(f"    {plan}".replace('\n', '\n    '))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries scan a whole table: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("Every hot query uses an index."))
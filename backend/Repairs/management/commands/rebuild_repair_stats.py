@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from Repairs import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the repair statistics rollups from the full repair history."
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        for model in stats.ROLLUPS:
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {model.objects.count()} rows")
+        self.stdout.write(self.style.SUCCESS("Repair statistics rebuilt."))
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def worker_main(poll_interval, drain):
+    # spawned children start from a clean interpreter
+    import django
+    django.setup()
+
+    from Repairs import pdf
+    pdf.work(poll_interval=poll_interval, drain=drain)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that render queued PDF jobs outside the web workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                            help="Number of render processes; 0 renders in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle worker waits before checking the queue again.")
+        parser.add_argument('--drain', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for new jobs.")
+
+    def handle(self, *args, **options):
+        from Repairs import pdf
+
+        purged = pdf.purge_finished_jobs()
+        if purged:
+            self.stdout.write(f"Purged {purged} finished jobs.")
+
+        if options['processes'] == 0:
+            processed = pdf.work(poll_interval=options['poll_interval'], drain=options['drain'])
+            self.stdout.write(self.style.SUCCESS(f"Rendered {processed} jobs."))
+            return
+
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=worker_main, args=(options['poll_interval'], options['drain']))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} PDF workers.")
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Repairs import seeding
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic branches, staff, equipment, parts and repairs for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repairs', type=int, default=1000, help="Number of repairs to create.")
+        parser.add_argument('--equipment', type=int, default=None,
+                            help="Number of equipment rows; defaults to a quarter of --repairs.")
+        parser.add_argument('--branches', type=int, default=20)
+        parser.add_argument('--staff', type=int, default=50, help="Number of technicians.")
+        parser.add_argument('--parts', type=int, default=200)
+        parser.add_argument('--months', type=int, default=24,
+                            help="Spread creation dates over this many months back from today.")
+        parser.add_argument('--status-weights', default='',
+                            help="Relative repair status mix, e.g. 'pending=2,approved=2,completed=5,rejected=1'.")
+        parser.add_argument('--branch-skew', type=float, default=1.0,
+                            help="Zipf exponent for how unevenly equipment is spread over branches; 0 is uniform.")
+        parser.add_argument('--part-skew', type=float, default=1.2,
+                            help="Zipf exponent for how unevenly parts are used; 0 is uniform.")
+        parser.add_argument('--max-parts', type=int, default=3, help="Most distinct parts on one completed repair.")
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if min(options['repairs'], options['branches'], options['staff'], options['parts']) < 1:
+            raise CommandError("--repairs, --branches, --staff and --parts must be at least 1.")
+        try:
+            weights = seeding.parse_weights(options['status_weights'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        result = seeding.seed(
+            repairs=options['repairs'],
+            equipment=options['equipment'],
+            branches=options['branches'],
+            staff=options['staff'],
+            parts=options['parts'],
+            months=options['months'],
+            status_weights=weights,
+            branch_skew=options['branch_skew'],
+            part_skew=options['part_skew'],
+            max_parts=options['max_parts'],
+            random_seed=options['random_seed'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(json.dumps(result, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Seeded run '{result['tag']}'."))
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def backfill(apps, schema_editor):
+    # the rollups start from the repairs already recorded; stats.rebuild() as of this migration
+    Repair = apps.get_model('Repairs', 'Repair')
+    RepairPart = apps.get_model('Repairs', 'RepairPart')
+    MonthlyRepairStat = apps.get_model('Repairs', 'MonthlyRepairStat')
+    BranchRepairStat = apps.get_model('Repairs', 'BranchRepairStat')
+    StaffRepairStat = apps.get_model('Repairs', 'StaffRepairStat')
+    PartUsageStat = apps.get_model('Repairs', 'PartUsageStat')
+
+    MonthlyRepairStat.objects.bulk_create(
+        MonthlyRepairStat(month=row['month'].date(), count=row['count'])
+        for row in Repair.objects.annotate(month=TruncMonth('created_at')).values('month')
+        .annotate(count=models.Count('id')).order_by()
+    )
+    BranchRepairStat.objects.bulk_create(
+        BranchRepairStat(branch_id=row['equipment__branch'], count=row['count'])
+        for row in Repair.objects.values('equipment__branch').annotate(count=models.Count('id')).order_by()
+    )
+
+    staff_stats = {}
+    for field, statuses in (('completed', ['completed']), ('workload', ['approved', 'completed', 'pending', 'under_repair'])):
+        rows = Repair.objects.filter(status__in=statuses, repair_staff__isnull=False) \
+            .values('repair_staff').annotate(count=models.Count('id')).order_by()
+        for row in rows:
+            stat = staff_stats.setdefault(row['repair_staff'], StaffRepairStat(staff_id=row['repair_staff']))
+            setattr(stat, field, row['count'])
+    StaffRepairStat.objects.bulk_create(staff_stats.values())
+
+    PartUsageStat.objects.bulk_create(
+        PartUsageStat(part_id=row['part'], branch_id=row['repair__equipment__branch'], quantity=row['total'])
+        for row in RepairPart.objects.values('part', 'repair__equipment__branch')
+        .annotate(total=models.Sum('quantity')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0006_alter_equipment_item_category'),
+        ('Repairs', '0004_repair_report'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRepairStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchRepairStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='repair_stat', to='Equipments.branch')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaffRepairStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed', models.IntegerField(default=0)),
+                ('workload', models.IntegerField(default=0)),
+                ('staff', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='repair_stat', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PartUsageStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='part_usage_stats', to='Equipments.branch')),
+                ('part', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_stats', to='Repairs.part')),
+            ],
+            options={
+                'unique_together': {('part', 'branch')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
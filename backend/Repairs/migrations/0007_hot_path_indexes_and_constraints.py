@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0007_equipment_meta_and_indexes'),
+        ('Repairs', '0006_pdfrenderjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['equipment', '-created_at'], name='repair_equipment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['equipment', 'status', '-completed_at'], name='repair_equipment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['repair_staff', 'status'], name='repair_staff_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(fields=['created_at'], name='repair_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='repair_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repair',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['-completed_at'], name='repair_completed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='repair',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('status', 'completed'), _negated=True), ('completed_at__isnull', False), _connector='OR'), name='repair_completed_has_completed_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='repairpart',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='repairpart_quantity_gte_1'),
+        ),
+    ]
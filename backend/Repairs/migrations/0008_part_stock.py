@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0008_search_index'),
+        ('Repairs', '0007_hot_path_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('reorder_level', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='part_stock', to='Equipments.branch')),
+                ('part', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='Repairs.part')),
+            ],
+            options={
+                'verbose_name': 'Part Stock',
+                'verbose_name_plural': 'Part Stock',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['id'], name='partstock_low_idx'), models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['branch', 'id'], name='partstock_low_branch_idx')],
+                'constraints': [models.UniqueConstraint(fields=('part', 'branch'), name='partstock_part_branch_unique'), models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('part',), name='partstock_central_unique'), models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='partstock_quantity_gte_0')],
+            },
+        ),
+    ]
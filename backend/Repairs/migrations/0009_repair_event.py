@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # what each existing repair's timestamps say happened; approvals were not attributed
+    Repair = apps.get_model('Repairs', 'Repair')
+    RepairEvent = apps.get_model('Repairs', 'RepairEvent')
+    events = []
+    for repair in Repair.objects.order_by('pk').iterator(chunk_size=2000):
+        events.append(RepairEvent(repair_id=repair.pk, actor_id=repair.staff_id, to_status='pending', created_at=repair.created_at))
+        if repair.status == 'rejected':
+            events.append(RepairEvent(repair_id=repair.pk, from_status='pending', to_status='rejected',
+                                      created_at=repair.approved_at or repair.created_at))
+        elif repair.approved_at:
+            events.append(RepairEvent(repair_id=repair.pk, from_status='pending', to_status='approved',
+                                      created_at=repair.approved_at))
+        if repair.status == 'completed' and repair.completed_at:
+            events.append(RepairEvent(repair_id=repair.pk, actor_id=repair.repair_staff_id, from_status='approved',
+                                      to_status='completed', created_at=repair.completed_at))
+        if len(events) >= 5000:
+            RepairEvent.objects.bulk_create(events)
+            events = []
+    RepairEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Repairs', '0008_part_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepairEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('completed', 'Completed')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='repair_events', to=settings.AUTH_USER_MODEL)),
+                ('repair', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='Repairs.repair')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['repair', 'created_at', 'id'], name='repairevent_timeline_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def backfill(apps, schema_editor):
+    # stats.rebuild_periods() as of this migration, so scoped dashboards cover the repairs already recorded
+    Repair = apps.get_model('Repairs', 'Repair')
+    RepairPart = apps.get_model('Repairs', 'RepairPart')
+    RepairPeriodStat = apps.get_model('Repairs', 'RepairPeriodStat')
+    StaffPeriodStat = apps.get_model('Repairs', 'StaffPeriodStat')
+    PartPeriodStat = apps.get_model('Repairs', 'PartPeriodStat')
+    period = ('month', 'equipment__branch', 'equipment__item_category')
+
+    RepairPeriodStat.objects.bulk_create(
+        (
+            RepairPeriodStat(
+                month=row['month'].date(), branch_id=row['equipment__branch'],
+                item_category=row['equipment__item_category'], count=row['count'],
+            )
+            for row in Repair.objects.annotate(month=TruncMonth('created_at')).values(*period)
+            .annotate(count=models.Count('id')).order_by()
+        ),
+        batch_size=5000,
+    )
+
+    staff_stats = {}
+    for field, statuses in (('completed', ['completed']), ('workload', ['approved', 'completed', 'pending', 'under_repair'])):
+        rows = Repair.objects.filter(status__in=statuses, repair_staff__isnull=False) \
+            .annotate(month=TruncMonth('created_at')) \
+            .values(*period, 'repair_staff').annotate(count=models.Count('id')).order_by()
+        for row in rows:
+            key = (row['month'].date(), row['equipment__branch'], row['equipment__item_category'], row['repair_staff'])
+            stat = staff_stats.setdefault(key, StaffPeriodStat(
+                month=key[0], branch_id=key[1], item_category=key[2], staff_id=key[3],
+            ))
+            setattr(stat, field, row['count'])
+    StaffPeriodStat.objects.bulk_create(staff_stats.values(), batch_size=5000)
+
+    PartPeriodStat.objects.bulk_create(
+        (
+            PartPeriodStat(
+                month=row['month'].date(), branch_id=row['repair__equipment__branch'],
+                item_category=row['repair__equipment__item_category'], part_id=row['part'], quantity=row['total'],
+            )
+            for row in RepairPart.objects.annotate(month=TruncMonth('repair__created_at'))
+            .values('month', 'repair__equipment__branch', 'repair__equipment__item_category', 'part')
+            .annotate(total=models.Sum('quantity')).order_by()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0008_search_index'),
+        ('Repairs', '0009_repair_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartPeriodStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('item_category', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='part_period_stats', to='Equipments.branch')),
+                ('part', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_stats', to='Repairs.part')),
+            ],
+            options={
+                'unique_together': {('month', 'branch', 'item_category', 'part')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RepairPeriodStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('item_category', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repair_period_stats', to='Equipments.branch')),
+            ],
+            options={
+                'unique_together': {('month', 'branch', 'item_category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StaffPeriodStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('item_category', models.CharField(max_length=100)),
+                ('completed', models.IntegerField(default=0)),
+                ('workload', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staff_period_stats', to='Equipments.branch')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('month', 'branch', 'item_category', 'staff')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def enlist_technicians(apps, schema_editor):
+    # active technicians join the queue; anyone with open work keeps a row so the mirror stays whole
+    Staff = apps.get_model('Staff', 'Staff')
+    Repair = apps.get_model('Repairs', 'Repair')
+    Technician = apps.get_model('Repairs', 'Technician')
+    workload = dict(
+        Repair.objects.filter(status__in=['pending', 'approved', 'under_repair'], repair_staff__isnull=False)
+        .values('repair_staff').annotate(count=models.Count('id')).order_by().values_list('repair_staff', 'count')
+    )
+    eligible = set(Staff.objects.filter(role='staff', is_active=True).values_list('pk', flat=True))
+    Technician.objects.bulk_create(
+        [
+            Technician(staff_id=pk, available=pk in eligible, workload=workload.get(pk, 0))
+            for pk in sorted(eligible | set(workload))
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Equipments', '0008_search_index'),
+        ('Repairs', '0010_period_stat_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Technician',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('available', models.BooleanField(default=False)),
+                ('workload', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='technicians', to='Equipments.branch')),
+                ('staff', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='technician', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('available', True)), fields=['workload', 'staff'], name='technician_queue_idx'), models.Index(condition=models.Q(('available', True)), fields=['branch', 'workload', 'staff'], name='technician_branch_queue_idx')],
+            },
+        ),
+        migrations.RunPython(enlist_technicians, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+def mark_withdrawn(apps, schema_editor):
+    # rows enlist() took out; the rest of the unavailable ones were an admin's doing
+    Technician = apps.get_model('Repairs', 'Technician')
+    Technician.objects.filter(available=False).exclude(staff__role='staff', staff__is_active=True) \
+        .update(withdrawn=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Repairs', '0011_technician_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='technician',
+            name='withdrawn',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_withdrawn, migrations.RunPython.noop),
+    ]
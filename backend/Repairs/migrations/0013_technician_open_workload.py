@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+def count_open_repairs(apps, schema_editor):
+    # the queue counted completed repairs too, so nobody's load ever went down
+    Repair = apps.get_model('Repairs', 'Repair')
+    Technician = apps.get_model('Repairs', 'Technician')
+    open_repairs = Repair.objects.filter(
+        repair_staff=models.OuterRef('staff'), status__in=['pending', 'approved', 'under_repair']
+    ).order_by().values('repair_staff').annotate(count=models.Count('id')).values('count')
+    Technician.objects.update(workload=models.functions.Coalesce(models.Subquery(open_repairs[:1]), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Repairs', '0012_technician_withdrawn'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_open_repairs, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 from Staff.models import Staff
 class Part(models.Model):
@@ -38,6 +39,92 @@ class Repair(models.Model):
         verbose_name = "Repair"
         verbose_name_plural = "Repairs"
         ordering = ['-created_at']
+        indexes = [
+            # EquipmentRepairHistoryView
+            models.Index(fields=['equipment', '-created_at'], name='repair_equipment_created_idx'),
+            # equipment history PDF
+            models.Index(fields=['equipment', 'status', '-completed_at'], name='repair_equipment_status_idx'),
+            # staff workload and completed counts
+            models.Index(fields=['repair_staff', 'status'], name='repair_staff_status_idx'),
+            # monthly rollup rebuild
+            models.Index(fields=['created_at'], name='repair_created_idx'),
+            # approval triage queue
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='repair_pending_idx'),
+            # recently completed repairs
+            models.Index(fields=['-completed_at'], condition=models.Q(status='completed'), name='repair_completed_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(status='completed') | models.Q(completed_at__isnull=False),
+                name='repair_completed_has_completed_at',
+            ),
+        ]
+
+class RepairEvent(models.Model):
+    """
+    One status transition of a repair. Rows are only ever added, in the
+    transaction that changes the repair, so the log is the repair's full
+    history where the Repair row keeps only its latest state.
+    """
+    # the timeline index below leads with repair, so the FK needs no index of its own
+    repair = models.ForeignKey(Repair, on_delete=models.CASCADE, related_name='events', db_index=False)
+    actor = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, related_name='repair_events')
+    # blank for the request that created the repair
+    from_status = models.CharField(max_length=20, choices=Repair.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Repair.STATUS_CHOICES)
+    # not auto_now_add: events rebuilt from a repair's timestamps keep them
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['repair', 'created_at', 'id'], name='repairevent_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"Repair #{self.repair_id}: {self.from_status or 'new'} -> {self.to_status}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Repair events are append-only.")
+        super().save(*args, **kwargs)
+
+
+class PartStock(models.Model):
+    part = models.ForeignKey(Part, on_delete=models.CASCADE, related_name='stock')
+    # no branch is the central store, which branches without their own row draw on
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.CASCADE, null=True, blank=True, related_name='part_stock')
+    quantity = models.IntegerField(default=0)
+    reorder_level = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Part Stock'
+        verbose_name_plural = 'Part Stock'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['part', 'branch'], name='partstock_part_branch_unique'),
+            # NULLs never collide in the constraint above
+            models.UniqueConstraint(fields=['part'], condition=models.Q(branch__isnull=True), name='partstock_central_unique'),
+            # what stops two completions from drawing the same last units
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='partstock_quantity_gte_0'),
+        ]
+        indexes = [
+            # low-stock listing, paged by id across all branches or within one: only
+            # the rows at or under their reorder level are indexed
+            models.Index(fields=['id'], condition=models.Q(quantity__lte=models.F('reorder_level')),
+                         name='partstock_low_idx'),
+            models.Index(fields=['branch', 'id'], condition=models.Q(quantity__lte=models.F('reorder_level')),
+                         name='partstock_low_branch_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.part} @ {self.branch or 'central store'}: {self.quantity}"
+
+    @property
+    def is_low(self):
+        return self.quantity <= self.reorder_level
+
 
 class RepairPart(models.Model):
     repair = models.ForeignKey(Repair, on_delete=models.CASCADE, related_name='repair_parts')
@@ -48,9 +135,149 @@ class RepairPart(models.Model):
 
     class Meta:
         unique_together = ('repair', 'part')
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='repairpart_quantity_gte_1'),
+        ]
         verbose_name = 'Repair Part'
         verbose_name_plural = 'Repair Parts'
         ordering = ['repair']
 
     def __str__(self):
-        return f"Repair #{self.repair.id} - {self.part.name} (x{self.quantity})"
\ No newline at end of file
+        return f"Repair #{self.repair.id} - {self.part.name} (x{self.quantity})"
+
+class MonthlyRepairStat(models.Model):
+    month = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.month:%b %Y}: {self.count}"
+
+class BranchRepairStat(models.Model):
+    branch = models.OneToOneField('Equipments.Branch', on_delete=models.CASCADE, related_name='repair_stat')
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.branch}: {self.count}"
+
+class StaffRepairStat(models.Model):
+    staff = models.OneToOneField(Staff, on_delete=models.CASCADE, related_name='repair_stat')
+    completed = models.IntegerField(default=0)
+    workload = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.staff}: {self.completed} completed, {self.workload} open"
+
+class PartUsageStat(models.Model):
+    part = models.ForeignKey(Part, on_delete=models.CASCADE, related_name='usage_stats')
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.CASCADE, related_name='part_usage_stats')
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('part', 'branch')
+
+    def __str__(self):
+        return f"{self.part} @ {self.branch}: {self.quantity}"
+
+class Technician(models.Model):
+    """
+    A technician's place in the automatic assignment queue. `workload`
+    counts their open repairs (StaffRepairStat.workload also counts the
+    completed ones) and moves in the transaction that changes a repair,
+    so the least-loaded available technician, overall or at
+    a home branch, is the first entry of one of the partial indexes below.
+    """
+    staff = models.OneToOneField(Staff, on_delete=models.CASCADE, related_name='technician')
+    # where they normally work; repairs there go to them first
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.SET_NULL, null=True, blank=True, related_name='technicians')
+    available = models.BooleanField(default=False)
+    # taken out because the staff member can no longer take repairs (deactivated, another role)
+    # rather than by an admin, so they rejoin when that changes
+    withdrawn = models.BooleanField(default=False)
+    workload = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['workload', 'staff'], condition=models.Q(available=True), name='technician_queue_idx'),
+            models.Index(fields=['branch', 'workload', 'staff'], condition=models.Q(available=True),
+                         name='technician_branch_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.staff}: {self.workload} open{'' if self.available else ' (unavailable)'}"
+
+# The same counts per month, branch and equipment category, which is what
+# a dashboard scoped to a date range, branch or category sums over. A range
+# of years reads at most months x branches x categories rows per table.
+
+class RepairPeriodStat(models.Model):
+    month = models.DateField()
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.CASCADE, related_name='repair_period_stats')
+    item_category = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('month', 'branch', 'item_category')
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.branch} {self.item_category}: {self.count}"
+
+class StaffPeriodStat(models.Model):
+    month = models.DateField()
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.CASCADE, related_name='staff_period_stats')
+    item_category = models.CharField(max_length=100)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='period_stats')
+    completed = models.IntegerField(default=0)
+    workload = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('month', 'branch', 'item_category', 'staff')
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.staff}: {self.completed} completed, {self.workload} open"
+
+class PartPeriodStat(models.Model):
+    month = models.DateField()
+    branch = models.ForeignKey('Equipments.Branch', on_delete=models.CASCADE, related_name='part_period_stats')
+    item_category = models.CharField(max_length=100)
+    part = models.ForeignKey(Part, on_delete=models.CASCADE, related_name='period_stats')
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('month', 'branch', 'item_category', 'part')
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.part} @ {self.branch}: {self.quantity}"
+
+class PdfRenderJob(models.Model):
+    KIND_CHOICES = [
+    ('receipt', 'Repair Receipt'),
+    ('equipment_history', 'Equipment Repair History'),
+]
+    STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    requested_by = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, related_name='pdf_jobs')
+    file = models.FileField(upload_to='pdf_jobs/', blank=True)
+    filename = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} ({self.status})"
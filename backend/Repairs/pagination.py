@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PartStockCursorPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('id',)
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import Q
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+
+from Equipments.models import Equipment
+from .models import Repair, RepairPart, PdfRenderJob
+from . import pdf_cache
+
+# a running job whose worker died is picked up again after this long
+RENDER_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+JOB_RETENTION = timedelta(days=1)
+
+
+def html_to_pdf(html_string):
+    # WeasyPrint pulls in pango/cairo, so only processes that actually render load it
+    from weasyprint import HTML
+    return HTML(string=html_string).write_pdf()
+
+
+def render_equipment_history(equipment):
+    repairs = equipment.repairs.filter(status='completed') \
+        .select_related('repair_staff') \
+        .prefetch_related('repair_parts__part') \
+        .order_by('-completed_at')
+    return html_to_pdf(render_to_string(TEMPLATES['equipment_history'], {
+        'equipment': equipment,
+        'repairs': repairs
+    }))
+
+
+def render_repair_receipt(repair):
+    return html_to_pdf(render_to_string(TEMPLATES['receipt'], {
+        'repair': repair
+    }))
+
+
+def equipment_history_filename(equipment):
+    return f"equipment_{equipment.tag_number}_repairs.pdf"
+
+
+def receipt_filename(repair):
+    return f"repair_{repair.id}_receipt.pdf"
+
+
+RENDERERS = {
+    'receipt': (render_repair_receipt, receipt_filename),
+    'equipment_history': (render_equipment_history, equipment_history_filename),
+}
+
+TEMPLATES = {
+    'receipt': 'repair_receipt.html',
+    'equipment_history': 'repair_PDF.html',
+}
+
+_template_versions = {}
+
+
+def template_version(name):
+    if name not in _template_versions:
+        source = get_template(name).template.source
+        _template_versions[name] = hashlib.sha256(source.encode()).hexdigest()[:16]
+    return _template_versions[name]
+
+
+def receipt_state(repair):
+    parts = list(repair.repair_parts.order_by('part_id').values_list('part_id', 'part__name', 'quantity'))
+    staff = repair.repair_staff
+    state = [
+        repair.pk, repair.status, repair.completed_at, repair.created_at, repair.report, repair.remark,
+        staff and [staff.pk, staff.first_name, staff.last_name],
+        [repair.equipment.tag_number, repair.equipment.serial_number, repair.equipment.branch.name],
+        parts,
+    ]
+    return state
+
+
+def equipment_history_state(equipment):
+    repairs = list(
+        equipment.repairs.filter(status='completed')
+        .order_by('-completed_at')
+        .values_list('id', 'completed_at', 'report', 'remark', 'repair_staff__first_name', 'repair_staff__last_name')
+    )
+    parts = list(
+        RepairPart.objects.filter(repair__equipment=equipment, repair__status='completed')
+        .order_by('repair_id', 'part_id')
+        .values_list('repair_id', 'part__name', 'quantity')
+    )
+    return history_state(equipment, repairs, parts)
+
+
+def history_state(equipment, repairs, parts):
+    """
+    equipment_history_state() from rows already read: repairs as (id,
+    completed_at, report, remark, staff first and last name) and parts as
+    (repair_id, part name, quantity), in the same order.
+    """
+    state = [
+        equipment.pk, equipment.tag_number, equipment.serial_number, equipment.item_category, equipment.branch.name,
+        repairs, parts,
+    ]
+    return state
+
+
+STATES = {
+    'receipt': receipt_state,
+    'equipment_history': equipment_history_state,
+}
+
+
+def fingerprint(kind, target):
+    """
+    Hash of everything a document is rendered from: the cache key and the
+    ETag. There is no Last-Modified to go with it, as no single date
+    changes with every field the document shows.
+    """
+    return digest_of(kind, STATES[kind](target))
+
+
+def digest_of(kind, state):
+    payload = json.dumps([kind, template_version(TEMPLATES[kind]), state], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_cached(kind, target, digest=None):
+    if digest is None:
+        digest = fingerprint(kind, target)
+    content = pdf_cache.get(kind, target.pk, digest)
+    if content is None:
+        renderer, _ = RENDERERS[kind]
+        content = renderer(target)
+        pdf_cache.put(kind, target.pk, digest, content)
+    return content
+
+
+def load_target(kind, object_id):
+    if kind == 'receipt':
+        return Repair.objects.select_related('equipment__branch', 'repair_staff') \
+            .prefetch_related('repair_parts__part') \
+            .get(pk=object_id, status='completed')
+    return Equipment.objects.select_related('branch').get(pk=object_id)
+
+
+def render(kind, object_id):
+    """Render one document, returning (download filename, pdf bytes)."""
+    target = load_target(kind, object_id)
+    _, filename = RENDERERS[kind]
+    return filename(target), render_cached(kind, target)
+
+
+def enqueue(kind, object_id, user=None):
+    # only the requester (and admins) can see a job, so reuse only their own;
+    # a second requester's render is served from the PDF cache anyway
+    pending = PdfRenderJob.objects.filter(
+        kind=kind, object_id=object_id, requested_by=user, status__in=['queued', 'running']
+    ).first()
+    if pending:
+        return pending
+    return PdfRenderJob.objects.create(kind=kind, object_id=object_id, requested_by=user)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest runnable job to 'running'. The conditional
+    UPDATE only succeeds for one worker, so no row locks are needed.
+    """
+    now = timezone.now()
+    candidates = PdfRenderJob.objects.filter(
+        Q(status='queued') | Q(status='running', started_at__lt=now - RENDER_TIMEOUT)
+    ).order_by('created_at').values_list('pk', 'status', 'attempts')[:10]
+
+    for pk, status, attempts in candidates:
+        claim = PdfRenderJob.objects.filter(pk=pk, status=status, attempts=attempts)
+        if attempts >= MAX_ATTEMPTS:
+            claim.update(status='failed', error="Render timed out.", finished_at=now)
+            continue
+        if claim.update(status='running', started_at=now, attempts=attempts + 1):
+            return PdfRenderJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    try:
+        filename, pdf = render(job.kind, job.object_id)
+    except ObjectDoesNotExist:
+        job.status = 'failed'
+        job.error = "Document no longer available."
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc(limit=5)
+    else:
+        job.file.save(f"{job.kind}_{job.object_id}_{job.pk}.pdf", ContentFile(pdf), save=False)
+        job.filename = filename
+        job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def work(poll_interval=1.0, drain=False):
+    """Claim and render jobs until stopped, or until the queue is empty if `drain`."""
+    processed = 0
+    while True:
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            if drain:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+
+
+def purge_finished_jobs(older_than=JOB_RETENTION):
+    expired = PdfRenderJob.objects.filter(
+        status__in=['done', 'failed'], finished_at__lt=timezone.now() - older_than
+    )
+    for job in expired.exclude(file=''):
+        job.file.delete(save=False)
+    return expired.delete()[0]
@@ -0,0 +1,68 @@
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def cache_root():
+    return Path(settings.MEDIA_ROOT) / 'pdf_cache'
+
+
+def entry_dir(kind, object_id):
+    return cache_root() / f'{kind}_{object_id}'
+
+
+def get(kind, object_id, digest):
+    path = entry_dir(kind, object_id) / f'{digest}.pdf'
+    try:
+        content = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    # mtime doubles as the last-used stamp for LRU eviction
+    os.utime(path)
+    return content
+
+
+def put(kind, object_id, digest, content):
+    directory = entry_dir(kind, object_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, directory / f'{digest}.pdf')
+
+    # only the newest state of a document is ever requested again
+    for stale in directory.glob('*.pdf'):
+        if stale.stem != digest:
+            stale.unlink(missing_ok=True)
+    evict(getattr(settings, 'PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def invalidate(kind, object_id):
+    directory = entry_dir(kind, object_id)
+    for path in directory.glob('*.pdf'):
+        path.unlink(missing_ok=True)
+
+
+def evict(max_bytes):
+    """Drop least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    total = 0
+    for path in cache_root().glob('*/*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+    return total
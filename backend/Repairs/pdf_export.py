@@ -0,0 +1,161 @@
+"""
+A branch's equipment histories in one download. The equipment, its
+completed repairs and their parts are read in three queries however
+many machines the branch has; histories already in the PDF cache are
+reused and the rest are rendered across a process pool, a few per
+process in flight at a time. The ZIP is streamed entry by entry as the
+documents finish. The merged PDF is built in memory by pypdf, which
+holds every page until it writes, so it is capped at
+PDF_MERGE_MAX_DOCUMENTS equipment histories; larger branches take the ZIP.
+"""
+import importlib.util
+import io
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from Equipments.models import Equipment
+from .models import Repair, RepairPart
+from . import pdf, pdf_cache, pdf_pool
+
+KIND = 'equipment_history'
+CHUNK_SIZE = 64 * 1024
+# renders queued per process, so finished documents never pile up waiting to be sent
+IN_FLIGHT_PER_PROCESS = 2
+
+
+def histories(branch):
+    """(equipment, its completed repairs, newest first) for every machine at `branch`, by tag number."""
+    equipment = list(Equipment.objects.filter(branch=branch).order_by('tag_number'))
+    repairs = {e.pk: [] for e in equipment}
+    completed = Repair.objects.filter(equipment__branch=branch, status='completed') \
+        .select_related('repair_staff') \
+        .prefetch_related(Prefetch('repair_parts', queryset=RepairPart.objects.select_related('part'))) \
+        .order_by('-completed_at')
+    for repair in completed:
+        repairs[repair.equipment_id].append(repair)
+    for e in equipment:
+        e.branch = branch
+    return [(e, repairs[e.pk]) for e in equipment]
+
+
+def fingerprint(equipment, repairs):
+    """pdf.fingerprint() for an equipment history, from the rows histories() read."""
+    rows = [
+        (r.pk, r.completed_at, r.report, r.remark,
+         r.repair_staff and r.repair_staff.first_name, r.repair_staff and r.repair_staff.last_name)
+        for r in repairs
+    ]
+    parts = sorted((r.pk, p.part_id, p.part.name, p.quantity) for r in repairs for p in r.repair_parts.all())
+    return pdf.digest_of(KIND, pdf.history_state(equipment, rows, [(r, name, q) for r, _, name, q in parts]))
+
+
+def documents(histories, processes, use_cache=True):
+    """
+    Yield (position, filename, pdf bytes) for each of `histories`: cached
+    documents straight away, rendered ones as they finish. `processes` 0
+    renders in this process.
+    """
+    _, filename = pdf.RENDERERS[KIND]
+    todo = []
+    for position, (equipment, repairs) in enumerate(histories):
+        digest = fingerprint(equipment, repairs)
+        content = pdf_cache.get(KIND, equipment.pk, digest) if use_cache else None
+        if content is not None:
+            yield position, filename(equipment), content
+        else:
+            todo.append((position, equipment, repairs, digest))
+
+    def html(equipment, repairs):
+        return render_to_string(pdf.TEMPLATES[KIND], {'equipment': equipment, 'repairs': repairs})
+
+    def finished(position, equipment, digest, content):
+        if use_cache:
+            pdf_cache.put(KIND, equipment.pk, digest, content)
+        return position, filename(equipment), content
+
+    if not processes:
+        for position, equipment, repairs, digest in todo:
+            yield finished(position, equipment, digest, pdf.html_to_pdf(html(equipment, repairs)))
+        return
+
+    pool = pdf_pool.get(processes)
+    todo.reverse()
+    running = {}
+    try:
+        while todo or running:
+            while todo and len(running) < processes * IN_FLIGHT_PER_PROCESS:
+                position, equipment, repairs, digest = todo.pop()
+                running[pool.submit(pdf_pool.html_to_pdf, html(equipment, repairs))] = (position, equipment, digest)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, equipment, digest = running.pop(future)
+                yield finished(position, equipment, digest, future.result())
+    except BrokenProcessPool:
+        pdf_pool.discard(processes)
+        raise
+    finally:
+        for future in running:
+            future.cancel()
+
+
+class Spool:
+    """A write-only file zipfile can stream into; take() hands over what was written since the last call."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def zip_stream(documents):
+    spool = Spool()
+    # PDFs are compressed already
+    with zipfile.ZipFile(spool, 'w', zipfile.ZIP_STORED) as archive:
+        for _, filename, content in documents:
+            archive.writestr(filename, content)
+            yield spool.take()
+    yield spool.take()
+
+
+def can_merge():
+    return importlib.util.find_spec('pypdf') is not None
+
+
+def merged_stream(documents):
+    """
+    One PDF with every document's pages, in position order. Needs pypdf.
+    PdfWriter.append() copies each document's pages into the writer, so
+    the whole result is in memory until it is written out.
+    """
+    from pypdf import PdfWriter
+
+    rendered = {position: content for position, _, content in documents}
+    writer = PdfWriter()
+    for position in sorted(rendered):
+        writer.append(io.BytesIO(rendered.pop(position)))
+    with tempfile.TemporaryFile() as merged:
+        writer.write(merged)
+        writer.close()
+        merged.seek(0)
+        while chunk := merged.read(CHUNK_SIZE):
+            yield chunk
@@ -0,0 +1,52 @@
+"""
+Process pools that turn HTML into PDF for the branch export, created on
+first use and shared by every request the web process serves. Children
+are spawned rather than forked so they inherit none of the server's
+threads or database connections; nothing from Django is imported here
+at the top, since a child loads this module before django.setup() runs.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def start_worker():
+    import django
+    django.setup()
+
+
+def html_to_pdf(html):
+    from Repairs import pdf
+    return pdf.html_to_pdf(html)
+
+
+def get(processes):
+    with _lock:
+        if processes not in _pools:
+            _pools[processes] = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context('spawn'), initializer=start_worker,
+            )
+        return _pools[processes]
+
+
+def discard(processes):
+    """Drop a pool whose worker died, so the next export starts a fresh one."""
+    with _lock:
+        pool = _pools.pop(processes, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+atexit.register(shutdown)
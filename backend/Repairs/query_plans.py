@@ -0,0 +1,74 @@
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from Equipments.models import Equipment
+from Equipments.pagination import after
+from .models import Repair, RepairPart, PdfRenderJob, PartStock, RepairEvent, Technician
+from .stats import WORKLOAD_STATUSES
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?\s*$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+def hot_queries(equipment_id=1, repair_id=1, branch_id=1, staff_id=1):
+    """
+    The queries behind the request paths that run on every page load or
+    workflow step, keyed by a short name. Full exports and the rollup
+    rebuild read whole tables on purpose and are left out.
+    """
+    now = timezone.now()
+    return {
+        'equipment-list': Equipment.objects.select_related('branch', 'added_by')
+            .order_by('-created_at', '-id')[:51],
+        'equipment-list-next-page': Equipment.objects.select_related('branch', 'added_by')
+            .filter(after(('-created_at', '-id'), (now, equipment_id)))
+            .order_by('-created_at', '-id')[:51],
+        'equipment-list-filtered': Equipment.objects.select_related('branch', 'added_by')
+            .filter(branch_id=branch_id, status='working', item_category='Computer')
+            .order_by('-created_at', '-id')[:51],
+        'equipment-by-tag': Equipment.objects.filter(tag_number=equipment_id),
+        'repair-history': Repair.objects.select_related('equipment__branch', 'repair_staff')
+            .filter(equipment_id=equipment_id)
+            .order_by('-created_at'),
+        'repair-history-batch': Repair.objects.filter(equipment_id__in=[equipment_id, equipment_id + 1])
+            .order_by('-created_at'),
+        'repair-parts': RepairPart.objects.select_related('part').filter(repair_id__in=[repair_id, repair_id + 1]),
+        'equipment-history-pdf': Repair.objects.filter(equipment_id=equipment_id, status='completed')
+            .order_by('-completed_at'),
+        'repair-receipt': Repair.objects.filter(pk=repair_id, status='completed'),
+        'pending-repairs': Repair.objects.filter(status='pending').order_by('created_at')[:50],
+        'recently-completed': Repair.objects.filter(status='completed').order_by('-completed_at')[:50],
+        'staff-workload': Repair.objects.filter(repair_staff_id=staff_id, status__in=WORKLOAD_STATUSES),
+        'part-stock-drawn-from': PartStock.objects.filter(
+            Q(branch_id=branch_id) | Q(branch__isnull=True), part_id__in=[repair_id, repair_id + 1]
+        ),
+        'low-stock': PartStock.objects.filter(quantity__lte=F('reorder_level')).order_by('id')[:101],
+        'low-stock-branch': PartStock.objects.filter(branch_id=branch_id, quantity__lte=F('reorder_level'))
+            .order_by('id')[:101],
+        'repair-timeline': RepairEvent.objects.filter(repair_id=repair_id).order_by('created_at', 'id'),
+        'least-loaded-technician': Technician.objects.filter(available=True).order_by('workload', 'staff_id')[:1],
+        'least-loaded-technician-at-branch': Technician.objects.filter(available=True, branch_id=branch_id)
+            .order_by('workload', 'staff_id')[:1],
+        'pdf-job-claim': PdfRenderJob.objects.filter(
+            Q(status='queued') | Q(status='running', started_at__lt=now - timedelta(minutes=10))
+        ).order_by('created_at')[:10],
+    }
+
+
+def full_scans(plan):
+    """Tables an EXPLAIN plan reads without using an index."""
+    pattern = POSTGRES_SCAN if connection.vendor == 'postgresql' else SQLITE_SCAN
+    return sorted({m.group(1) for line in plan.splitlines() if (m := pattern.search(line))})
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        # on small tables the planner prefers a seq scan anyway; this asks
+        # whether a usable index exists rather than whether it is cheaper
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
@@ -0,0 +1,177 @@
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from Equipments import search
+from Equipments.models import Branch, Equipment
+from Staff.models import Staff
+from .models import Repair, RepairPart, Part, PartStock, RepairEvent, Technician
+from . import stats, events
+
+DEFAULT_STATUS_WEIGHTS = {
+    'pending': 2,
+    'approved': 2,
+    'completed': 5,
+    'rejected': 1,
+}
+CATEGORIES = [choice for choice, _ in Equipment.ITEM_CATEGORY_CHOICES]
+BATCH_SIZE = 5000
+
+
+def zipf_weights(count, skew):
+    """Cumulative popularity weights where item i is (i + 1) ** skew times rarer than the first."""
+    return list(accumulate(1 / (i + 1) ** skew for i in range(count)))
+
+
+@contextmanager
+def manual_timestamps(*fields):
+    # auto_now_add would stamp every seeded row with the same instant
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_weights(value):
+    """'completed=6,pending=1' -> {'completed': 6.0, 'pending': 1.0}"""
+    weights = {}
+    for item in filter(None, value.split(',')):
+        status, _, weight = item.partition('=')
+        if status not in dict(Repair.STATUS_CHOICES):
+            raise ValueError(f"Unknown repair status '{status}'.")
+        weights[status] = float(weight)
+    return weights
+
+
+# every seeded branch, staff member and part is named with this
+NAME_PREFIX = 'seed-'
+
+
+def seed(repairs=1000, equipment=None, branches=20, staff=50, parts=200, months=24,
+         status_weights=None, branch_skew=1.0, part_skew=1.2, max_parts=3, random_seed=0, log=None):
+    """
+    Insert a synthetic repair history and rebuild the stats rollups. Rows are
+    namespaced by a run tag so repeated runs add to the data instead of
+    colliding on unique fields. Returns the primary keys a caller needs to
+    address the data, plus the row counts.
+    """
+    rng = random.Random(random_seed)
+    tag = uuid.uuid4().hex[:8]
+    equipment = equipment or max(1, repairs // 4)
+    status_weights = status_weights or DEFAULT_STATUS_WEIGHTS
+    statuses = list(status_weights)
+    status_cum = list(accumulate(status_weights.values()))
+    now = timezone.now()
+    span = timedelta(days=30 * months).total_seconds()
+    log = log or (lambda message: None)
+
+    with transaction.atomic():
+        branch_rows = Branch.objects.bulk_create([Branch(name=f'{NAME_PREFIX}{tag}-{i}') for i in range(branches)])
+        admin = Staff.objects.create(
+            username=f'{NAME_PREFIX}{tag}-admin', email=f'{NAME_PREFIX}{tag}-admin@gmail.com', role='admin',
+            first_name='Seed', last_name='Admin', password='!',
+        )
+        staff_rows = Staff.objects.bulk_create([
+            Staff(username=f'{NAME_PREFIX}{tag}-{i}', email=f'{NAME_PREFIX}{tag}-{i}@gmail.com', role='staff',
+                  first_name='Seed', last_name=f'Tech {i}', password='!')
+            for i in range(staff)
+        ])
+        # technicians spread over the branches as their home base; the rebuild fills in their workload
+        Technician.objects.bulk_create([
+            Technician(staff=row, branch=branch_rows[i % branches], available=True)
+            for i, row in enumerate(staff_rows)
+        ])
+        part_rows = Part.objects.bulk_create([Part(name=f'{NAME_PREFIX}{tag}-part-{i}') for i in range(parts)])
+        # a central row per part and a row per branch and part, about one in ten at or under its reorder level
+        stock_rows = PartStock.objects.bulk_create(
+            [
+                PartStock(part=part, branch=branch, quantity=rng.randint(0, 60), reorder_level=5)
+                for part in part_rows for branch in [None, *branch_rows]
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        log(f"Created {branches} branches, {staff + 1} staff, {parts} parts and {len(stock_rows)} stock rows.")
+
+        branch_cum = zipf_weights(branches, branch_skew)
+        part_cum = zipf_weights(parts, part_skew)
+        first_tag = (Equipment.objects.order_by('-tag_number').values_list('tag_number', flat=True).first() or 0) + 1
+
+        equipment_ids = []
+        with manual_timestamps(Equipment._meta.get_field('created_at')):
+            for start in range(0, equipment, BATCH_SIZE):
+                batch = Equipment.objects.bulk_create([
+                    Equipment(
+                        tag_number=first_tag + i,
+                        serial_number=f'SEED-{tag}-{i}',
+                        item_category=rng.choice(CATEGORIES),
+                        branch=rng.choices(branch_rows, cum_weights=branch_cum)[0],
+                        status='working',
+                        added_by=admin,
+                        created_at=now - timedelta(seconds=rng.uniform(0, span)),
+                    )
+                    for i in range(start, min(start + BATCH_SIZE, equipment))
+                ])
+                equipment_ids.extend(e.pk for e in batch)
+        log(f"Created {equipment} equipment.")
+
+        part_count = event_count = 0
+        first_repair = None
+        with manual_timestamps(Repair._meta.get_field('created_at')):
+            for start in range(0, repairs, BATCH_SIZE):
+                batch = []
+                for _ in range(start, min(start + BATCH_SIZE, repairs)):
+                    status = rng.choices(statuses, cum_weights=status_cum)[0]
+                    created_at = now - timedelta(seconds=rng.uniform(0, span))
+                    batch.append(Repair(
+                        equipment_id=rng.choice(equipment_ids),
+                        staff=rng.choice(staff_rows),
+                        repair_staff=rng.choice(staff_rows) if status not in ('pending', 'rejected') else None,
+                        status=status,
+                        remark='Seeded repair request',
+                        report='Seeded repair report' if status == 'completed' else '',
+                        approved_at=created_at + timedelta(hours=rng.uniform(1, 48)) if status != 'pending' else None,
+                        completed_at=created_at + timedelta(days=rng.uniform(1, 14)) if status == 'completed' else None,
+                        created_at=created_at,
+                    ))
+                batch = Repair.objects.bulk_create(batch)
+                first_repair = first_repair or batch[0].pk
+
+                repair_parts = []
+                for repair in batch:
+                    if repair.status != 'completed':
+                        continue
+                    used = {rng.choices(part_rows, cum_weights=part_cum)[0] for _ in range(rng.randint(0, max_parts))}
+                    repair_parts.extend(RepairPart(repair=repair, part=part, quantity=rng.randint(1, 3)) for part in used)
+                RepairPart.objects.bulk_create(repair_parts)
+                part_count += len(repair_parts)
+                event_count += len(RepairEvent.objects.bulk_create(
+                    [event for repair in batch for event in events.reconstruct(repair)], batch_size=BATCH_SIZE
+                ))
+                log(f"Created {start + len(batch)} of {repairs} repairs.")
+
+        stats.rebuild()
+        # bulk inserts skip the post_save indexing
+        search.rebuild()
+        log("Rebuilt the repair statistics rollups and the search index.")
+
+    return {
+        'tag': tag,
+        'admin_id': admin.pk,
+        'branch_id': branch_rows[0].pk,
+        'staff_id': staff_rows[0].pk,
+        'equipment_id': equipment_ids[0],
+        'repair_id': first_repair,
+        'counts': {
+            'branches': branches, 'staff': staff + 1, 'parts': parts,
+            'equipment': equipment, 'repairs': repairs, 'repair_parts': part_count,
+            'part_stock': len(stock_rows), 'repair_events': event_count,
+        },
+    }
@@ -1,14 +1,101 @@
 
 from rest_framework import serializers
-from .models import Repair ,    Part , RepairPart
+from .models import Repair ,    Part , RepairPart , PdfRenderJob , PartStock , Technician
+from Equipments.models import Branch, Equipment
 from Staff.models import Staff
 from django.utils import timezone
+from django.db import transaction
+from collections import Counter
+from . import stats , pdf , pdf_cache , inventory , events , assignment , triage
+from django.core.exceptions import ObjectDoesNotExist
+from django.urls import reverse
+from config.rows import RowSerializer, format_datetime
+
+def acting_user(context):
+    request = context.get('request')
+    return request.user if request is not None else None
+
 
 class PartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Part
         fields = '__all__'
 
+class PartStockSerializer(serializers.ModelSerializer):
+    part_name = serializers.CharField(source='part.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True, default=None)
+
+    class Meta:
+        model = PartStock
+        fields = ['id', 'part', 'part_name', 'branch', 'branch_name', 'quantity', 'reorder_level', 'is_low', 'updated_at']
+
+
+class TechnicianSerializer(serializers.ModelSerializer):
+    staff_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Technician
+        fields = ['staff', 'staff_name', 'branch', 'available', 'workload']
+        read_only_fields = ['staff', 'workload']
+
+    def get_staff_name(self, obj):
+        return f"{obj.staff.first_name} {obj.staff.last_name}"
+
+    def validate_available(self, value):
+        if value and self.instance is not None and not assignment.eligible(self.instance.staff):
+            raise serializers.ValidationError("Only active staff with the staff role can take repairs.")
+        return value
+
+    def update(self, instance, validated_data):
+        if 'available' in validated_data:
+            # an admin's choice, which enlist() leaves alone
+            validated_data['withdrawn'] = False
+        return super().update(instance, validated_data)
+
+
+class RestockItemSerializer(serializers.Serializer):
+    part_id = serializers.IntegerField()
+    # leave out for the central store
+    branch_id = serializers.IntegerField(required=False, allow_null=True, default=None)
+    quantity = serializers.IntegerField(min_value=1)
+    reorder_level = serializers.IntegerField(min_value=0, required=False)
+
+
+class RestockSerializer(serializers.Serializer):
+    items = RestockItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_items(self, value):
+        part_ids = {i['part_id'] for i in value}
+        branch_ids = {i['branch_id'] for i in value} - {None}
+        known_parts = set(Part.objects.filter(id__in=part_ids).values_list('id', flat=True))
+        known_branches = set(Branch.objects.filter(id__in=branch_ids).values_list('id', flat=True))
+
+        errors = []
+        for i in value:
+            error = {}
+            if i['part_id'] not in known_parts:
+                error['part_id'] = [f"Part with ID {i['part_id']} not found"]
+            if i['branch_id'] is not None and i['branch_id'] not in known_branches:
+                error['branch_id'] = [f"Branch with ID {i['branch_id']} not found"]
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        # the same row listed twice is restocked once with the sum
+        merged = {}
+        for i in value:
+            key = (i['part_id'], i['branch_id'])
+            if key in merged:
+                merged[key]['quantity'] += i['quantity']
+                merged[key]['reorder_level'] = i.get('reorder_level', merged[key].get('reorder_level'))
+            else:
+                merged[key] = dict(i)
+        return list(merged.values())
+
+    def save(self):
+        return inventory.restock(self.validated_data['items'])
+
+
 class RepairPartSerializer(serializers.ModelSerializer):
     part_name = serializers.CharField(source='part.name')
 
@@ -25,12 +112,16 @@ class RepairCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context['request']  
         staff = request.user  
-        return Repair.objects.create(
-            equipment=validated_data['equipment'],
-            remark=validated_data.get('remark', ''),
-            staff=staff,  
-            status='pending' 
-        )
+        with transaction.atomic():
+            repair = Repair.objects.create(
+                equipment=validated_data['equipment'],
+                remark=validated_data.get('remark', ''),
+                staff=staff,  
+                status='pending' 
+            )
+            stats.record_change(Counter(), stats.repair_counters(repair))
+            events.record(repair, None, actor=staff, at=repair.created_at)
+        return repair
 class RepairApprovalSerializer(serializers.ModelSerializer):
     repair_staff_id = serializers.IntegerField(write_only=True, required=False)
 
@@ -43,7 +134,10 @@ class RepairApprovalSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Status must be either 'approved' or 'rejected'")
         return value
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        before = stats.repair_counters(instance)
+        from_status = instance.status
         instance.status = validated_data['status']
 
         if instance.status == 'approved':
@@ -56,10 +150,55 @@ class RepairApprovalSerializer(serializers.ModelSerializer):
                     instance.repair_staff = staff
                 except Staff.DoesNotExist:
                     raise serializers.ValidationError({'repair_staff_id': 'Staff not found'})
+            elif instance.repair_staff_id is None:
+                # nobody named: the least-loaded technician, preferably one based at the equipment's branch
+                try:
+                    instance.repair_staff_id = assignment.least_loaded(instance.equipment.branch_id)
+                except assignment.NoTechnicianAvailable:
+                    raise serializers.ValidationError({'repair_staff_id': 'No technician is available to assign'})
 
-        instance.save()
+        instance.save(update_fields=['status', 'approved_at', 'repair_staff'])
+        stats.record_change(before, stats.repair_counters(instance))
+        decided_at = instance.approved_at if instance.status == 'approved' else None
+        events.record(instance, from_status, actor=acting_user(self.context), at=decided_at)
         return instance
     
+class RepairDecisionSerializer(serializers.Serializer):
+    repair_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['approved', 'rejected'])
+    # leave out to assign the least-loaded technician
+    repair_staff_id = serializers.IntegerField(required=False, allow_null=True)
+
+
+class BulkRepairDecisionSerializer(serializers.Serializer):
+    decisions = RepairDecisionSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_decisions(self, value):
+        seen = Counter(d['repair_id'] for d in value)
+        errors = [{'repair_id': ["Repair listed more than once"]} if seen[d['repair_id']] > 1 else {} for d in value]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return value
+
+    def create(self, validated_data):
+        decided, failed = triage.decide(validated_data['decisions'], actor=acting_user(self.context))
+        return {'decided': decided, 'failed': failed}
+
+    def to_representation(self, instance):
+        return {
+            'decided': [
+                {'id': repair.pk, 'status': repair.status, 'repair_staff_id': repair.repair_staff_id}
+                for repair in instance['decided']
+            ],
+            'failed': [{'repair_id': repair_id, 'error': error} for repair_id, error in instance['failed'].items()],
+        }
+
+
+class RepairStreamSerializer(serializers.Serializer):
+    branch = serializers.IntegerField(required=False, source='branch_id')
+    technician = serializers.IntegerField(required=False, source='staff_id')
+
+
 class RepairPartInputSerializer(serializers.Serializer):
     part_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
@@ -77,29 +216,61 @@ class CompleteRepairSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Status must be 'completed'")
         return value
 
+    def validate_parts(self, value):
+        part_ids = {p['part_id'] for p in value}
+        known = set(Part.objects.filter(id__in=part_ids).values_list('id', flat=True))
+        if known != part_ids:
+            raise serializers.ValidationError([
+                {} if p['part_id'] in known else {'part_id': [f"Part with ID {p['part_id']} not found"]}
+                for p in value
+            ])
+
+        # the same part listed twice is one RepairPart row
+        quantities = {}
+        for p in value:
+            quantities[p['part_id']] = quantities.get(p['part_id'], 0) + p['quantity']
+        return [{'part_id': part_id, 'quantity': quantity} for part_id, quantity in quantities.items()]
+
+    @transaction.atomic
     def update(self, instance, validated_data):
+        recorded = dict(RepairPart.objects.filter(repair=instance).values_list('part_id', 'quantity'))
+        before = stats.repair_counters(instance, recorded.items())
 
+        parts_data = validated_data.get('parts', [])
+        try:
+            inventory.consume(
+                instance.equipment.branch_id, recorded, {p['part_id']: p['quantity'] for p in parts_data}
+            )
+        except inventory.InsufficientStock as exc:
+            raise serializers.ValidationError({'parts': [
+                f"Part with ID {part_id} has only {available} left in stock"
+                for part_id, available in sorted(exc.available.items())
+            ]})
 
+        from_status = instance.status
         instance.status = validated_data['status']
         instance.report = validated_data.get('report', '')
         instance.completed_at = timezone.now()
-
-        RepairPart.objects.filter(repair=instance).delete()
         instance.save()
 
-        parts_data = validated_data.get('parts', [])
-        for part_info in parts_data:
-            try:
-                part = Part.objects.get(id=part_info['part_id'])
-                RepairPart.objects.create(
-                    repair=instance,
-                    part=part,
-                    quantity=part_info['quantity']
-                )
-                
-            except Part.DoesNotExist:
-                raise serializers.ValidationError(f"Part with ID {part_info['part_id']} not found")
+        RepairPart.objects.filter(repair=instance) \
+            .exclude(part_id__in=[p['part_id'] for p in parts_data]) \
+            .delete()
+        RepairPart.objects.bulk_create(
+            [RepairPart(repair=instance, part_id=p['part_id'], quantity=p['quantity']) for p in parts_data],
+            update_conflicts=True,
+            unique_fields=['repair', 'part'],
+            update_fields=['quantity'],
+        )
 
+        stats.record_change(
+            before, stats.repair_counters(instance, [(p['part_id'], p['quantity']) for p in parts_data])
+        )
+        events.record(instance, from_status, actor=acting_user(self.context), at=instance.completed_at)
+        transaction.on_commit(lambda: (
+            pdf_cache.invalidate('receipt', instance.pk),
+            pdf_cache.invalidate('equipment_history', instance.equipment_id),
+        ))
         return instance
     
 class RepairHistorySerializer(serializers.ModelSerializer):
@@ -115,3 +286,95 @@ class RepairHistorySerializer(serializers.ModelSerializer):
         if obj.repair_staff:
             return f"{obj.repair_staff.first_name} {obj.repair_staff.last_name}"
         return None
+
+
+class RepairHistoryRowSerializer(RowSerializer):
+    """RepairHistorySerializer from .values() rows, with each page's parts read in one more query."""
+    values = (
+        'id', 'status', 'completed_at', 'created_at', 'report', 'remark', 'repair_staff',
+        'repair_staff__first_name', 'repair_staff__last_name', 'equipment__branch__name',
+        # for grouping by machine; not part of the output
+        'equipment',
+    )
+
+    @classmethod
+    def many(cls, rows):
+        rows = list(rows)
+        parts = {row['id']: [] for row in rows}
+        if parts:
+            # the same rows, in the same order, as the repair_parts prefetch
+            for repair_id, part_name, quantity in RepairPart.objects.filter(repair__in=parts).order_by('pk') \
+                    .values_list('repair', 'part__name', 'quantity'):
+                parts[repair_id].append({'part_name': part_name, 'quantity': quantity})
+        return [cls.item(row, parts[row['id']]) for row in rows]
+
+    @classmethod
+    def item(cls, row, parts=()):
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'completed_at': format_datetime(row['completed_at']),
+            'created_at': format_datetime(row['created_at']),
+            'report': row['report'],
+            'remark': row['remark'],
+            'repair_staff_name': (
+                f"{row['repair_staff__first_name']} {row['repair_staff__last_name']}"
+                if row['repair_staff'] is not None else None
+            ),
+            'parts': list(parts),
+            'equipment_branch': row['equipment__branch__name'],
+        }
+
+
+class RepairHistoryBatchSerializer(serializers.Serializer):
+    tag_numbers = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=1000)
+    serial_numbers = serializers.ListField(child=serializers.CharField(max_length=100), required=False, default=list, max_length=1000)
+
+    def validate(self, data):
+        if not data['tag_numbers'] and not data['serial_numbers']:
+            raise serializers.ValidationError("Provide at least one tag_number or serial_number.")
+        return data
+
+
+class StatsScopeSerializer(serializers.Serializer):
+    """?from=&to=&branch=&category= for the stats dashboard; months may be given as YYYY-MM."""
+    to = serializers.DateField(required=False, source='end', input_formats=['%Y-%m', 'iso-8601'])
+    branch = serializers.IntegerField(required=False, source='branch_id')
+    category = serializers.ChoiceField(choices=Equipment.ITEM_CATEGORY_CHOICES, required=False, source='item_category')
+
+    def get_fields(self):
+        # 'from' is a keyword, so it can't be declared as an attribute
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False, source='start', input_formats=['%Y-%m', 'iso-8601'])
+        return fields
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("'from' must not be after 'to'.")
+        return data
+
+
+class PdfRenderJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PdfRenderJob
+        fields = ['id', 'kind', 'object_id', 'status', 'error', 'created_at', 'started_at', 'finished_at', 'download_url']
+        read_only_fields = ['status', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def validate(self, data):
+        try:
+            pdf.load_target(data['kind'], data['object_id'])
+        except ObjectDoesNotExist:
+            if data['kind'] == 'receipt':
+                raise serializers.ValidationError({'object_id': 'Repair not found or not completed'})
+            raise serializers.ValidationError({'object_id': 'Equipment not found'})
+        return data
+
+    def create(self, validated_data):
+        return pdf.enqueue(validated_data['kind'], validated_data['object_id'], self.context['request'].user)
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        return self.context['request'].build_absolute_uri(reverse('pdf-job-download', args=[obj.pk]))
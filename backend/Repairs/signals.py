@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from Staff.models import Staff
+from . import assignment, stats
+from .models import Repair
+
+
+@receiver(post_save, sender=Staff)
+def keep_technician_queue_in_step(sender, instance, created, update_fields=None, **kwargs):
+    # logins only touch last_login
+    if update_fields is not None and not {'role', 'is_active'} & set(update_fields):
+        return
+    assignment.enlist(instance, created=created)
+
+
+@receiver(pre_delete, sender=Repair)
+def take_deleted_repair_out_of_the_rollups(sender, instance, **kwargs):
+    # also reached through the Equipment and Staff cascades, which never go through the serializers
+    stats.record_deletion(instance)
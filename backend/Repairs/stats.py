@@ -0,0 +1,330 @@
+import operator
+from collections import Counter
+from functools import partial, reduce
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Subquery, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from config.parallel import gather
+
+from .models import (
+    Repair, RepairPart, MonthlyRepairStat, BranchRepairStat, StaffRepairStat, PartUsageStat,
+    RepairPeriodStat, StaffPeriodStat, PartPeriodStat, Technician,
+)
+from . import assignment
+
+WORKLOAD_STATUSES = ['approved', 'completed', 'pending', 'under_repair']
+
+PERIOD = ('month', 'branch_id', 'item_category')
+# counter kind -> (rollup model, key fields, value field)
+COUNTERS = {
+    'month': (MonthlyRepairStat, ('month',), 'count'),
+    'branch': (BranchRepairStat, ('branch_id',), 'count'),
+    'completed': (StaffRepairStat, ('staff_id',), 'completed'),
+    'workload': (StaffRepairStat, ('staff_id',), 'workload'),
+    # the assignment queue's load, which leaves out completed repairs
+    'queue': (Technician, ('staff_id',), 'workload'),
+    'part': (PartUsageStat, ('part_id', 'branch_id'), 'quantity'),
+    'period': (RepairPeriodStat, PERIOD, 'count'),
+    'period_completed': (StaffPeriodStat, PERIOD + ('staff_id',), 'completed'),
+    'period_workload': (StaffPeriodStat, PERIOD + ('staff_id',), 'workload'),
+    'period_part': (PartPeriodStat, PERIOD + ('part_id',), 'quantity'),
+}
+TOP_N = 5
+ROLLUPS = (
+    MonthlyRepairStat, BranchRepairStat, StaffRepairStat, PartUsageStat,
+    RepairPeriodStat, StaffPeriodStat, PartPeriodStat,
+)
+
+
+def month_of(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def repair_counters(repair, parts=()):
+    """
+    What one repair contributes to the rollups, as a Counter keyed by
+    (kind, *key). `parts` is an iterable of (part_id, quantity) pairs.
+    """
+    branch_id = repair.equipment.branch_id
+    month = month_of(repair.created_at)
+    period = (month, branch_id, repair.equipment.item_category)
+    counters = Counter()
+    counters[('month', month)] += 1
+    counters[('branch', branch_id)] += 1
+    counters[('period', *period)] += 1
+
+    if repair.repair_staff_id:
+        if repair.status == 'completed':
+            counters[('completed', repair.repair_staff_id)] += 1
+            counters[('period_completed', *period, repair.repair_staff_id)] += 1
+        if repair.status in WORKLOAD_STATUSES:
+            counters[('workload', repair.repair_staff_id)] += 1
+            counters[('period_workload', *period, repair.repair_staff_id)] += 1
+        if repair.status in assignment.OPEN_STATUSES:
+            counters[('queue', repair.repair_staff_id)] += 1
+
+    for part_id, quantity in parts:
+        counters[('part', part_id, branch_id)] += quantity
+        counters[('period_part', *period, part_id)] += quantity
+    return counters
+
+
+def record_deletion(repair):
+    """Take a repair about to be deleted, with its parts, back out of the rollups."""
+    parts = repair.repair_parts.values_list('part_id', 'quantity')
+    record_change(repair_counters(repair, parts), Counter())
+
+
+def record_change(before, after):
+    """
+    Apply the difference between two repair_counters() snapshots, with a
+    fixed number of statements per rollup table however many keys changed.
+    """
+    changes = {}
+    for key in before.keys() | after.keys():
+        delta = after[key] - before[key]
+        if delta:
+            model, key_fields, field = COUNTERS[key[0]]
+            changes.setdefault((model, key_fields), {}).setdefault(key[1:], {})[field] = delta
+
+    for (model, key_fields), rows in changes.items():
+        bump(model, key_fields, rows)
+
+
+def bump(model, key_fields, rows):
+    """
+    rows maps a key tuple to {field: delta}. Only keys that gain get a
+    row created: one that only loses was counted before, and a deletion
+    must not recreate a row its own cascade is about to remove.
+    """
+    lookups = {key: Q(**dict(zip(key_fields, key))) for key in sorted(rows)}
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in lookups if any(d > 0 for d in rows[key].values())],
+        ignore_conflicts=True,
+    )
+
+    updates = {}
+    for field in {field for deltas in rows.values() for field in deltas}:
+        whens = [When(lookups[key], then=Value(deltas[field])) for key, deltas in rows.items() if field in deltas]
+        updates[field] = F(field) + Case(*whens, default=Value(0))
+    model.objects.filter(reduce(operator.or_, lookups.values())).update(**updates)
+
+
+def scope(start=None, end=None, branch_id=None, item_category=None):
+    """
+    Narrow the dashboard to repairs requested from `start` to `end`
+    (dates; whole months, as the rollups count by month), at a branch or
+    for an equipment category. None for any of them leaves it open.
+    """
+    conditions = Q()
+    if start is not None:
+        conditions &= Q(month__gte=start.replace(day=1))
+    if end is not None:
+        conditions &= Q(month__lte=end.replace(day=1))
+    if branch_id is not None:
+        conditions &= Q(branch_id=branch_id)
+    if item_category is not None:
+        conditions &= Q(item_category=item_category)
+    return conditions
+
+
+# Every section reads the all-time rollups when `scope` is None, and sums
+# the period rollups it selects otherwise. Either way the ranking and the
+# top-N cut happen in SQL.
+
+def labelled(rows, label):
+    return {
+        "labels": [label(row) for row in rows],
+        "values": [row['total'] for row in rows],
+    }
+
+
+def staff_name(row):
+    return f"{row['staff__first_name']} {row['staff__last_name']}"
+
+
+def monthly_repairs(scope=None):
+    if scope is None:
+        monthly = MonthlyRepairStat.objects.annotate(total=F('count'))
+    else:
+        monthly = RepairPeriodStat.objects.filter(scope).values('month').annotate(total=Sum('count'))
+    return labelled(
+        monthly.filter(total__gt=0).values('month', 'total').order_by('month'),
+        lambda row: row['month'].strftime('%b %Y'),
+    )
+
+
+def staff_totals(field, scope):
+    if scope is None:
+        rows = StaffRepairStat.objects.annotate(total=F(field))
+    else:
+        rows = StaffPeriodStat.objects.filter(scope) \
+            .values('staff_id', 'staff__first_name', 'staff__last_name') \
+            .annotate(total=Sum(field))
+    return rows.filter(total__gt=0) \
+        .values('staff__first_name', 'staff__last_name', 'total') \
+        .order_by('-total', 'staff_id')
+
+
+def top_repair_staff(scope=None):
+    return labelled(staff_totals('completed', scope)[:TOP_N], staff_name)
+
+
+def repairs_by_branch(scope=None):
+    if scope is None:
+        branches = BranchRepairStat.objects.annotate(total=F('count'))
+    else:
+        branches = RepairPeriodStat.objects.filter(scope).values('branch_id', 'branch__name').annotate(total=Sum('count'))
+    return labelled(
+        branches.filter(total__gt=0).values('branch__name', 'total').order_by('-total', 'branch__name'),
+        lambda row: row['branch__name'],
+    )
+
+
+def part_usage(scope):
+    return PartUsageStat.objects.all() if scope is None else PartPeriodStat.objects.filter(scope)
+
+
+def top_parts(scope):
+    return part_usage(scope).values('part__name') \
+        .annotate(total=Sum('quantity')) \
+        .filter(total__gt=0) \
+        .order_by('-total', 'part__name')[:TOP_N]
+
+
+def top_used_parts(scope=None):
+    return labelled(top_parts(scope), lambda row: row['part__name'])
+
+
+def branch_wise_part_usage(scope=None):
+    """Per-branch usage of the top_used_parts, most used part first, in one query."""
+    rows = part_usage(scope).filter(part__name__in=Subquery(top_parts(scope).values('part__name'))) \
+        .values('part__name', 'branch__name') \
+        .annotate(total=Sum('quantity')) \
+        .filter(total__gt=0) \
+        .order_by('part__name', 'branch__name')
+    branch_wise = {}
+    for row in rows:
+        entry = branch_wise.setdefault(row['part__name'], {"part": row['part__name'], "branches": [], "quantities": []})
+        entry["branches"].append(row['branch__name'])
+        entry["quantities"].append(row['total'])
+    # at most TOP_N entries, in the order top_parts ranked them
+    return sorted(branch_wise.values(), key=lambda entry: (-sum(entry["quantities"]), entry["part"]))
+
+
+def staff_workload(scope=None):
+    return labelled(staff_totals('workload', scope), staff_name)
+
+
+# the dashboard's sections read independent rollups, so they can be queried in any order, or at once
+DASHBOARD_SECTIONS = {
+    "monthly_repairs": monthly_repairs,
+    "top_repair_staff": top_repair_staff,
+    "repairs_by_branch": repairs_by_branch,
+    "top_used_parts": top_used_parts,
+    "branch_wise_part_usage": branch_wise_part_usage,
+    "staff_workload": staff_workload,
+}
+
+
+def dashboard_stats(scope=None):
+    return {name: section(scope) for name, section in DASHBOARD_SECTIONS.items()}
+
+
+async def adashboard_stats(scope=None):
+    """dashboard_stats() with every section queried concurrently."""
+    results = await gather(*(partial(section, scope) for section in DASHBOARD_SECTIONS.values()))
+    return dict(zip(DASHBOARD_SECTIONS, results))
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every rollup from the Repair and RepairPart tables."""
+    for model in ROLLUPS:
+        model.objects.all().delete()
+
+    monthly = Repair.objects.annotate(month=TruncMonth('created_at')) \
+        .values('month') \
+        .annotate(count=Count('id')) \
+        .order_by()
+    MonthlyRepairStat.objects.bulk_create(
+        MonthlyRepairStat(month=row['month'].date(), count=row['count']) for row in monthly
+    )
+
+    by_branch = Repair.objects.values('equipment__branch') \
+        .annotate(count=Count('id')) \
+        .order_by()
+    BranchRepairStat.objects.bulk_create(
+        BranchRepairStat(branch_id=row['equipment__branch'], count=row['count']) for row in by_branch
+    )
+
+    staff_stats = {}
+    completed = Repair.objects.filter(status='completed', repair_staff__isnull=False) \
+        .values('repair_staff') \
+        .annotate(count=Count('id')) \
+        .order_by()
+    for row in completed:
+        staff_stats.setdefault(row['repair_staff'], StaffRepairStat(staff_id=row['repair_staff'])).completed = row['count']
+    workload = Repair.objects.filter(status__in=WORKLOAD_STATUSES, repair_staff__isnull=False) \
+        .values('repair_staff') \
+        .annotate(count=Count('id')) \
+        .order_by()
+    for row in workload:
+        staff_stats.setdefault(row['repair_staff'], StaffRepairStat(staff_id=row['repair_staff'])).workload = row['count']
+    StaffRepairStat.objects.bulk_create(staff_stats.values())
+
+    part_usage = RepairPart.objects.values('part', 'repair__equipment__branch') \
+        .annotate(total=Sum('quantity')) \
+        .order_by()
+    PartUsageStat.objects.bulk_create(
+        PartUsageStat(part_id=row['part'], branch_id=row['repair__equipment__branch'], quantity=row['total'])
+        for row in part_usage
+    )
+
+    rebuild_periods()
+    assignment.rebuild_queue()
+
+
+def rebuild_periods():
+    periods = Repair.objects.annotate(month=TruncMonth('created_at')) \
+        .values('month', 'equipment__branch', 'equipment__item_category') \
+        .annotate(count=Count('id')) \
+        .order_by()
+    RepairPeriodStat.objects.bulk_create(
+        RepairPeriodStat(
+            month=row['month'].date(), branch_id=row['equipment__branch'],
+            item_category=row['equipment__item_category'], count=row['count'],
+        )
+        for row in periods
+    )
+
+    staff_stats = {}
+    for field, statuses in (('completed', ['completed']), ('workload', WORKLOAD_STATUSES)):
+        rows = Repair.objects.filter(status__in=statuses, repair_staff__isnull=False) \
+            .annotate(month=TruncMonth('created_at')) \
+            .values('month', 'equipment__branch', 'equipment__item_category', 'repair_staff') \
+            .annotate(count=Count('id')) \
+            .order_by()
+        for row in rows:
+            key = (row['month'].date(), row['equipment__branch'], row['equipment__item_category'], row['repair_staff'])
+            stat = staff_stats.setdefault(key, StaffPeriodStat(**dict(zip(PERIOD + ('staff_id',), key))))
+            setattr(stat, field, row['count'])
+    StaffPeriodStat.objects.bulk_create(staff_stats.values(), batch_size=5000)
+
+    part_usage = RepairPart.objects.annotate(month=TruncMonth('repair__created_at')) \
+        .values('month', 'repair__equipment__branch', 'repair__equipment__item_category', 'part') \
+        .annotate(total=Sum('quantity')) \
+        .order_by()
+    PartPeriodStat.objects.bulk_create(
+        (
+            PartPeriodStat(
+                month=row['month'].date(), branch_id=row['repair__equipment__branch'],
+                item_category=row['repair__equipment__item_category'], part_id=row['part'], quantity=row['total'],
+            )
+            for row in part_usage
+        ),
+        batch_size=5000,
+    )
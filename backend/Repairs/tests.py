@@ -1,3 +1,1598 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import connection, IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Equipments.models import Branch, Equipment
+from Staff import cache as staff_cache
+from Staff.models import Staff
+from config import metrics
+from config.broker import Broker
+from config.instrumentation import fingerprint, route_metrics
+from config.testing import QueryBudgetMixin
+from Staff.models import OutboundEmail
+from . import stats, pdf, pdf_cache, pdf_export, query_plans, seeding, benchmark, inventory, events, assignment
+from .models import Part, PartStock, Repair, RepairEvent, RepairPart, PdfRenderJob, StaffRepairStat, Technician
+from .serializers import RepairCreateSerializer, RepairApprovalSerializer, CompleteRepairSerializer
+
+
+class RepairFixturesMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Staff.objects.create(
+            username='admin', email='admin@gmail.com', first_name='Sara', last_name='Tesfaye', role='admin'
+        )
+        cls.techs = [
+            Staff.objects.create(
+                username=f'tech{i}', email=f'tech{i}@gmail.com', first_name='Tech', last_name=str(i), role='staff'
+            )
+            for i in range(2)
+        ]
+        cls.branches = [Branch.objects.create(name=f'Branch {i}') for i in range(2)]
+        cls.equipment = [
+            Equipment.objects.create(
+                tag_number=i, serial_number=f'SN-{i}', item_category='Computer', branch=cls.branches[i % 2]
+            )
+            for i in range(4)
+        ]
+        cls.parts = [Part.objects.create(name=f'Part {i}') for i in range(3)]
+
+    def request_repair(self, equipment, user=None):
+        request = RequestFactory().post('/')
+        request.user = user or self.admin
+        serializer = RepairCreateSerializer(data={'equipment': equipment.pk, 'remark': 'no boot'}, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def approve(self, repair, tech, status='approved'):
+        serializer = RepairApprovalSerializer(repair, data={'status': status, 'repair_staff_id': tech.pk})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def complete(self, repair, parts):
+        data = {'status': 'completed', 'report': 'fixed', 'parts': [{'part_id': p.pk, 'quantity': q} for p, q in parts]}
+        serializer = CompleteRepairSerializer(Repair.objects.get(pk=repair.pk), data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+
+class RepairStatsTests(RepairFixturesMixin, TestCase):
+    def run_workflow(self):
+        repairs = [self.request_repair(e) for e in self.equipment for _ in range(2)]
+        for i, repair in enumerate(repairs[:6]):
+            self.approve(repair, self.techs[i % 2])
+        self.approve(repairs[6], self.techs[0], status='rejected')
+        self.complete(repairs[0], [(self.parts[0], 2), (self.parts[1], 1)])
+        self.complete(repairs[1], [(self.parts[1], 3)])
+        self.complete(repairs[2], [(self.parts[2], 1)])
+        # completing again replaces the recorded parts
+        self.complete(repairs[0], [(self.parts[0], 1)])
+        return repairs
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.run_workflow()
+        incremental = stats.dashboard_stats()
+        incremental_scoped = stats.dashboard_stats(stats.scope(branch_id=self.branches[0].pk))
+        stats.rebuild()
+        self.assertEqual(incremental, stats.dashboard_stats())
+        self.assertEqual(incremental_scoped, stats.dashboard_stats(stats.scope(branch_id=self.branches[0].pk)))
+        # an open scope sums the period rollups to the all-time ones
+        self.assertEqual(incremental, stats.dashboard_stats(stats.scope()))
+
+    def test_dashboard_values(self):
+        self.run_workflow()
+        data = stats.dashboard_stats()
+        self.assertEqual(data['monthly_repairs']['values'], [8])
+        self.assertEqual(sorted(data['repairs_by_branch']['values']), [4, 4])
+        self.assertEqual(data['top_repair_staff'], {'labels': ['Tech 0', 'Tech 1'], 'values': [2, 1]})
+        self.assertEqual(data['staff_workload'], {'labels': ['Tech 0', 'Tech 1'], 'values': [3, 3]})
+        top_parts = data['top_used_parts']
+        self.assertEqual(dict(zip(top_parts['labels'], top_parts['values'])), {'Part 1': 3, 'Part 0': 1, 'Part 2': 1})
+        self.assertEqual(top_parts['labels'][0], 'Part 1')
+        self.assertEqual(RepairPart.objects.filter(repair__status='completed').count(), 3)
+
+    def test_dashboard_query_count_independent_of_history(self):
+        self.run_workflow()
+        with self.assertNumQueries(6):
+            stats.dashboard_stats()
+        for equipment in self.equipment:
+            for _ in range(10):
+                self.complete(self.approve(self.request_repair(equipment), self.techs[0]), [(self.parts[0], 1)])
+        with self.assertNumQueries(6):
+            stats.dashboard_stats()
+        with self.assertNumQueries(6):
+            stats.dashboard_stats(stats.scope(date(2020, 1, 1), date(2030, 12, 31)))
+
+    def test_branch_wise_usage_follows_the_most_used_parts(self):
+        parts = Part.objects.bulk_create([Part(name=f'Extra {i}') for i in range(6)])
+        repair = self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        # the alphabetically first parts are the least used
+        self.complete(repair, [(part, 10 + i) for i, part in enumerate(parts)] + [(self.parts[0], 1)])
+        repair = self.approve(self.request_repair(self.equipment[1]), self.techs[0])
+        self.complete(repair, [(parts[5], 1)])
+
+        for scope in (None, stats.scope()):
+            data = stats.dashboard_stats(scope)
+            self.assertEqual(data['top_used_parts']['labels'], ['Extra 5', 'Extra 4', 'Extra 3', 'Extra 2', 'Extra 1'])
+            usage = data['branch_wise_part_usage']
+            self.assertEqual([entry['part'] for entry in usage], data['top_used_parts']['labels'])
+            self.assertEqual(usage[0], {'part': 'Extra 5', 'branches': ['Branch 0', 'Branch 1'], 'quantities': [15, 1]})
+
+
+class ScopedStatsTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+        Equipment.objects.filter(pk=self.equipment[3].pk).update(item_category='Scanner')
+        # two repairs a month from January to March 2025, on each piece of equipment in turn
+        for i in range(6):
+            equipment = self.equipment[i % 4]
+            repair = self.approve(self.request_repair(equipment), self.techs[i % 2])
+            self.complete(repair, [(self.parts[i % 3], i + 1)])
+            Repair.objects.filter(pk=repair.pk).update(
+                created_at=datetime(2025, 1 + i // 2, 10, tzinfo=dt_timezone.utc)
+            )
+        stats.rebuild()
+
+    def stats(self, name='admin-stats', **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_date_range(self):
+        data = self.stats(**{'from': '2025-02', 'to': '2025-03-31'})
+        self.assertEqual(data['monthly_repairs'], {'labels': ['Feb 2025', 'Mar 2025'], 'values': [2, 2]})
+        self.assertEqual(sum(data['repairs_by_branch']['values']), 4)
+        self.assertEqual(data['top_used_parts'], {'labels': ['Part 2', 'Part 1', 'Part 0'], 'values': [9, 5, 4]})
+
+        # a day inside a month counts the whole month
+        data = self.stats(**{'from': '2025-01-20', 'to': '2025-01-20'})
+        self.assertEqual(data['monthly_repairs']['values'], [2])
+
+    def test_branch_and_category(self):
+        data = self.stats(branch=self.branches[1].pk)
+        self.assertEqual(data['repairs_by_branch'], {'labels': ['Branch 1'], 'values': [3]})
+        self.assertEqual(data['top_repair_staff'], {'labels': ['Tech 1'], 'values': [3]})
+
+        data = self.stats(category='Scanner')
+        self.assertEqual(data['repairs_by_branch'], {'labels': ['Branch 1'], 'values': [1]})
+        self.assertEqual(data['top_used_parts'], {'labels': ['Part 0'], 'values': [4]})
+        self.assertEqual(data['branch_wise_part_usage'], [{'part': 'Part 0', 'branches': ['Branch 1'], 'quantities': [4]}])
+
+        data = self.stats(category='Scanner', **{'from': '2025-03'})
+        self.assertEqual(data['monthly_repairs'], {'labels': [], 'values': []})
+
+    def test_async_view_takes_the_same_scope(self):
+        params = {'from': '2025-02', 'branch': self.branches[0].pk}
+        self.assertEqual(self.stats('admin-stats-async', **params), self.stats(**params))
+
+    def test_invalid_scope(self):
+        for params in ({'from': 'last year'}, {'category': 'Toaster'}, {'from': '2025-03', 'to': '2025-01'}):
+            self.assertEqual(self.client.get(reverse('admin-stats'), params).status_code, 400, params)
+            self.assertEqual(self.client.get(reverse('admin-stats-async'), params).status_code, 400, params)
+
+    def test_deleted_repairs_leave_the_rollups(self):
+        self.approve(self.request_repair(self.equipment[1]), self.techs[0])
+        response = self.client.delete(reverse('delete-equipment', args=[self.equipment[0].pk]))
+        self.assertEqual(response.status_code, 204)
+        scoped = {'from': '2025-02', 'branch': self.branches[1].pk}
+        after_delete = self.stats(), self.stats(**scoped), dict(Technician.objects.values_list('staff_id', 'workload'))
+        stats.rebuild()
+        self.assertEqual(
+            after_delete,
+            (self.stats(), self.stats(**scoped), dict(Technician.objects.values_list('staff_id', 'workload'))),
+        )
+
+        Equipment.objects.all().delete()
+        self.assertFalse(Repair.objects.exists())
+        empty = {'labels': [], 'values': []}
+        self.assertEqual(self.stats(), {
+            'monthly_repairs': empty, 'top_repair_staff': empty, 'repairs_by_branch': empty,
+            'top_used_parts': empty, 'branch_wise_part_usage': [], 'staff_workload': empty,
+        })
+        self.assertEqual(set(Technician.objects.values_list('workload', flat=True)), {0})
+
+
+
+class CompleteRepairSerializerTests(RepairFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.many_parts = Part.objects.bulk_create([Part(name=f'Bulk {i}') for i in range(60)])
+
+    def approved_repair(self):
+        return self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+
+    def count_completion_queries(self, parts):
+        repair = Repair.objects.get(pk=self.approved_repair().pk)
+        serializer = CompleteRepairSerializer(
+            repair, data={'status': 'completed', 'parts': [{'part_id': p.pk, 'quantity': 1} for p in parts]}
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_part_count(self):
+        self.assertEqual(
+            self.count_completion_queries(self.many_parts[:5]),
+            self.count_completion_queries(self.many_parts),
+        )
+        self.assertEqual(RepairPart.objects.count(), 65)
+
+    def test_unknown_parts_are_all_reported_before_any_write(self):
+        repair = self.approved_repair()
+        data = {'status': 'completed', 'parts': [
+            {'part_id': self.parts[0].pk, 'quantity': 1},
+            {'part_id': 9998, 'quantity': 1},
+            {'part_id': 9999, 'quantity': 2},
+        ]}
+        serializer = CompleteRepairSerializer(repair, data=data)
+        self.assertFalse(serializer.is_valid())
+        errors = serializer.errors['parts']
+        self.assertEqual(errors[0], {})
+        self.assertIn('9998', str(errors[1]['part_id']))
+        self.assertIn('9999', str(errors[2]['part_id']))
+        repair.refresh_from_db()
+        self.assertEqual(repair.status, 'approved')
+
+    def test_recompletion_upserts_and_removes_dropped_parts(self):
+        repair = self.complete(self.approved_repair(), [(self.parts[0], 1), (self.parts[1], 1)])
+        kept = RepairPart.objects.get(repair=repair, part=self.parts[0])
+        self.complete(repair, [(self.parts[0], 4), (self.parts[2], 1), (self.parts[2], 2)])
+
+        rows = dict(RepairPart.objects.filter(repair=repair).values_list('part__name', 'quantity'))
+        self.assertEqual(rows, {'Part 0': 4, 'Part 2': 3})
+        self.assertEqual(RepairPart.objects.get(repair=repair, part=self.parts[0]).pk, kept.pk)
+
+        incremental = stats.dashboard_stats()
+        stats.rebuild()
+        self.assertEqual(incremental, stats.dashboard_stats())
+
+
+class InventoryTests(RepairFixturesMixin, APITestCase):
+    def approved_repair(self, equipment=None):
+        return self.approve(self.request_repair(equipment or self.equipment[0]), self.techs[0])
+
+    def stock(self, part, branch=None, quantity=10, reorder_level=0):
+        return PartStock.objects.create(part=part, branch=branch, quantity=quantity, reorder_level=reorder_level)
+
+    def quantities(self):
+        return {(row.part_id, row.branch_id): row.quantity for row in PartStock.objects.all()}
+
+    def test_completion_draws_on_branch_then_central_stock(self):
+        branch = self.equipment[0].branch
+        local = self.stock(self.parts[0], branch, quantity=5)
+        central_0 = self.stock(self.parts[0], quantity=20)
+        central_1 = self.stock(self.parts[1], quantity=20)
+
+        # Part 2 has no stock rows, so it is not tracked
+        self.complete(self.approved_repair(), [(self.parts[0], 2), (self.parts[1], 3), (self.parts[2], 7)])
+        self.assertEqual(self.quantities(), {
+            (self.parts[0].pk, branch.pk): 3, (self.parts[0].pk, None): 20, (self.parts[1].pk, None): 17,
+        })
+        self.assertEqual(PartStock.objects.count(), 3)
+        self.assertEqual({local.pk, central_0.pk, central_1.pk}, set(PartStock.objects.values_list('pk', flat=True)))
+
+    def test_recompletion_only_moves_the_difference(self):
+        self.stock(self.parts[0], quantity=10)
+        self.stock(self.parts[1], quantity=10)
+        repair = self.complete(self.approved_repair(), [(self.parts[0], 4), (self.parts[1], 1)])
+        # one more of Part 0, Part 1 dropped and returned to stock
+        self.complete(repair, [(self.parts[0], 5)])
+        self.assertEqual(self.quantities(), {(self.parts[0].pk, None): 5, (self.parts[1].pk, None): 10})
+
+    def test_insufficient_stock_rejects_the_whole_completion(self):
+        self.stock(self.parts[0], quantity=5)
+        self.stock(self.parts[1], quantity=1)
+        repair = self.approved_repair()
+        with self.assertRaises(ValidationError) as ctx:
+            self.complete(repair, [(self.parts[0], 2), (self.parts[1], 2)])
+        self.assertEqual(ctx.exception.detail['parts'], [f"Part with ID {self.parts[1].pk} has only 1 left in stock"])
+
+        repair.refresh_from_db()
+        self.assertEqual(repair.status, 'approved')
+        self.assertFalse(RepairPart.objects.filter(repair=repair).exists())
+        self.assertEqual(self.quantities(), {(self.parts[0].pk, None): 5, (self.parts[1].pk, None): 1})
+
+    def test_consume_never_overdraws(self):
+        row = self.stock(self.parts[0], quantity=3)
+        inventory.consume(None, {}, {self.parts[0].pk: 2})
+        with self.assertRaises(inventory.InsufficientStock) as ctx:
+            inventory.consume(None, {}, {self.parts[0].pk: 2})
+        self.assertEqual(ctx.exception.available, {self.parts[0].pk: 1})
+        row.refresh_from_db()
+        self.assertEqual(row.quantity, 1)
+
+    def test_falling_to_reorder_level_queues_an_alert(self):
+        self.stock(self.parts[0], self.equipment[0].branch, quantity=6, reorder_level=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete(self.approved_repair(), [(self.parts[0], 1)])
+        self.assertFalse(OutboundEmail.objects.exists())
+
+        with self.assertLogs('Repairs.inventory', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.complete(self.approved_repair(), [(self.parts[0], 1)])
+        mail = OutboundEmail.objects.get()
+        self.assertEqual(mail.to, self.admin.email)
+        self.assertIn('Part 0 at Branch 0: 4 left (reorder level 4)', mail.body)
+
+        # already low: no second alert
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete(self.approved_repair(), [(self.parts[0], 1)])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_restock_creates_and_increments_rows(self):
+        self.stock(self.parts[0], quantity=2, reorder_level=1)
+        self.client.force_authenticate(self.admin)
+        items = [
+            {'part_id': self.parts[0].pk, 'quantity': 3, 'reorder_level': 4},
+            {'part_id': self.parts[1].pk, 'branch_id': self.branches[1].pk, 'quantity': 5},
+            {'part_id': self.parts[1].pk, 'branch_id': self.branches[1].pk, 'quantity': 1},
+        ]
+        response = self.client.post(reverse('part-restock'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted((r['part_name'], r['branch_name'], r['quantity'], r['reorder_level']) for r in response.data),
+            [('Part 0', None, 5, 4), ('Part 1', 'Branch 1', 6, 0)],
+        )
+
+    def test_restock_validates_items_and_is_admin_only(self):
+        self.client.force_authenticate(self.admin)
+        items = [
+            {'part_id': self.parts[0].pk, 'quantity': 1},
+            {'part_id': 9999, 'branch_id': 9998, 'quantity': 1},
+        ]
+        response = self.client.post(reverse('part-restock'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][0], {})
+        self.assertEqual(set(response.data['items'][1]), {'part_id', 'branch_id'})
+        self.assertFalse(PartStock.objects.exists())
+
+        self.client.force_authenticate(self.techs[0])
+        response = self.client.post(reverse('part-restock'), {'items': items[:1]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_low_stock_listing(self):
+        low = self.stock(self.parts[0], self.branches[0], quantity=2, reorder_level=2)
+        self.stock(self.parts[1], self.branches[0], quantity=3, reorder_level=2)
+        central = self.stock(self.parts[2], quantity=0)
+        self.client.force_authenticate(self.techs[0])
+
+        response = self.client.get(reverse('part-stock-low'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data['results']], [low.pk, central.pk])
+        self.assertTrue(all(r['is_low'] for r in response.data['results']))
+
+        response = self.client.get(reverse('part-stock-low'), {'branch': self.branches[0].pk})
+        self.assertEqual([r['id'] for r in response.data['results']], [low.pk])
+        response = self.client.get(reverse('part-stock-list'), {'part': self.parts[1].pk})
+        self.assertEqual([r['quantity'] for r in response.data['results']], [3])
+
+
+class RepairEventTests(RepairFixturesMixin, APITestCase):
+    def transitions(self, repair):
+        return list(RepairEvent.objects.filter(repair=repair).values_list('from_status', 'to_status', 'actor_id'))
+
+    def test_workflow_appends_an_event_per_transition(self):
+        self.client.force_authenticate(self.techs[1])
+        response = self.client.post(reverse('repair-request'), {'equipment': self.equipment[0].pk}, format='json')
+        repair = Repair.objects.get(pk=response.data['id'])
+        self.client.force_authenticate(self.admin)
+        self.client.patch(reverse('repair-approve', args=[repair.pk]),
+                          {'status': 'approved', 'repair_staff_id': self.techs[0].pk}, format='json')
+        self.client.force_authenticate(self.techs[0])
+        for _ in range(2):
+            response = self.client.patch(reverse('repair-complete', args=[repair.pk]),
+                                         {'status': 'completed', 'parts': []}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.transitions(repair), [
+            ('', 'pending', self.techs[1].pk),
+            ('pending', 'approved', self.admin.pk),
+            ('approved', 'completed', self.techs[0].pk),
+            ('completed', 'completed', self.techs[0].pk),
+        ])
+        repair.refresh_from_db()
+        times = list(RepairEvent.objects.filter(repair=repair).values_list('created_at', flat=True))
+        self.assertEqual(times[:3], [repair.created_at, repair.approved_at, times[2]])
+        self.assertEqual(times[3], repair.completed_at)
+
+    def test_failed_transition_leaves_no_event(self):
+        PartStock.objects.create(part=self.parts[0], quantity=0)
+        repair = self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        with self.assertRaises(ValidationError):
+            self.complete(repair, [(self.parts[0], 1)])
+        self.assertEqual([t[1] for t in self.transitions(repair)], ['pending', 'approved'])
+
+    def test_events_are_append_only(self):
+        event = RepairEvent.objects.get(repair=self.request_repair(self.equipment[0]))
+        event.to_status = 'completed'
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_timeline_is_one_query(self):
+        repair = self.complete(self.approve(self.request_repair(self.equipment[1]), self.techs[0]), [])
+        self.client.force_authenticate(self.techs[1])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('repair-timeline', args=[repair.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual([e['to_status'] for e in response.data['events']], ['pending', 'approved', 'completed'])
+        self.assertEqual(response.data['events'][0]['actor_name'], 'Sara Tesfaye')
+        self.assertIsNone(response.data['events'][0]['seconds_since_previous'])
+        self.assertGreaterEqual(response.data['events'][1]['seconds_since_previous'], 0)
+
+        self.assertEqual(self.client.get(reverse('repair-timeline', args=[9999])).status_code, 404)
+
+    def shift(self, repair, to_status, hours):
+        RepairEvent.objects.filter(repair=repair, to_status=to_status) \
+            .update(created_at=repair.created_at + timedelta(hours=hours))
+
+    @override_settings(REPAIR_DECISION_SLA=timedelta(hours=24), REPAIR_TURNAROUND_SLA=timedelta(hours=72))
+    def test_sla_summary(self):
+        fast = self.complete(self.approve(self.request_repair(self.equipment[0]), self.techs[0]), [])
+        self.shift(fast, 'approved', 2)
+        self.shift(fast, 'completed', 10)
+        slow = self.complete(self.approve(self.request_repair(self.equipment[1]), self.techs[0]), [])
+        self.shift(slow, 'approved', 30)
+        self.shift(slow, 'completed', 100)
+        rejected = self.approve(self.request_repair(self.equipment[0]), self.techs[0], status='rejected')
+        self.shift(rejected, 'rejected', 4)
+        waiting = self.request_repair(self.equipment[2])
+        Repair.objects.filter(pk=waiting.pk).update(created_at=waiting.created_at - timedelta(days=2))
+        RepairEvent.objects.filter(repair=waiting).update(created_at=waiting.created_at - timedelta(days=2))
+
+        summary = events.sla_summary()
+        self.assertEqual((summary['requests'], summary['decided'], summary['completed']), (4, 3, 2))
+        self.assertEqual(summary['average_seconds'], {
+            'decision': 12 * 3600, 'repair': 39 * 3600, 'turnaround': 55 * 3600,
+        })
+        self.assertEqual(summary['breached'], {'decision': 1, 'turnaround': 1})
+        self.assertEqual(summary['open_breached'], {'decision': 1, 'turnaround': 0})
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('admin-stats-sla'), {'branch': self.branches[1].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['requests'], response.data['completed']), (1, 1))
+        self.assertEqual(response.data['breached'], {'decision': 1, 'turnaround': 1})
+        response = self.client.get(reverse('admin-stats-sla'), {'requested_after': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.techs[0])
+        self.assertEqual(self.client.get(reverse('admin-stats-sla')).status_code, 403)
+
+    def test_seeded_history_has_events(self):
+        result = seeding.seed(repairs=200, branches=2, staff=3, parts=5, months=3)
+        self.assertEqual(RepairEvent.objects.count(), result['counts']['repair_events'])
+        summary = events.sla_summary()
+        self.assertEqual(summary['requests'], 200)
+        self.assertEqual(summary['completed'], Repair.objects.filter(status='completed').count())
+        self.assertEqual(summary['decided'], Repair.objects.exclude(status='pending').count())
+
+
+class AssignmentTests(RepairFixturesMixin, APITestCase):
+    def auto_approve(self, equipment):
+        serializer = RepairApprovalSerializer(self.request_repair(equipment), data={'status': 'approved'})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def queue(self):
+        return dict(Technician.objects.filter(available=True).values_list('staff_id', 'workload'))
+
+    def test_technicians_are_enlisted(self):
+        self.assertEqual(self.queue(), {self.techs[0].pk: 0, self.techs[1].pk: 0})
+        self.assertFalse(Technician.objects.filter(staff=self.admin).exists())
+
+        self.techs[1].is_active = False
+        self.techs[1].save()
+        self.assertEqual(set(self.queue()), {self.techs[0].pk})
+        # a login only touches last_login and leaves the queue alone
+        with self.assertNumQueries(1):
+            self.techs[0].save(update_fields=['last_login'])
+
+    def test_reactivated_technicians_rejoin_but_not_those_an_admin_took_out(self):
+        for tech in self.techs:
+            tech.is_active = False
+            tech.save()
+        self.assertEqual(self.queue(), {})
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(
+            self.client.patch(reverse('technician-detail', args=[self.techs[1].pk]), {'available': False}).status_code, 200
+        )
+        for tech in self.techs:
+            tech.is_active = True
+            tech.save()
+        self.assertEqual(set(self.queue()), {self.techs[0].pk})
+
+        # changed behind the signal's back, then put right by the rebuild
+        Staff.objects.filter(pk=self.techs[0].pk).update(is_active=False)
+        assignment.rebuild_queue()
+        self.assertEqual(self.queue(), {})
+        Staff.objects.filter(pk=self.techs[0].pk).update(is_active=True)
+        assignment.rebuild_queue()
+        self.assertEqual(set(self.queue()), {self.techs[0].pk})
+
+    def test_only_eligible_staff_can_be_made_available(self):
+        self.techs[0].is_active = False
+        self.techs[0].save()
+        Technician.objects.create(staff=self.admin)
+        self.client.force_authenticate(self.admin)
+        for staff in (self.techs[0], self.admin):
+            response = self.client.patch(reverse('technician-detail', args=[staff.pk]), {'available': True})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('available', response.data)
+        self.assertEqual(set(self.queue()), {self.techs[1].pk})
+
+    def test_burst_of_approvals_is_spread_by_workload(self):
+        self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        repairs = [self.auto_approve(self.equipment[i % 4]) for i in range(9)]
+        self.assertEqual(repairs[0].repair_staff_id, self.techs[1].pk)
+        self.assertEqual(self.queue(), {self.techs[0].pk: 5, self.techs[1].pk: 5})
+        self.assertEqual(
+            self.queue(), dict(StaffRepairStat.objects.values_list('staff_id', 'workload').filter(staff__role='staff'))
+        )
+        stats.rebuild()
+        self.assertEqual(self.queue(), {self.techs[0].pk: 5, self.techs[1].pk: 5})
+
+    def test_completing_a_repair_lightens_the_load(self):
+        for _ in range(2):
+            self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        done = [self.approve(self.request_repair(self.equipment[0]), self.techs[1]) for _ in range(3)]
+        for repair in done:
+            self.complete(repair, [])
+        self.assertEqual(self.queue(), {self.techs[0].pk: 2, self.techs[1].pk: 0})
+        self.assertEqual(self.auto_approve(self.equipment[0]).repair_staff_id, self.techs[1].pk)
+
+        assignment.rebuild_queue()
+        self.assertEqual(self.queue(), {self.techs[0].pk: 2, self.techs[1].pk: 1})
+        Technician.objects.all().delete()
+        for tech in self.techs:
+            assignment.enlist(tech)
+        self.assertEqual(self.queue(), {self.techs[0].pk: 2, self.techs[1].pk: 1})
+
+    def test_picking_does_not_depend_on_the_number_of_technicians(self):
+        def approval_queries():
+            repair = self.request_repair(self.equipment[0])
+            serializer = RepairApprovalSerializer(repair, data={'status': 'approved'})
+            serializer.is_valid(raise_exception=True)
+            with CaptureQueriesContext(connection) as ctx:
+                serializer.save()
+            return len(ctx.captured_queries)
+
+        few = approval_queries()
+        Staff.objects.bulk_create([
+            Staff(username=f'bulk{i}', email=f'bulk{i}@gmail.com', role='staff') for i in range(300)
+        ])
+        assignment.rebuild_queue()
+        self.assertEqual(approval_queries(), few)
+
+    def test_home_branch_comes_first(self):
+        Technician.objects.filter(staff=self.techs[1]).update(branch=self.branches[1], workload=3)
+        self.assertEqual(self.auto_approve(self.equipment[1]).repair_staff_id, self.techs[1].pk)
+        # no technician is based at branch 0, so the least loaded anywhere
+        self.assertEqual(self.auto_approve(self.equipment[0]).repair_staff_id, self.techs[0].pk)
+
+    def test_named_technician_and_unavailability(self):
+        self.assertEqual(self.approve(self.request_repair(self.equipment[0]), self.techs[1]).repair_staff_id, self.techs[1].pk)
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(reverse('technician-detail', args=[self.techs[0].pk]), {'available': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.auto_approve(self.equipment[0]).repair_staff_id, self.techs[1].pk)
+        # a profile save doesn't put them back
+        self.techs[0].save()
+        self.assertEqual(set(self.queue()), {self.techs[1].pk})
+
+        Technician.objects.update(available=False)
+        with self.assertRaises(ValidationError) as ctx:
+            self.auto_approve(self.equipment[0])
+        self.assertIn('repair_staff_id', ctx.exception.detail)
+
+    def test_queue_endpoint(self):
+        self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('technician-queue'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(t['staff'], t['workload']) for t in response.data], [(self.techs[1].pk, 0), (self.techs[0].pk, 1)])
+        self.client.force_authenticate(self.techs[0])
+        self.assertEqual(self.client.get(reverse('technician-queue')).status_code, 403)
+
+
+class BulkDecisionTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def decide(self, decisions):
+        return self.client.post(reverse('repair-approve-bulk'), {'decisions': decisions}, format='json')
+
+    def test_decides_the_batch_and_reports_failures_by_id(self):
+        pending = [self.request_repair(e) for e in self.equipment]
+        done = self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        response = self.decide([
+            {'repair_id': pending[0].pk, 'status': 'approved', 'repair_staff_id': self.techs[0].pk},
+            {'repair_id': pending[1].pk, 'status': 'rejected'},
+            {'repair_id': pending[2].pk, 'status': 'approved'},
+            {'repair_id': pending[3].pk, 'status': 'approved', 'repair_staff_id': 99999},
+            {'repair_id': done.pk, 'status': 'rejected'},
+            {'repair_id': 99999, 'status': 'approved'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['decided'], [
+            {'id': pending[0].pk, 'status': 'approved', 'repair_staff_id': self.techs[0].pk},
+            {'id': pending[1].pk, 'status': 'rejected', 'repair_staff_id': None},
+            {'id': pending[2].pk, 'status': 'approved', 'repair_staff_id': self.techs[1].pk},
+        ])
+        self.assertEqual(response.data['failed'], [
+            {'repair_id': pending[3].pk, 'error': 'Staff not found'},
+            {'repair_id': done.pk, 'error': 'Repair is already approved'},
+            {'repair_id': 99999, 'error': 'Repair not found'},
+        ])
+
+        repairs = Repair.objects.in_bulk([r.pk for r in pending])
+        self.assertEqual([repairs[r.pk].status for r in pending], ['approved', 'rejected', 'approved', 'pending'])
+        self.assertIsNotNone(repairs[pending[0].pk].approved_at)
+        self.assertIsNone(repairs[pending[1].pk].approved_at)
+        self.assertEqual(
+            list(RepairEvent.objects.filter(repair__in=pending[:3], from_status='pending')
+                 .order_by('repair_id').values_list('to_status', 'actor_id')),
+            [('approved', self.admin.pk), ('rejected', self.admin.pk), ('approved', self.admin.pk)],
+        )
+
+        incremental = stats.dashboard_stats()
+        stats.rebuild()
+        self.assertEqual(incremental, stats.dashboard_stats())
+
+    def test_auto_assignment_spreads_like_single_approvals(self):
+        self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        pending = [self.request_repair(self.equipment[i % 4]) for i in range(9)]
+        response = self.decide([{'repair_id': r.pk, 'status': 'approved'} for r in pending])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['decided'][0]['repair_staff_id'], self.techs[1].pk)
+        queue = dict(Technician.objects.values_list('staff_id', 'workload'))
+        self.assertEqual(queue, {self.techs[0].pk: 5, self.techs[1].pk: 5})
+        self.assertEqual(queue, dict(StaffRepairStat.objects.filter(staff__role='staff').values_list('staff_id', 'workload')))
+
+        # a home branch is preferred while its technician is no busier than it would be anyway
+        Technician.objects.filter(staff=self.techs[0]).update(branch=self.branches[1])
+        pending = [self.request_repair(self.equipment[1]) for _ in range(2)]
+        response = self.decide([{'repair_id': r.pk, 'status': 'approved'} for r in pending])
+        self.assertEqual([d['repair_staff_id'] for d in response.data['decided']], [self.techs[0].pk] * 2)
+
+        Technician.objects.update(available=False)
+        repair = self.request_repair(self.equipment[0])
+        response = self.decide([{'repair_id': repair.pk, 'status': 'approved'}])
+        self.assertEqual(response.data['failed'], [{'repair_id': repair.pk, 'error': 'No technician is available to assign'}])
+        self.assertEqual(Repair.objects.get(pk=repair.pk).status, 'pending')
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def decision_queries(count):
+            pending = [self.request_repair(self.equipment[i % 4]) for i in range(count)]
+            decisions = [
+                {'repair_id': r.pk, 'status': ('approved', 'rejected')[i % 2]} for i, r in enumerate(pending)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.decide(decisions)
+            self.assertEqual(len(response.data['decided']), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(decision_queries(4), decision_queries(40))
+
+    def test_rejects_malformed_batches(self):
+        repair = self.request_repair(self.equipment[0])
+        response = self.decide([{'repair_id': repair.pk, 'status': 'approved'}, {'repair_id': repair.pk, 'status': 'rejected'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.decide([{'repair_id': repair.pk, 'status': 'completed'}]).status_code, 400)
+        self.assertEqual(self.decide([]).status_code, 400)
+        self.assertEqual(Repair.objects.get(pk=repair.pk).status, 'pending')
+
+        self.client.force_authenticate(self.techs[0])
+        self.assertEqual(self.decide([{'repair_id': repair.pk, 'status': 'approved'}]).status_code, 403)
+
+
+class RepairHistoryTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.techs[0])
+
+    def add_history(self, equipment, count):
+        for _ in range(count):
+            repair = self.approve(self.request_repair(equipment), self.techs[count % 2])
+            self.complete(repair, [(self.parts[0], 1), (self.parts[1], 2)])
+
+    def history_queries(self, equipment):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('equipment-repair-history'), {'tag_number': equipment.tag_number})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_history_query_count_is_fixed(self):
+        self.add_history(self.equipment[0], 1)
+        self.add_history(self.equipment[1], 8)
+        small, small_queries = self.history_queries(self.equipment[0])
+        large, large_queries = self.history_queries(self.equipment[1])
+        self.assertEqual(len(large.data), 8)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(large.data[0]['parts'], [{'part_name': 'Part 0', 'quantity': 1}, {'part_name': 'Part 1', 'quantity': 2}])
+        self.assertEqual(large.data[0]['equipment_branch'], self.equipment[1].branch.name)
+
+    def test_batch_groups_histories_by_equipment(self):
+        self.add_history(self.equipment[0], 2)
+        self.add_history(self.equipment[2], 3)
+        data = {'tag_numbers': [self.equipment[0].tag_number, 404], 'serial_numbers': [self.equipment[2].serial_number, 'SN-x']}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('equipment-repair-history-batch'), data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+        results = {r['equipment']['id']: r['repairs'] for r in response.data['results']}
+        self.assertEqual(set(results), {self.equipment[0].pk, self.equipment[2].pk})
+        self.assertEqual(len(results[self.equipment[0].pk]), 2)
+        self.assertEqual(len(results[self.equipment[2].pk]), 3)
+        self.assertEqual(response.data['not_found'], {'tag_numbers': [404], 'serial_numbers': ['SN-x']})
+
+    def test_batch_requires_identifiers(self):
+        response = self.client.post(reverse('equipment-repair-history-batch'), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RepairExportTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.techs[0])
+
+    def export(self, name, params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_repairs_stream_with_their_parts(self):
+        first = self.complete(self.approve(self.request_repair(self.equipment[0]), self.techs[0]), [(self.parts[0], 2), (self.parts[1], 1)])
+        self.request_repair(self.equipment[2])
+        third = self.complete(self.approve(self.request_repair(self.equipment[1]), self.techs[1]), [(self.parts[2], 4)])
+
+        rows = [json.loads(line) for line in self.export('repair-export', {'output': 'ndjson'}).splitlines()]
+        by_id = {r['id']: r for r in rows}
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(by_id[first.pk]['parts'], [{'part_name': 'Part 0', 'quantity': 2}, {'part_name': 'Part 1', 'quantity': 1}])
+        self.assertEqual(by_id[third.pk]['parts'], [{'part_name': 'Part 2', 'quantity': 4}])
+
+        rows = list(csv.DictReader(io.StringIO(self.export('repair-export', {'branch': self.branches[0].pk, 'status': 'completed'}))))
+        self.assertEqual([int(r['id']) for r in rows], [first.pk])
+        self.assertEqual(rows[0]['parts'], 'Part 0 x2; Part 1 x1')
+
+    def test_parts_usage_per_branch(self):
+        for equipment in self.equipment:
+            self.complete(self.approve(self.request_repair(equipment), self.techs[0]), [(self.parts[0], 1)])
+        rows = list(csv.DictReader(io.StringIO(self.export('part-usage-export', {}))))
+        self.assertEqual(
+            [(r['part__name'], r['branch'], r['repairs'], r['total_quantity']) for r in rows],
+            [('Part 0', 'Branch 0', '2', '2'), ('Part 0', 'Branch 1', '2', '2')],
+        )
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_authenticate(self.techs[0])
+
+    def completed_repair(self):
+        repair = self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        return self.complete(repair, [(self.parts[0], 1)])
+
+
+@mock.patch('Repairs.pdf.html_to_pdf', return_value=b'%PDF-1.7 test')
+class PdfRenderJobTests(TempMediaMixin, RepairFixturesMixin, APITestCase):
+
+    def enqueue(self, kind, object_id):
+        return self.client.post(reverse('pdf-job-create'), {'kind': kind, 'object_id': object_id})
+
+    def test_enqueue_poll_and_download(self, html_to_pdf):
+        repair = self.completed_repair()
+        response = self.enqueue('receipt', repair.pk)
+        self.assertEqual(response.status_code, 202)
+        job_url = reverse('pdf-job-detail', args=[response.data['id']])
+        download_url = reverse('pdf-job-download', args=[response.data['id']])
+
+        self.assertEqual(self.client.get(job_url).data['status'], 'queued')
+        self.assertEqual(self.client.get(download_url).status_code, 409)
+        html_to_pdf.assert_not_called()
+
+        self.assertEqual(pdf.work(drain=True), 1)
+        job = self.client.get(job_url).data
+        self.assertEqual(job['status'], 'done')
+        self.assertTrue(job['download_url'].endswith(download_url))
+
+        response = self.client.get(download_url)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 test')
+        self.assertIn(f'repair_{repair.pk}_receipt.pdf', response['Content-Disposition'])
+
+    def test_pending_job_is_reused(self, html_to_pdf):
+        first = self.enqueue('equipment_history', self.equipment[0].pk).data['id']
+        second = self.enqueue('equipment_history', self.equipment[0].pk).data['id']
+        self.assertEqual(first, second)
+
+    def test_pending_job_of_another_user_is_not_handed_out(self, html_to_pdf):
+        jobs = {}
+        for tech in self.techs:
+            self.client.force_authenticate(tech)
+            jobs[tech] = self.enqueue('equipment_history', self.equipment[0].pk).data['id']
+        self.assertNotEqual(jobs[self.techs[0]], jobs[self.techs[1]])
+        for tech, job_id in jobs.items():
+            self.client.force_authenticate(tech)
+            self.assertEqual(self.client.get(reverse('pdf-job-detail', args=[job_id])).status_code, 200)
+
+    def test_rejects_missing_or_incomplete_targets(self, html_to_pdf):
+        repair = self.request_repair(self.equipment[0])
+        self.assertEqual(self.enqueue('receipt', repair.pk).status_code, 400)
+        self.assertEqual(self.enqueue('equipment_history', 999).status_code, 400)
+
+    def test_jobs_are_private_to_requester(self, html_to_pdf):
+        job_id = self.enqueue('equipment_history', self.equipment[0].pk).data['id']
+        self.client.force_authenticate(self.techs[1])
+        self.assertEqual(self.client.get(reverse('pdf-job-detail', args=[job_id])).status_code, 404)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(reverse('pdf-job-detail', args=[job_id])).status_code, 200)
+
+    def test_claim_is_exclusive_and_recovers_stale_jobs(self, html_to_pdf):
+        job = pdf.enqueue('equipment_history', self.equipment[0].pk)
+        self.assertEqual(pdf.claim_next_job().pk, job.pk)
+        self.assertIsNone(pdf.claim_next_job())
+
+        PdfRenderJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - pdf.RENDER_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(pdf.claim_next_job().attempts, 2)
+
+    def test_render_failure_is_recorded(self, html_to_pdf):
+        html_to_pdf.side_effect = RuntimeError('pango missing')
+        job = pdf.enqueue('equipment_history', self.equipment[0].pk)
+        pdf.work(drain=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('pango missing', job.error)
+
+
+@mock.patch('Repairs.pdf.html_to_pdf', return_value=b'%PDF-1.7 test')
+class PdfCacheTests(TempMediaMixin, RepairFixturesMixin, APITestCase):
+    def test_receipt_renders_once_and_revalidates(self, html_to_pdf):
+        repair = self.completed_repair()
+        url = reverse('repair-receipt-pdf', args=[repair.pk])
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(html_to_pdf.call_count, 1)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertNotIn('Last-Modified', first)
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(html_to_pdf.call_count, 1)
+
+    def test_edit_that_keeps_the_completion_date_is_not_answered_304(self, html_to_pdf):
+        repair = self.completed_repair()
+        url = reverse('repair-receipt-pdf', args=[repair.pk])
+        first = self.client.get(url)
+
+        Repair.objects.filter(pk=repair.pk).update(remark='handed back to the branch')
+        since = http_date(repair.completed_at.timestamp() + 60)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_history_is_rerendered_after_a_new_completion(self, html_to_pdf):
+        repair = self.completed_repair()
+        url = reverse('equipment-repair-pdf', args=[self.equipment[0].pk])
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete(repair, [(self.parts[1], 2)])
+        self.assertFalse(list(pdf_cache.entry_dir('equipment_history', self.equipment[0].pk).glob('*.pdf')))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(html_to_pdf.call_count, 2)
+
+    def test_eviction_drops_least_recently_used(self, html_to_pdf):
+        with override_settings(PDF_CACHE_MAX_BYTES=350):
+            for object_id in range(3):
+                pdf_cache.put('receipt', object_id, 'digest', b'x' * 100)
+                os.utime(pdf_cache.entry_dir('receipt', object_id) / 'digest.pdf', (object_id, object_id))
+            pdf_cache.get('receipt', 0, 'digest')
+            pdf_cache.put('receipt', 3, 'digest', b'x' * 100)
+
+        self.assertIsNotNone(pdf_cache.get('receipt', 0, 'digest'))
+        self.assertIsNone(pdf_cache.get('receipt', 1, 'digest'))
+        self.assertIsNotNone(pdf_cache.get('receipt', 2, 'digest'))
+        self.assertIsNotNone(pdf_cache.get('receipt', 3, 'digest'))
+
+
+def fake_pdf(html):
+    # one document per equipment, told apart by its heading
+    return b'%PDF ' + html.split('<h2>', 1)[1].split('</h2>', 1)[0].encode()
+
+
+@override_settings(PDF_EXPORT_PROCESSES=0)
+@mock.patch('Repairs.pdf.html_to_pdf', side_effect=fake_pdf)
+class BranchPdfExportTests(TempMediaMixin, RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def download_zip(self, branch):
+        response = self.client.get(reverse('branch-repair-zip', args=[branch.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_zip_holds_one_history_per_equipment(self, html_to_pdf):
+        self.completed_repair()
+        files = self.download_zip(self.branches[0])
+        self.assertEqual(files, {
+            'equipment_0_repairs.pdf': b'%PDF Repair History for Equipment #0',
+            'equipment_2_repairs.pdf': b'%PDF Repair History for Equipment #2',
+        })
+        # shares the cache with the single-equipment download
+        self.client.get(reverse('equipment-repair-pdf', args=[self.equipment[0].pk]))
+        self.download_zip(self.branches[0])
+        self.assertEqual(html_to_pdf.call_count, 2)
+
+    def test_reads_the_branch_in_a_fixed_number_of_queries(self, html_to_pdf):
+        def export_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                list(pdf_export.documents(pdf_export.histories(self.branches[0]), 0, use_cache=False))
+            return len(ctx.captured_queries)
+
+        self.completed_repair()
+        few = export_queries()
+        for i in range(6):
+            equipment = Equipment.objects.create(tag_number=100 + i, serial_number=f'SN-X{i}', branch=self.branches[0])
+            repair = self.approve(self.request_repair(equipment), self.techs[i % 2])
+            self.complete(repair, [(self.parts[0], 1), (self.parts[1], 2)])
+        self.assertEqual(export_queries(), few)
+
+    def test_pooled_renders_keep_every_document(self, html_to_pdf):
+        for i in range(8):
+            Equipment.objects.create(tag_number=200 + i, serial_number=f'SN-P{i}', branch=self.branches[1])
+        with ThreadPoolExecutor(2) as pool, mock.patch('Repairs.pdf_pool.get', return_value=pool):
+            rendered = list(pdf_export.documents(pdf_export.histories(self.branches[1]), 2))
+        self.assertEqual(sorted(position for position, _, _ in rendered), list(range(10)))
+        self.assertEqual(
+            {name: content for _, name, content in rendered}['equipment_201_repairs.pdf'],
+            b'%PDF Repair History for Equipment #201',
+        )
+
+    def test_benchmark_reports_each_pool_size(self, html_to_pdf):
+        out = io.StringIO()
+        call_command('benchmark_pdf_export', '--processes', '0', '--branch', str(self.branches[0].pk), stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['equipment'], 2)
+        self.assertEqual([(run['processes'], run['documents'], run['speedup']) for run in report['runs']], [(0, 2, 1.0)])
+        # the cache is left alone
+        self.assertFalse(list(pdf_cache.cache_root().glob('*/*.pdf')))
+
+    def test_merged_pdf_needs_pypdf(self, html_to_pdf):
+        with mock.patch('Repairs.pdf_export.can_merge', return_value=False):
+            response = self.client.get(reverse('branch-repair-pdf', args=[self.branches[0].pk]))
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(PDF_MERGE_MAX_DOCUMENTS=1)
+    def test_merged_pdf_is_capped(self, html_to_pdf):
+        with mock.patch('Repairs.pdf_export.can_merge', return_value=True):
+            response = self.client.get(reverse('branch-repair-pdf', args=[self.branches[0].pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ZIP', response.data['error'])
+        html_to_pdf.assert_not_called()
+
+    def test_admins_only(self, html_to_pdf):
+        self.assertEqual(self.client.get(reverse('branch-repair-zip', args=[999])).status_code, 404)
+        self.client.force_authenticate(self.techs[0])
+        self.assertEqual(self.client.get(reverse('branch-repair-zip', args=[self.branches[0].pk])).status_code, 403)
+
+
+class HotQueryPlanTests(RepairFixturesMixin, TestCase):
+    def test_hot_queries_use_indexes_on_seeded_data(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', seed=2000, stdout=out)
+        self.assertIn('Every hot query uses an index.', out.getvalue())
+        # the seeded rows are rolled back
+        self.assertFalse(Repair.objects.exists())
+
+    def test_unindexed_filter_is_reported(self):
+        plan = query_plans.explain(Repair.objects.filter(remark='no boot').order_by())
+        self.assertEqual(query_plans.full_scans(plan), [Repair._meta.db_table])
+
+    def test_completed_repair_requires_completed_at(self):
+        repair = self.request_repair(self.equipment[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Repair.objects.filter(pk=repair.pk).update(status='completed')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RepairPart.objects.create(repair=repair, part=self.parts[0], quantity=0)
+
+
+class SeedingTests(TestCase):
+    def test_seed_creates_requested_volumes_and_rollups(self):
+        result = seeding.seed(repairs=500, branches=4, staff=5, parts=10, months=6,
+                              status_weights={'completed': 3, 'pending': 1})
+        self.assertEqual(Repair.objects.count(), 500)
+        self.assertEqual(Equipment.objects.count(), 125)
+        self.assertEqual(set(Repair.objects.values_list('status', flat=True)), {'completed', 'pending'})
+        self.assertEqual(RepairPart.objects.count(), result['counts']['repair_parts'])
+        self.assertFalse(Repair.objects.filter(status='pending', repair_staff__isnull=False).exists())
+        # creation dates are spread out rather than all stamped now
+        self.assertGreater(Repair.objects.dates('created_at', 'month').count(), 3)
+        self.assertEqual(sum(stats.dashboard_stats()['repairs_by_branch']['values']), 500)
+
+    def test_runs_do_not_collide(self):
+        seeding.seed(repairs=20, random_seed=1)
+        seeding.seed(repairs=20, random_seed=1)
+        self.assertEqual(Repair.objects.count(), 40)
+
+    def test_parse_weights(self):
+        self.assertEqual(seeding.parse_weights('completed=6,pending=1'), {'completed': 6.0, 'pending': 1.0})
+        with self.assertRaises(ValueError):
+            seeding.parse_weights('lost=1')
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile_interpolates(self):
+        values = [1, 2, 3, 4]
+        self.assertEqual(benchmark.percentile(values, 50), 2.5)
+        self.assertEqual(benchmark.percentile(values, 100), 4)
+        self.assertIsNone(benchmark.percentile([], 95))
+
+    def test_client_report(self):
+        seeding.seed(repairs=200, status_weights={'approved': 1, 'completed': 1})
+        runner = benchmark.ClientRunner(iterations=4, warmup=1, memory_samples=1)
+        report = benchmark.report(runner, ['equipment-list', 'repair-history', 'admin-stats', 'complete'])
+
+        self.assertEqual(report['data']['repairs'], 200)
+        for name, result in report['scenarios'].items():
+            self.assertEqual((result['requests'], result['errors']), (4, 0), name)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+            self.assertGreater(result['queries']['mean'], 0)
+            self.assertGreater(result['peak_memory_kib'], 0)
+        # the timed and the memory pass each completed a different repair
+        self.assertEqual(Repair.objects.filter(report='Benchmark repair').count(), 5)
+        json.dumps(report)
+
+    def test_only_seeded_stock_is_topped_up_and_only_for_completions(self):
+        real = PartStock.objects.create(part=Part.objects.create(name='Fan'), quantity=3)
+        seeding.seed(repairs=40, status_weights={'approved': 1})
+        seeded = dict(PartStock.objects.exclude(pk=real.pk).values_list('pk', 'quantity'))
+
+        runner = benchmark.ClientRunner(iterations=2, warmup=0, memory_samples=0)
+        benchmark.report(runner, ['equipment-list'])
+        self.assertEqual(dict(PartStock.objects.exclude(pk=real.pk).values_list('pk', 'quantity')), seeded)
+
+        benchmark.report(runner, ['complete'])
+        self.assertNotEqual(dict(PartStock.objects.exclude(pk=real.pk).values_list('pk', 'quantity')), seeded)
+        self.assertEqual(PartStock.objects.get(pk=real.pk).quantity, 3)
+
+
+class EndpointQueryBudgetTests(QueryBudgetMixin, RepairFixturesMixin, APITestCase):
+    """Every budgeted route, authenticated with a real token and a cold Staff cache."""
+
+    def setUp(self):
+        staff_cache.clear()
+        self.login(self.admin)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def add_history(self, equipment, count):
+        for i in range(count):
+            repair = self.approve(self.request_repair(equipment), self.techs[i % 2])
+            self.complete(repair, [(self.parts[0], 1), (self.parts[1], 2)])
+
+    def test_read_routes(self):
+        for equipment in self.equipment:
+            self.add_history(equipment, 3)
+        responses = [
+            self.client.get(reverse('equipment-list')),
+            self.client.get(reverse('equipment-detail', args=[self.equipment[0].pk])),
+            self.client.get(reverse('equipment-repair-history'), {'tag_number': self.equipment[0].tag_number}),
+            self.client.post(reverse('equipment-repair-history-batch'),
+                             {'tag_numbers': [e.tag_number for e in self.equipment]}, format='json'),
+            self.client.get(reverse('admin-stats')),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 200, response.resolver_match.view_name)
+            self.assertWithinQueryBudget(response)
+            staff_cache.clear()
+
+    def test_workflow_routes(self):
+        response = self.client.post(reverse('repair-request'), {'equipment': self.equipment[0].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        repair_id = response.data['id']
+
+        staff_cache.clear()
+        response = self.client.patch(reverse('repair-approve', args=[repair_id]),
+                                     {'status': 'approved', 'repair_staff_id': self.techs[0].pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+        # and one assigned automatically
+        other = self.request_repair(self.equipment[1])
+        staff_cache.clear()
+        response = self.client.patch(reverse('repair-approve', args=[other.pk]), {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(Repair.objects.get(pk=other.pk).repair_staff_id, self.techs[1].pk)
+
+        batch = [self.request_repair(equipment) for equipment in self.equipment]
+        staff_cache.clear()
+        response = self.client.post(reverse('repair-approve-bulk'), {'decisions': [
+            {'repair_id': repair.pk, 'status': 'approved'} for repair in batch
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+        self.login(self.techs[0])
+        # tracked both at the branch and centrally, so completion takes stock
+        PartStock.objects.bulk_create(
+            [PartStock(part=p, quantity=5) for p in self.parts]
+            + [PartStock(part=self.parts[0], branch=self.equipment[0].branch, quantity=5)]
+        )
+        parts = [{'part_id': p.pk, 'quantity': 1} for p in self.parts]
+        response = self.client.patch(reverse('repair-complete', args=[repair_id]),
+                                     {'status': 'completed', 'report': 'fixed', 'parts': parts}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+
+class AsyncReadViewTests(QueryBudgetMixin, RepairFixturesMixin, APITestCase):
+    """The ASGI-native read views answer exactly like the DRF views they mirror."""
+
+    def setUp(self):
+        staff_cache.clear()
+        self.auth = f'Bearer {AccessToken.for_user(self.admin)}'
+
+    def get_async(self, route, params=None, **headers):
+        return async_to_sync(self.async_client.get)(reverse(route), params, headers=headers)
+
+    def rows(self, response):
+        data = response.json()
+        return data['results'] if isinstance(data, dict) and 'results' in data else data
+
+    def test_responses_match_the_sync_views(self):
+        for equipment in self.equipment[:2]:
+            for i in range(2):
+                repair = self.approve(self.request_repair(equipment), self.techs[i])
+                self.complete(repair, [(self.parts[i], 2)])
+
+        for route, params in (('equipment-list', {'page_size': 3}),
+                              ('equipment-repair-history', {'tag_number': self.equipment[0].tag_number}),
+                              ('equipment-repair-history', {'serial_number': self.equipment[1].serial_number}),
+                              ('admin-stats', None)):
+            expected = self.client.get(reverse(route), params, HTTP_AUTHORIZATION=self.auth)
+            staff_cache.clear()
+            response = self.get_async(f'{route}-async', params, Authorization=self.auth)
+            self.assertEqual(response.status_code, 200, route)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            # list pages differ only in their own links
+            self.assertEqual(self.rows(response), self.rows(expected), route)
+            self.assertWithinQueryBudget(response)
+
+    def test_history_lookups(self):
+        self.assertEqual(self.get_async('equipment-repair-history-async', Authorization=self.auth).json(), [])
+        response = self.get_async('equipment-repair-history-async', {'tag_number': 999}, Authorization=self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_authentication_is_enforced(self):
+        response = self.get_async('admin-stats-async')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = self.get_async('equipment-list-async', Authorization='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertEqual(self.client.post(reverse('admin-stats-async'), HTTP_AUTHORIZATION=self.auth).status_code, 405)
+
+
+class FastReadSerializerTests(RepairFixturesMixin, APITestCase):
+    """FAST_READ_SERIALIZERS changes how read responses are built, never what they contain."""
+
+    def setUp(self):
+        staff_cache.clear()
+        self.auth = f'Bearer {AccessToken.for_user(self.admin)}'
+        Equipment.objects.filter(pk=self.equipment[0].pk).update(added_by=self.admin, status='need_repair', remark='fan')
+        # equipment[1] keeps the 'Working' default, which is not one of the choices, and no added_by
+        for i, equipment in enumerate(self.equipment[:2]):
+            repair = self.approve(self.request_repair(equipment), self.techs[i])
+            self.complete(repair, [(self.parts[0], 1), (self.parts[i + 1], 3)])
+            self.approve(self.request_repair(equipment), self.techs[i])
+        # pending: no technician, report or completion yet
+        self.request_repair(self.equipment[0])
+
+    def get(self, route, params=None):
+        if route.endswith('-async'):
+            return async_to_sync(self.async_client.get)(reverse(route), params, headers={'Authorization': self.auth})
+        if route == 'equipment-repair-history-batch':
+            return self.client.post(reverse(route), params, format='json', HTTP_AUTHORIZATION=self.auth)
+        return self.client.get(reverse(route), params, HTTP_AUTHORIZATION=self.auth)
+
+    def both(self, route, params=None):
+        responses = []
+        for fast in (False, True):
+            with override_settings(FAST_READ_SERIALIZERS=fast), CaptureQueriesContext(connection) as ctx:
+                response = self.get(route, params)
+            self.assertEqual(response.status_code, 200, route)
+            responses.append((response, len(ctx.captured_queries)))
+        return responses
+
+    def test_responses_are_identical(self):
+        tags = [e.tag_number for e in self.equipment]
+        for route, params in (
+                ('equipment-list', None),
+                ('equipment-list', {'page_size': 2, 'ordering': 'status'}),
+                ('equipment-list', {'branch': self.branches[0].pk, 'search': 'SN'}),
+                ('equipment-list-async', {'page_size': 3}),
+                ('equipment-lookup', {'q': 'SN-'}),
+                ('equipment-repair-history', {'tag_number': self.equipment[0].tag_number}),
+                ('equipment-repair-history', {'serial_number': self.equipment[3].serial_number}),
+                ('equipment-repair-history-async', {'tag_number': self.equipment[1].tag_number}),
+                ('equipment-repair-history-batch', {'tag_numbers': tags + [404], 'serial_numbers': ['SN-x']})):
+            (drf, drf_queries), (fast, fast_queries) = self.both(route, params)
+            self.assertEqual(fast.content, drf.content, (route, params))
+            self.assertLessEqual(fast_queries, drf_queries, (route, params))
+
+    def test_cursor_walk_matches(self):
+        pages = {}
+        for fast in (False, True):
+            pages[fast] = []
+            url = reverse('equipment-list') + '?page_size=1&ordering=-tag_number'
+            with override_settings(FAST_READ_SERIALIZERS=fast):
+                while url:
+                    response = self.client.get(url, HTTP_AUTHORIZATION=self.auth)
+                    pages[fast].append(response.content)
+                    url = response.json()['next']
+        self.assertEqual(len(pages[False]), len(self.equipment))
+        self.assertEqual(pages[True], pages[False])
+
+    def test_benchmark_reports_both_paths(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', rows=10, repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+        for name in ('equipment', 'repair_history'):
+            self.assertTrue(report[name]['identical'], name)
+            self.assertGreater(report[name]['fast']['rows_per_second'], 0)
+            self.assertGreater(report[name]['drf']['rows_per_second'], 0)
+
+
+class QueryMetricsMiddlewareTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        route_metrics.reset()
+        self.client.force_authenticate(self.admin)
+
+    def test_in_lists_share_a_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 WHERE id IN (%s,%s)'),
+        )
+
+    @override_settings(QUERY_METRICS_HEADERS=True)
+    def test_debug_headers(self):
+        response = self.client.get(reverse('admin-stats'))
+        self.assertEqual(int(response['X-DB-Queries']), response.query_metrics.count)
+        self.assertEqual(response['X-DB-Duplicates'], '0')
+        self.assertTrue(response['X-DB-Time'].endswith('ms'))
+
+    @override_settings(QUERY_METRICS_HEADERS=False)
+    def test_no_headers_in_production(self):
+        response = self.client.get(reverse('admin-stats'))
+        self.assertFalse(response.has_header('X-DB-Queries'))
+
+    def test_routes_aggregate_including_streamed_bodies(self):
+        self.client.get(reverse('admin-stats'))
+        self.client.get(reverse('admin-stats'))
+        response = self.client.get(reverse('repair-export'))
+        self.assertNotIn('repair-export', route_metrics.snapshot())
+        size = len(b''.join(response.streaming_content))
+
+        snapshot = route_metrics.snapshot()
+        self.assertEqual(snapshot['admin-stats']['requests'], 2)
+        self.assertEqual(snapshot['admin-stats']['queries'], 2 * snapshot['admin-stats']['max_queries'])
+        self.assertEqual(snapshot['repair-export']['response_bytes'], size)
+        self.assertGreater(snapshot['repair-export']['queries'], 0)
+
+        response = self.client.get(reverse('admin-endpoint-metrics'))
+        self.assertEqual(response.data['admin-stats']['requests'], 2)
+
+    # the row serializers read related names in the one query, so only the DRF path can be made to N+1
+    @override_settings(FAST_READ_SERIALIZERS=False)
+    def test_n_plus_one_is_counted_as_duplicates(self):
+        for _ in range(3):
+            self.approve(self.request_repair(self.equipment[0]), self.techs[0])
+        with mock.patch('Repairs.views.repair_history_queryset', lambda: Repair.objects.all()), \
+                self.assertLogs('config.instrumentation', 'WARNING') as logs:
+            response = self.client.get(reverse('equipment-repair-history'), {'tag_number': self.equipment[0].tag_number})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.query_metrics.duplicates, 0)
+        self.assertIn('equipment-repair-history ran', logs.output[0])
+
+
+class RepairEventStreamTests(RepairFixturesMixin, APITestCase):
+    def test_broker_fans_out_to_matching_subscribers(self):
+        broker = Broker()
+
+        async def listen():
+            with broker.subscribe(lambda e: e['branch'] == 1) as ones, broker.subscribe() as everything:
+                await asyncio.to_thread(broker.publish, {'id': 1, 'branch': 2})
+                await asyncio.to_thread(broker.publish, {'id': 2, 'branch': 1})
+                return [await ones.get()], [await everything.get(), await everything.get()]
+
+        self.assertEqual(async_to_sync(listen)(), ([{'id': 2, 'branch': 1}], [{'id': 1, 'branch': 2}, {'id': 2, 'branch': 1}]))
+        self.assertEqual(broker._subscribers, set())
+
+    def test_slow_subscriber_is_cut_off(self):
+        broker = Broker()
+
+        async def listen():
+            with broker.subscribe() as subscription:
+                subscription.queue = asyncio.Queue(2)
+                for i in range(3):
+                    broker.publish({'id': i})
+                await asyncio.sleep(0)
+                return await subscription.get()
+
+        self.assertIsNone(async_to_sync(listen)())
+
+    def test_events_are_relayed_between_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        streaming, writing = Broker(directory, pid=1), Broker(directory, pid=2)
+        self.addCleanup(streaming.stop)
+
+        async def listen():
+            with streaming.subscribe() as subscription:
+                writing.publish({'id': 7, 'branch': None})
+                return await asyncio.wait_for(subscription.get(), 5)
+
+        self.assertEqual(async_to_sync(listen)(), {'id': 7, 'branch': None})
+        self.assertEqual(os.listdir(directory), ['1.port'])
+        streaming.stop()
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_stream_replays_then_follows_a_branch(self):
+        first = self.request_repair(self.equipment[0])
+        self.request_repair(self.equipment[1])
+        last_id = RepairEvent.objects.order_by('pk').values_list('pk', flat=True).first()
+        later = self.request_repair(self.equipment[2])
+        token = str(AccessToken.for_user(self.techs[0]))
+
+        def approve_on_commit():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.approve(Repair.objects.get(pk=first.pk), self.techs[0])
+                # another branch
+                self.approve(Repair.objects.get(pk=self.request_repair(self.equipment[1]).pk), self.techs[0])
+
+        async def read():
+            response = await self.async_client.get(
+                reverse('repair-event-stream'),
+                {'branch': self.branches[0].pk, 'access_token': token},
+                headers={'Last-Event-ID': str(last_id)},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            messages = []
+            chunks = aiter(response.streaming_content)
+            try:
+                while len(messages) < 2:
+                    chunk = (await anext(chunks)).decode()
+                    if chunk.startswith('id:'):
+                        messages.append(json.loads(chunk.split('data: ', 1)[1]))
+                        if len(messages) == 1:
+                            await sync_to_async(approve_on_commit)()
+            finally:
+                await chunks.aclose()
+            return messages
+
+        replayed, live = async_to_sync(read)()
+        # the first request at branch 0 came before Last-Event-ID
+        self.assertEqual((replayed['repair'], replayed['to_status']), (later.pk, 'pending'))
+        self.assertEqual(
+            (live['repair'], live['from_status'], live['to_status'], live['repair_staff'], live['branch']),
+            (first.pk, 'pending', 'approved', self.techs[0].pk, self.branches[0].pk),
+        )
+
+    def test_replay_is_not_cut_short(self):
+        repair = self.request_repair(self.equipment[0])
+        last_id = RepairEvent.objects.get(repair=repair).pk
+        missed = events.REPLAY_LIMIT * 2 + 3
+        RepairEvent.objects.bulk_create([
+            RepairEvent(repair=repair, from_status='pending', to_status='pending', created_at=timezone.now())
+            for _ in range(missed)
+        ])
+        token = str(AccessToken.for_user(self.admin))
+
+        async def read():
+            response = await self.async_client.get(
+                reverse('repair-event-stream'), {'access_token': token, 'last_event_id': last_id}
+            )
+            ids = []
+            chunks = aiter(response.streaming_content)
+            try:
+                # the first keep-alive means the replay is over
+                while not (chunk := (await anext(chunks)).decode()).startswith(': keepalive'):
+                    if chunk.startswith('id:'):
+                        ids.append(json.loads(chunk.split('data: ', 1)[1])['id'])
+            finally:
+                await chunks.aclose()
+            return ids
+
+        with override_settings(EVENT_STREAM_KEEPALIVE=0.05):
+            ids = async_to_sync(read)()
+        self.assertEqual(len(ids), missed)
+        self.assertEqual(ids, list(RepairEvent.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)))
+
+    def test_stream_needs_a_valid_token(self):
+        response = async_to_sync(self.async_client.get)(reverse('repair-event-stream'), {'access_token': 'nope'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(async_to_sync(self.async_client.get)(reverse('repair-event-stream')).status_code, 401)
+
+
+class MetricsEndpointTests(RepairFixturesMixin, APITestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.client.force_authenticate(self.admin)
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_workflow_views_feed_counters(self):
+        ids = [
+            self.client.post(reverse('repair-request'), {'equipment': e.pk}, format='json').data['id']
+            for e in self.equipment[:2]
+        ]
+        self.client.patch(reverse('repair-approve', args=[ids[0]]),
+                          {'status': 'approved', 'repair_staff_id': self.techs[0].pk}, format='json')
+        self.client.patch(reverse('repair-approve', args=[ids[1]]), {'status': 'rejected'}, format='json')
+        self.client.force_authenticate(self.techs[0])
+        for _ in range(2):
+            response = self.client.patch(reverse('repair-complete', args=[ids[0]]),
+                                         {'status': 'completed', 'report': 'ok', 'parts': []}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+        samples = self.scrape()
+        self.assertEqual(samples['repairs_total{event="requested"}'], 2)
+        self.assertEqual(samples['repairs_total{event="approved"}'], 1)
+        self.assertEqual(samples['repairs_total{event="rejected"}'], 1)
+        # completing twice is still one completion
+        self.assertEqual(samples['repairs_total{event="completed"}'], 1)
+        for stage in ('approval', 'repair', 'total'):
+            self.assertEqual(samples[f'repair_wait_seconds_count{{stage="{stage}"}}'], 1)
+            self.assertEqual(samples[f'repair_wait_seconds_bucket{{stage="{stage}",le="60"}}'], 1)
+        self.assertEqual(samples['http_request_duration_seconds_count{route="repair-request",method="POST"}'], 2)
+        self.assertEqual(samples['http_request_duration_seconds_count{route="repair-complete",method="PATCH"}'], 2)
+
+    def test_bulk_decisions_feed_counters(self):
+        repairs = [self.request_repair(e) for e in self.equipment[:3]]
+        response = self.client.post(reverse('repair-approve-bulk'), {'decisions': [
+            {'repair_id': repairs[0].pk, 'status': 'approved', 'repair_staff_id': self.techs[0].pk},
+            {'repair_id': repairs[1].pk, 'status': 'approved'},
+            {'repair_id': repairs[2].pk, 'status': 'rejected'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['decided']), 3)
+
+        samples = self.scrape()
+        self.assertEqual(samples['repairs_total{event="approved"}'], 2)
+        self.assertEqual(samples['repairs_total{event="rejected"}'], 1)
+        self.assertEqual(samples['repair_wait_seconds_count{stage="approval"}'], 2)
+        self.assertEqual(samples['repair_wait_seconds_bucket{stage="approval",le="60"}'], 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.registry.observe('http_request_duration_seconds', ['ping', 'GET'], 0.003)
+        metrics.registry.observe('http_request_duration_seconds', ['ping', 'GET'], 0.2)
+        text = metrics.exposition(metrics.registry.collect())
+        self.assertIn('http_request_duration_seconds_bucket{route="ping",method="GET",le="0.005"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="ping",method="GET",le="0.1"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="ping",method="GET",le="0.25"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="ping",method="GET",le="+Inf"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{route="ping",method="GET"} 2', text)
+
+    def test_workers_are_summed_through_the_metrics_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            worker = metrics.Registry(pid=999999)
+            worker.inc('repairs_total', ['completed'], 3)
+            worker.flush()
+            metrics.registry.inc('repairs_total', ['completed'])
+            metrics.registry.flush()
+            # this process is read live, not from its possibly stale file
+            metrics.registry.inc('repairs_total', ['completed'])
+            samples = self.scrape()
+        self.assertEqual(samples['repairs_total{event="completed"}'], 5)
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+
+class DatabaseWriteBenchmarkTests(TransactionTestCase):
+    def test_sqlite_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite pragmas")
+        with connection.cursor() as cursor:
+            for pragma, expected in (('synchronous', 1), ('busy_timeout', 5000), ('temp_store', 2)):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+
+    def test_concurrent_writes_are_reported_and_removed(self):
+        seeding.seed(repairs=10, branches=2, staff=2, parts=2)
+        before = stats.dashboard_stats()
+        out = io.StringIO()
+        # one writer: the shared-cache in-memory test database locks tables
+        # instead of waiting on busy_timeout
+        call_command('benchmark_db_writes', threads=1, writes=5, stdout=out)
+        report = json.loads(out.getvalue().rsplit('}', 1)[0] + '}')
+        self.assertEqual((report['writes'], report['errors']), (5, 0))
+        self.assertGreater(report['writes_per_second'], 0)
+        self.assertEqual(Repair.objects.count(), 10)
+        self.assertEqual(stats.dashboard_stats(), before)
+
+
+class AsyncDeploymentTests(TransactionTestCase):
+    """Outside a transaction, as in production, so worker threads see the same rows."""
+
+    def test_dashboard_sections_are_queried_concurrently(self):
+        seeding.seed(repairs=40, branches=2, staff=3, parts=3)
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meeting(section):
+            # both must be running at once to get past the barrier
+            def run(scope=None):
+                barrier.wait()
+                return section(scope)
+            return run
+
+        sections = dict(stats.DASHBOARD_SECTIONS)
+        sections['monthly_repairs'] = meeting(sections['monthly_repairs'])
+        sections['staff_workload'] = meeting(sections['staff_workload'])
+        with mock.patch.dict(stats.DASHBOARD_SECTIONS, sections):
+            concurrent = async_to_sync(stats.adashboard_stats)()
+        self.assertEqual(concurrent, stats.dashboard_stats())
+
+    def test_deployment_report(self):
+        seeding.seed(repairs=60, branches=2, staff=3, parts=3)
+        runner = benchmark.DeploymentRunner(4, iterations=8, warmup=1, memory_samples=0)
+        report = benchmark.report(runner, list(benchmark.ASYNC_COUNTERPARTS))
+        for name, result in report['scenarios'].items():
+            for stack in ('wsgi', 'asgi'):
+                self.assertEqual((result[stack]['requests'], result[stack]['errors']), (8, 0), (name, stack))
+                self.assertGreater(result[stack]['requests_per_second'], 0)
+        json.dumps(report)
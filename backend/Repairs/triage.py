@@ -0,0 +1,85 @@
+"""
+Deciding many pending repairs at once. The whole batch is read with one
+id__in query and written back with an UPDATE for the approvals and one
+for the rejections, one INSERT of events and one rollup change, however
+many repairs it holds. A repair that can't be decided is reported
+against its id and doesn't hold up the others.
+"""
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from Staff.models import Staff
+from .models import Repair
+from . import assignment, events, stats
+
+
+@transaction.atomic
+def decide(decisions, actor=None):
+    """
+    Apply [{'repair_id', 'status', 'repair_staff_id'?}] to pending repairs.
+    Approvals that name nobody go to the least-loaded technicians, as a
+    single approval does. Returns the decided repairs and a dict of
+    repair_id -> why it was left alone.
+    """
+    now = timezone.now()
+    repairs = Repair.objects.select_for_update(of=('self',)).select_related('equipment') \
+        .in_bulk([d['repair_id'] for d in decisions])
+    named = {d['repair_staff_id'] for d in decisions if d.get('repair_staff_id')}
+    known_staff = set(Staff.objects.filter(id__in=named).values_list('id', flat=True))
+
+    failed, accepted = {}, []
+    for d in decisions:
+        repair = repairs.get(d['repair_id'])
+        if repair is None:
+            failed[d['repair_id']] = "Repair not found"
+        elif repair.status != 'pending':
+            failed[d['repair_id']] = f"Repair is already {repair.status}"
+        elif d.get('repair_staff_id') and d['repair_staff_id'] not in known_staff:
+            failed[d['repair_id']] = "Staff not found"
+        else:
+            accepted.append((repair, d))
+
+    unassigned = [
+        repair for repair, d in accepted
+        if d['status'] == 'approved' and not d.get('repair_staff_id') and repair.repair_staff_id is None
+    ]
+    picks = dict(zip(
+        [repair.pk for repair in unassigned],
+        assignment.spread([repair.equipment.branch_id for repair in unassigned]) if unassigned else [],
+    ))
+
+    before, after = Counter(), Counter()
+    decided, approved, rejected = [], [], []
+    for repair, d in accepted:
+        staff_id = d.get('repair_staff_id') or repair.repair_staff_id or picks.get(repair.pk)
+        if d['status'] == 'approved' and staff_id is None:
+            failed[repair.pk] = "No technician is available to assign"
+            continue
+        before += stats.repair_counters(repair)
+        repair.status = d['status']
+        if repair.status == 'approved':
+            repair.approved_at = now
+            repair.repair_staff_id = staff_id
+            approved.append(repair)
+        else:
+            rejected.append(repair)
+        decided.append(repair)
+        after += stats.repair_counters(repair)
+
+    if approved:
+        Repair.objects.filter(pk__in=[repair.pk for repair in approved]).update(
+            status='approved',
+            approved_at=now,
+            repair_staff_id=Case(
+                *[When(pk=repair.pk, then=Value(repair.repair_staff_id)) for repair in approved],
+                default=F('repair_staff_id'), output_field=models.IntegerField(),
+            ),
+        )
+    if rejected:
+        Repair.objects.filter(pk__in=[repair.pk for repair in rejected]).update(status='rejected')
+    stats.record_change(before, after)
+    events.record_all(decided, 'pending', actor=actor, at=now)
+    return decided, failed
@@ -1,17 +1,37 @@
 
 from django.urls import path
-from .views import RepairRequestCreateView, RepairApprovalView ,CompleteRepairView , PartDetailView, PartListCreateView ,EquipmentRepairHistoryView , AdminRepairStatsView , EquipmentRepairPDFView , RepairReceiptPDFView
+from .views import RepairRequestCreateView, RepairApprovalView , BulkRepairDecisionView ,CompleteRepairView , PartDetailView, PartListCreateView , PartStockListView , LowStockListView , RestockView , TechnicianQueueView , TechnicianUpdateView ,EquipmentRepairHistoryView , EquipmentRepairHistoryBatchView , AdminRepairStatsView , AsyncEquipmentRepairHistoryView , AsyncAdminRepairStatsView , RepairTimelineView , RepairEventStreamView , RepairSlaStatsView , AdminEndpointMetricsView , EquipmentRepairPDFView , BranchRepairPDFExportView , RepairReceiptPDFView , PdfJobCreateView , PdfJobDetailView , PdfJobDownloadView , RepairExportView , PartUsageExportView
 
 urlpatterns = [
     path('request/', RepairRequestCreateView.as_view(), name='repair-request'),
     path('approve/<int:pk>/', RepairApprovalView.as_view(), name='repair-approve'),
+    path('approve/bulk/', BulkRepairDecisionView.as_view(), name='repair-approve-bulk'),
     path('complete/<int:pk>/', CompleteRepairView.as_view(), name='repair-complete'),
     path('parts/<int:pk>/', PartDetailView.as_view(), name='part-detail'),
     path('parts/', PartListCreateView.as_view(), name='part-list-create'),
+    path('parts/stock/', PartStockListView.as_view(), name='part-stock-list'),
+    path('parts/stock/low/', LowStockListView.as_view(), name='part-stock-low'),
+    path('parts/stock/restock/', RestockView.as_view(), name='part-restock'),
+    path('technicians/', TechnicianQueueView.as_view(), name='technician-queue'),
+    path('technicians/<int:staff>/', TechnicianUpdateView.as_view(), name='technician-detail'),
     path('repair-history/', EquipmentRepairHistoryView.as_view(), name='equipment-repair-history'),
+    path('repair-history/batch/', EquipmentRepairHistoryBatchView.as_view(), name='equipment-repair-history-batch'),
+    path('repair-history/async/', AsyncEquipmentRepairHistoryView.as_view(), name='equipment-repair-history-async'),
     path('admin/stats/', AdminRepairStatsView.as_view(), name='admin-stats'),
+    path('admin/stats/async/', AsyncAdminRepairStatsView.as_view(), name='admin-stats-async'),
+    path('admin/stats/sla/', RepairSlaStatsView.as_view(), name='admin-stats-sla'),
+    path('repair/<int:repair_id>/timeline/', RepairTimelineView.as_view(), name='repair-timeline'),
+    path('events/stream/', RepairEventStreamView.as_view(), name='repair-event-stream'),
+    path('admin/endpoint-metrics/', AdminEndpointMetricsView.as_view(), name='admin-endpoint-metrics'),
     path('equipment/<int:equipment_id>/repairs/pdf/', EquipmentRepairPDFView.as_view(), name='equipment-repair-pdf'),
+    path('branch/<int:branch_id>/repairs/pdf/', BranchRepairPDFExportView.as_view(), {'bundle': 'pdf'}, name='branch-repair-pdf'),
+    path('branch/<int:branch_id>/repairs/zip/', BranchRepairPDFExportView.as_view(), {'bundle': 'zip'}, name='branch-repair-zip'),
     path('repair/<int:repair_id>/receipt/pdf/', RepairReceiptPDFView.as_view(), name='repair-receipt-pdf'),
+    path('export/', RepairExportView.as_view(), name='repair-export'),
+    path('parts/usage/export/', PartUsageExportView.as_view(), name='part-usage-export'),
+    path('pdf-jobs/', PdfJobCreateView.as_view(), name='pdf-job-create'),
+    path('pdf-jobs/<int:pk>/', PdfJobDetailView.as_view(), name='pdf-job-detail'),
+    path('pdf-jobs/<int:pk>/download/', PdfJobDownloadView.as_view(), name='pdf-job-download'),
 
 
 
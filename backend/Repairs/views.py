@@ -1,24 +1,38 @@
 
 from rest_framework import generics, permissions
-from django.http import HttpResponse
-from .models import Repair , Part , RepairPart
-from Equipments.models import Equipment
-from .serializers import RepairCreateSerializer , PartSerializer , CompleteRepairSerializer , RepairHistorySerializer , RepairApprovalSerializer
+from django.http import HttpResponse , FileResponse , Http404 , StreamingHttpResponse
+from .models import Repair , Part , RepairPart , PdfRenderJob , PartStock , RepairEvent , Technician
+from Equipments.models import Branch , Equipment
+from .serializers import RepairCreateSerializer , PartSerializer , CompleteRepairSerializer , RepairHistorySerializer , RepairApprovalSerializer , PdfRenderJobSerializer , RepairHistoryBatchSerializer , PartStockSerializer , RestockSerializer , StatsScopeSerializer , TechnicianSerializer , BulkRepairDecisionSerializer , RepairStreamSerializer , RepairHistoryRowSerializer
+from Equipments.serializers import EquipmentSerializer , EquipmentRowSerializer
 from Equipments.permissions import IsStaffOrAdmin
 from Repairs.permissions import IsAdmin , IsAssignedRepairStaff
 from rest_framework import viewsets
-from django.shortcuts import get_object_or_404
-from django.db.models.functions import TruncMonth
-from django.db.models import Count , Sum , Value 
-from django.db.models.functions import Concat
-from collections import defaultdict
+from django.shortcuts import get_object_or_404 , aget_object_or_404
+from django.db.models import Prefetch , Q , F , Count , Sum
+from django_filters.rest_framework import DjangoFilterBackend
+from Equipments.exports import CHUNK_SIZE , ExportView
+from .filters import RepairExportFilter , RepairPartExportFilter , RepairEventFilter
+from django.utils.cache import get_conditional_response , patch_cache_control
+from django.utils.http import quote_etag
+from . import stats , pdf , pdf_export , inventory , events
+from .pagination import PartStockCursorPagination
+from config import metrics
+from config.instrumentation import route_metrics
+from config.async_api import AsyncAPIView
+from config.rows import RowSerializerMixin
+from config.broker import broker
+from Staff.authentication import CachedJWTAuthentication , QueryStringJWTAuthentication
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import asyncio
+import json
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.template.loader import render_to_string
-from weasyprint import HTML
 
 
 class PartListCreateView(generics.ListCreateAPIView):
@@ -42,6 +56,54 @@ class PartViewSet(viewsets.ModelViewSet):
     serializer_class = PartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+class PartStockListView(generics.ListAPIView):
+    queryset = PartStock.objects.select_related('part', 'branch')
+    serializer_class = PartStockSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PartStockCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['part', 'branch']
+
+
+class LowStockListView(PartStockListView):
+    """Stock rows at or under their reorder level."""
+
+    def get_queryset(self):
+        return inventory.low_stock().select_related('part', 'branch')
+
+
+class RestockView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Add delivered parts to a branch's stock, or to the central store when branch_id is "
+                              "left out, optionally setting the reorder level. Missing stock rows are created.",
+        request_body=RestockSerializer,
+        responses={200: PartStockSerializer(many=True), 400: 'Bad Request'}
+    )
+    def post(self, request):
+        serializer = RestockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(PartStockSerializer(serializer.save(), many=True).data)
+
+
+class TechnicianQueueView(generics.ListAPIView):
+    """Technicians in the order automatic assignment would pick them, least loaded first."""
+    queryset = Technician.objects.select_related('staff').filter(staff__role='staff').order_by('-available', 'workload', 'staff_id')
+    serializer_class = TechnicianSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['branch', 'available']
+
+
+class TechnicianUpdateView(generics.RetrieveUpdateAPIView):
+    """Set a technician's home branch, or take them out of automatic assignment."""
+    queryset = Technician.objects.select_related('staff')
+    serializer_class = TechnicianSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    lookup_field = 'staff'
+
+
 class RepairRequestCreateView(generics.CreateAPIView):
     queryset = Repair.objects.all()
     serializer_class = RepairCreateSerializer
@@ -54,6 +116,7 @@ class RepairRequestCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save()
+        metrics.repair_event('requested')
     
 class RepairApprovalView(generics.UpdateAPIView):
     queryset = Repair.objects.all()
@@ -61,19 +124,54 @@ class RepairApprovalView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     lookup_field = 'pk'
 
+    def perform_update(self, serializer):
+        repair = serializer.save()
+        metrics.repair_event(repair.status)
+        if repair.status == 'approved':
+            metrics.repair_wait('approval', repair.created_at, repair.approved_at)
+
+class BulkRepairDecisionView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Approve or reject up to 1000 pending repairs at once. Repairs that can't be decided "
+                              "are listed under `failed` with the reason; the rest are decided regardless.",
+        request_body=BulkRepairDecisionSerializer,
+        responses={200: 'Decided and failed repairs', 400: 'Bad Request'}
+    )
+    def post(self, request):
+        serializer = BulkRepairDecisionSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        for repair in result['decided']:
+            metrics.repair_event(repair.status)
+            if repair.status == 'approved':
+                metrics.repair_wait('approval', repair.created_at, repair.approved_at)
+        return Response(serializer.data)
+
 class CompleteRepairView(generics.UpdateAPIView):
     queryset = Repair.objects.all()
     serializer_class = CompleteRepairSerializer
     lookup_field = 'pk'
 
     permission_classes = [permissions.IsAuthenticated, IsAssignedRepairStaff]
+
+    def perform_update(self, serializer):
+        # completing again only replaces the recorded parts
+        first_completion = serializer.instance.status != 'completed'
+        repair = serializer.save()
+        if first_completion:
+            metrics.repair_event('completed')
+            metrics.repair_wait('repair', repair.approved_at, repair.completed_at)
+            metrics.repair_wait('total', repair.created_at, repair.completed_at)
 @swagger_auto_schema(
         request_body=CompleteRepairSerializer,
         responses={200: CompleteRepairSerializer, 400: 'Bad Request'}
     )
     
-class EquipmentRepairHistoryView(generics.ListAPIView):
+class EquipmentRepairHistoryView(RowSerializerMixin, generics.ListAPIView):
     serializer_class = RepairHistorySerializer
+    row_serializer_class = RepairHistoryRowSerializer
     permission_classes = [permissions.IsAuthenticated]
     @swagger_auto_schema(
         request_body=RepairHistorySerializer,
@@ -81,26 +179,122 @@ class EquipmentRepairHistoryView(generics.ListAPIView):
     )
 
     def get_queryset(self):
-        
-        tag_number = self.request.query_params.get('tag_number', None)
-        serial_number = self.request.query_params.get('serial_number', None)
-
-        
-        if tag_number:
-            equipment = get_object_or_404(Equipment, tag_number=tag_number)
-        elif serial_number:
-            equipment = get_object_or_404(Equipment, serial_number=serial_number)
-        else:
-            
+        lookup = history_lookup(self.request.query_params)
+        if lookup is None:
             return Repair.objects.none()
 
-        
-        return Repair.objects.filter(equipment=equipment).order_by('-created_at')
+        equipment = get_object_or_404(Equipment, **lookup)
+        return repair_history_queryset().filter(equipment=equipment).order_by('-created_at')
+
+
+def history_lookup(params):
+    """The Equipment lookup for ?tag_number= or ?serial_number=, or None when neither is given."""
+    tag_number = params.get('tag_number', None)
+    serial_number = params.get('serial_number', None)
+    if tag_number:
+        return {'tag_number': tag_number}
+    if serial_number:
+        return {'serial_number': serial_number}
+    return None
+
+
+def repair_history_queryset():
+    return Repair.objects.select_related('equipment__branch', 'repair_staff') \
+        .prefetch_related(Prefetch('repair_parts', queryset=RepairPart.objects.select_related('part').order_by('pk')))
+
+
+class AsyncEquipmentRepairHistoryView(AsyncAPIView):
+    """EquipmentRepairHistoryView for ASGI deployments."""
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        lookup = history_lookup(request.query_params)
+        if lookup is None:
+            return Response([])
+
+        equipment = await aget_object_or_404(Equipment, **lookup)
+        history = repair_history_queryset().filter(equipment=equipment).order_by('-created_at')
+        if settings.FAST_READ_SERIALIZERS:
+            # many() reads the parts as well
+            return Response(await sync_to_async(RepairHistoryRowSerializer.many)(RepairHistoryRowSerializer.rows(history)))
+        repairs = [repair async for repair in history]
+        return Response(RepairHistorySerializer(repairs, many=True).data)
+
+
+class EquipmentRepairHistoryBatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Repair histories for many scanned devices at once, grouped by equipment",
+        request_body=RepairHistoryBatchSerializer,
+        responses={200: 'Histories grouped by equipment', 400: 'Bad Request'}
+    )
+    def post(self, request):
+        serializer = RepairHistoryBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tag_numbers = serializer.validated_data['tag_numbers']
+        serial_numbers = serializer.validated_data['serial_numbers']
+
+        lookup = Q(tag_number__in=tag_numbers) | Q(serial_number__in=serial_numbers)
+        results = self.fast_results(lookup) if settings.FAST_READ_SERIALIZERS else self.results(lookup)
+        found_tags = {r["equipment"]["tag_number"] for r in results}
+        found_serials = {r["equipment"]["serial_number"] for r in results}
+        return Response({
+            "results": results,
+            "not_found": {
+                "tag_numbers": [t for t in tag_numbers if t not in found_tags],
+                "serial_numbers": [s for s in serial_numbers if s not in found_serials],
+            },
+        })
+
+    def results(self, lookup):
+        equipment = list(Equipment.objects.select_related('branch', 'added_by').filter(lookup).order_by('tag_number'))
+        histories = {e.pk: [] for e in equipment}
+        for repair in repair_history_queryset().filter(equipment__in=equipment).order_by('-created_at'):
+            histories[repair.equipment_id].append(repair)
+        return [
+            {
+                "equipment": EquipmentSerializer(e).data,
+                "repairs": RepairHistorySerializer(histories[e.pk], many=True).data,
+            }
+            for e in equipment
+        ]
+
+    def fast_results(self, lookup):
+        """results() from .values() rows, for FAST_READ_SERIALIZERS."""
+        equipment = EquipmentRowSerializer.many(
+            EquipmentRowSerializer.rows(Equipment.objects.filter(lookup).order_by('tag_number'))
+        )
+        repairs = list(RepairHistoryRowSerializer.rows(
+            repair_history_queryset().filter(equipment__in=[e['id'] for e in equipment]).order_by('-created_at')
+        ))
+        histories = {e['id']: [] for e in equipment}
+        for row, repair in zip(repairs, RepairHistoryRowSerializer.many(repairs)):
+            histories[row['equipment']].append(repair)
+        return [{"equipment": e, "repairs": histories[e['id']]} for e in equipment]
+
     
+def dashboard_scope(params):
+    """stats.scope() for the request's from/to/branch/category, or None when none of them are given."""
+    serializer = StatsScopeSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    return stats.scope(**serializer.validated_data) if serializer.validated_data else None
+
+
 class AdminRepairStatsView(APIView):
     permission_classes = [IsAuthenticated]  
     @swagger_auto_schema(
-        operation_description="Get detailed repair statistics for admins",
+        operation_description="Get detailed repair statistics for admins, optionally for repairs requested in a "
+                              "range of months, at one branch or for one equipment category",
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description="First month (YYYY-MM or a date in it)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('to', openapi.IN_QUERY, description="Last month (YYYY-MM or a date in it)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('branch', openapi.IN_QUERY, description="Branch ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('category', openapi.IN_QUERY, description="Equipment item category",
+                              type=openapi.TYPE_STRING),
+        ],
         responses={
             200: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
@@ -158,86 +352,130 @@ class AdminRepairStatsView(APIView):
 
 
     def get(self, request):
-        repairs = Repair.objects.annotate(month=TruncMonth('created_at')) \
-            .values('month') \
-            .annotate(count=Count('id')) \
-            .order_by('month')
-
-        data = {
-            "labels": [r['month'].strftime('%b %Y') for r in repairs],
-            "values": [r['count'] for r in repairs]
-        }
-        top_staff = Repair.objects.filter(status='completed', repair_staff__isnull=False) \
-           .annotate(full_name=Concat('repair_staff__first_name', Value(' '), 'repair_staff__last_name')) \
-           .values('full_name') \
-           .annotate(count=Count('id')) \
-           .order_by('-count')[:5]
-
-        staff_stats = {
-           "labels": [s['full_name'] for s in top_staff],
-           "values": [s['count'] for s in top_staff]
-       }
-        repairs_by_branch = Repair.objects.filter(equipment__branch__isnull=False) \
-          .values('equipment__branch__name') \
-          .annotate(count=Count('id')) \
-          .order_by('-count')
-
-        branch_stats = {
-           "labels": [b['equipment__branch__name'] for b in repairs_by_branch],
-           "values": [b['count'] for b in repairs_by_branch]
-          }
-        top_parts = RepairPart.objects.values('part__name') \
-            .annotate(total_used=Sum('quantity')) \
-            .order_by('-total_used')[:5]
-
-        part_stats = {
-          "labels": [p['part__name'] for p in top_parts],
-          "values": [p['total_used'] for p in top_parts]
-      }
-        part_branch_data = RepairPart.objects.values(
-            'part__name',
-            'repair__equipment__branch__name'
-        ).annotate(total=Sum('quantity'))
-
-        branch_part_map = defaultdict(lambda: defaultdict(int))
-
-        for row in part_branch_data:
-            part = row['part__name']
-            branch = row['repair__equipment__branch__name']
-            qty = row['total']
-            branch_part_map[part][branch] += qty
-
-        
-        branch_wise_part_stats = []
-        for part_name, branches in list(branch_part_map.items())[:5]:
-            branch_wise_part_stats.append({
-                "part": part_name,
-                "branches": list(branches.keys()),
-                "quantities": list(branches.values())
-            })
-        workload = Repair.objects.filter(
-            status__in=['approved', 'completed', 'pending', 'under_repair'],
-            repair_staff__isnull=False
-        ).annotate(
-            full_name=Concat('repair_staff__first_name', Value(' '), 'repair_staff__last_name')
-        ).values('full_name').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        staff_workload = {
-            "labels": [w['full_name'] for w in workload],
-            "values": [w['count'] for w in workload]
-        }
-        
-        return Response({
-               "monthly_repairs": data,
-               "top_repair_staff": staff_stats,
-               "repairs_by_branch": branch_stats,
-               "top_used_parts": part_stats,
-               "branch_wise_part_usage": branch_wise_part_stats,
-               "staff_workload": staff_workload,
-        })
-    
+        return Response(stats.dashboard_stats(dashboard_scope(request.query_params)))
+
+
+class AsyncAdminRepairStatsView(AsyncAPIView):
+    """AdminRepairStatsView for ASGI deployments, with the dashboard's sections queried concurrently."""
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        return Response(await stats.adashboard_stats(dashboard_scope(request.query_params)))
+
+
+class RepairEventStreamView(AsyncAPIView):
+    """
+    Repair status changes as server-sent events, so clients can stop
+    polling the list and history endpoints. `branch` and `technician`
+    narrow the stream; a reconnecting EventSource sends Last-Event-ID
+    (or pass `last_event_id`) and is first sent what it missed from the
+    repair event log. EventSource can't set headers, so the token may
+    come as `access_token`. Serve it from the ASGI entry point
+    (config.asgi): under WSGI every open stream holds a worker thread.
+    """
+    authentication_classes = [CachedJWTAuthentication, QueryStringJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        serializer = RepairStreamSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        last_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        last_id = int(last_id) if last_id and last_id.isdigit() else None
+
+        response = StreamingHttpResponse(self.stream(last_id, **serializer.validated_data), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx would otherwise hold events back until its buffer fills
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, last_id, branch_id=None, staff_id=None):
+        def accepts(event):
+            return (branch_id is None or event['branch'] == branch_id) and \
+                (staff_id is None or event['repair_staff'] == staff_id)
+
+        # subscribed before the replay, so nothing committed in between is lost
+        with broker.subscribe(accepts) as subscription:
+            yield 'retry: 3000\n\n'
+            # page through the log until it has nothing newer, however long the client was away
+            while last_id is not None:
+                missed = await sync_to_async(events.since)(last_id, branch_id, staff_id, events.REPLAY_LIMIT)
+                for event in missed:
+                    yield event_message(event)
+                    last_id = event['id']
+                if len(missed) < events.REPLAY_LIMIT:
+                    break
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    # fell too far behind; the client reconnects and catches up from the log
+                    return
+                if last_id is None or event['id'] > last_id:
+                    yield event_message(event)
+
+
+def event_message(event):
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+
+class RepairTimelineView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Every status change of a repair, oldest first, with who made it and how long the "
+                              "repair waited before it",
+        responses={200: 'The repair id and its events', 404: 'Repair not found'}
+    )
+    def get(self, request, repair_id):
+        timeline = events.timeline(repair_id)
+        # every repair has at least the event of its request
+        if not timeline:
+            raise Http404("Repair not found")
+        return Response({'repair': repair_id, 'status': timeline[-1]['to_status'], 'events': timeline})
+
+
+class RepairSlaStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Decision, repair and turnaround times and SLA breaches, from the repair event log. "
+                              "Filter by branch, item_category and requested_after / requested_before (ISO datetimes).",
+        responses={200: 'Counts, averages in seconds and breached SLAs', 400: 'Bad filter'}
+    )
+    def get(self, request):
+        filterset = RepairEventFilter(request.query_params, queryset=RepairEvent.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(events.sla_summary(filterset.qs))
+
+
+class AdminEndpointMetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Per-route query counts, SQL time, duplicate queries and response bytes since this worker started",
+        responses={200: 'Metrics keyed by route name'}
+    )
+    def get(self, request):
+        return Response(route_metrics.snapshot())
+
+
+def pdf_response(request, kind, target):
+    digest = pdf.fingerprint(kind, target)
+    etag = quote_etag(digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        _, filename = pdf.RENDERERS[kind]
+        response = HttpResponse(pdf.render_cached(kind, target, digest), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename(target)}"'
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 
 class EquipmentRepairPDFView(APIView):
     permission_classes = [IsAuthenticated]
@@ -255,20 +493,8 @@ class EquipmentRepairPDFView(APIView):
     )
 
     def get(self, request, equipment_id):
-        equipment = get_object_or_404(Equipment, pk=equipment_id)
-        repairs = equipment.repairs.filter(status='completed').order_by('-completed_at')
-
-        html_string = render_to_string('repair_pdf.html', {
-            'equipment': equipment,
-            'repairs': repairs
-        })
-
-        html = HTML(string=html_string)
-        pdf = html.write_pdf()
-
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="equipment_{equipment.tag_number}_repairs.pdf"'
-        return response
+        equipment = get_object_or_404(Equipment.objects.select_related('branch'), pk=equipment_id)
+        return pdf_response(request, 'equipment_history', equipment)
 
 
 class RepairReceiptPDFView(APIView):
@@ -287,15 +513,139 @@ class RepairReceiptPDFView(APIView):
         responses={200: 'PDF file of repair receipt', 404: 'Repair not found or not completed'}
     )
     def get(self, request, repair_id):
-        repair = get_object_or_404(Repair, pk=repair_id, status="completed")
+        repair = get_object_or_404(
+            Repair.objects.select_related('equipment__branch', 'repair_staff'), pk=repair_id, status="completed"
+        )
+        return pdf_response(request, 'receipt', repair)
+
+
+class BranchRepairPDFExportView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Download the repair history of every equipment at a branch, as a ZIP of one PDF "
+                              "per equipment (`zip`) or as one merged PDF (`pdf`)",
+        manual_parameters=[
+            openapi.Parameter('branch_id', openapi.IN_PATH, description="ID of the branch",
+                              type=openapi.TYPE_INTEGER, required=True),
+        ],
+        responses={200: 'ZIP or PDF file', 400: 'Too many equipment to merge', 404: 'Branch not found',
+                   501: 'Merged PDFs are not available'}
+    )
+    def get(self, request, branch_id, bundle):
+        branch = get_object_or_404(Branch, pk=branch_id)
+        if bundle == 'pdf' and not pdf_export.can_merge():
+            return Response({"error": "Merged PDFs need pypdf installed on the server; download the ZIP instead."},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        histories = pdf_export.histories(branch)
+        if bundle == 'pdf' and len(histories) > settings.PDF_MERGE_MAX_DOCUMENTS:
+            # the merge is held in memory
+            return Response(
+                {"error": f"Branch {branch.pk} has {len(histories)} equipment; merged PDFs are limited to "
+                          f"{settings.PDF_MERGE_MAX_DOCUMENTS}. Download the ZIP instead."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        documents = pdf_export.documents(histories, settings.PDF_EXPORT_PROCESSES)
+        if bundle == 'zip':
+            response = StreamingHttpResponse(pdf_export.zip_stream(documents), content_type='application/zip')
+        else:
+            response = StreamingHttpResponse(pdf_export.merged_stream(documents), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="branch_{branch.pk}_repairs.{bundle}"'
+        return response
+
+
+class PdfJobQuerysetMixin:
+    def get_queryset(self):
+        jobs = PdfRenderJob.objects.all()
+        if self.request.user.role != 'admin':
+            jobs = jobs.filter(requested_by=self.request.user)
+        return jobs
+
+
+class PdfJobCreateView(generics.CreateAPIView):
+    serializer_class = PdfRenderJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Queue a PDF render; poll the returned job until it is done, then download it",
+        request_body=PdfRenderJobSerializer,
+        responses={202: PdfRenderJobSerializer, 400: 'Bad Request'}
+    )
+    def post(self, request, *args, **kwargs):
+        response = self.create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class PdfJobDetailView(PdfJobQuerysetMixin, generics.RetrieveAPIView):
+    serializer_class = PdfRenderJobSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'pk'
 
-        html_string = render_to_string('repair_receipt.html', {
-            'repair': repair
-        })
 
-        html = HTML(string=html_string)
-        pdf = html.write_pdf()
+class PdfJobDownloadView(PdfJobQuerysetMixin, APIView):
+    permission_classes = [IsAuthenticated]
 
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="repair_{repair.id}_receipt.pdf"'
-        return response
\ No newline at end of file
+    @swagger_auto_schema(
+        operation_description="Download the PDF produced by a finished render job",
+        responses={200: 'PDF file', 404: 'Job not found', 409: 'Job not finished yet'}
+    )
+    def get(self, request, pk):
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        if job.status != 'done':
+            return Response({"error": f"Job is {job.status}.", "status": job.status}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename, content_type='application/pdf')
+
+
+class RepairExportView(ExportView):
+    queryset = Repair.objects.order_by('id')
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = RepairExportFilter
+    filename = 'repairs'
+    columns = (
+        'id', 'equipment_id', 'equipment__tag_number', 'equipment__branch__name', 'status', 'remark', 'report',
+        'staff__username', 'repair_staff__username', 'created_at', 'approved_at', 'completed_at', 'parts',
+    )
+
+    def get_rows(self, queryset):
+        """
+        Merge-join the repairs with their parts, both read in id order
+        through chunked cursors, so no repair's parts are held longer
+        than its own row.
+        """
+        repairs = queryset.values(*self.columns[:-1]).iterator(chunk_size=CHUNK_SIZE)
+        parts = RepairPart.objects.filter(repair__in=queryset.values('id')) \
+            .order_by('repair_id', 'id') \
+            .values_list('repair_id', 'part__name', 'quantity') \
+            .iterator(chunk_size=CHUNK_SIZE)
+
+        pending = next(parts, None)
+        for repair in repairs:
+            repair['parts'] = []
+            while pending is not None and pending[0] <= repair['id']:
+                if pending[0] == repair['id']:
+                    repair['parts'].append({'part_name': pending[1], 'quantity': pending[2]})
+                pending = next(parts, None)
+            yield repair
+
+    def csv_row(self, row):
+        values = super().csv_row(row)
+        values[-1] = '; '.join(f"{p['part_name']} x{p['quantity']}" for p in row['parts'])
+        return values
+
+
+class PartUsageExportView(ExportView):
+    queryset = RepairPart.objects.all()
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = RepairPartExportFilter
+    filename = 'parts_usage'
+    columns = ('part_id', 'part__name', 'branch', 'repairs', 'total_quantity')
+
+    def get_rows(self, queryset):
+        return queryset.values('part_id', 'part__name', branch=F('repair__equipment__branch__name')) \
+            .annotate(repairs=Count('repair', distinct=True), total_quantity=Sum('quantity')) \
+            .order_by('part__name', 'branch') \
+            .iterator(chunk_size=CHUNK_SIZE)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+from .models import Staff
+
+# the password hash stays deferred; it is only loaded when a view needs it
+CACHED_FIELDS = [f.attname for f in Staff._meta.concrete_fields if f.attname != 'password']
+# the CACHES alias the rows live in; see STAFF_CACHE_BACKEND
+ALIAS = 'staff'
+
+
+def ttl():
+    return getattr(settings, 'STAFF_CACHE_TTL', 30)
+
+
+def key(user_id):
+    return f'staff-row:{user_id}'
+
+
+def get_row(user_id):
+    return caches[ALIAS].get(key(user_id))
+
+
+def load_row(user_id):
+    row = Staff.objects.filter(pk=user_id).values_list(*CACHED_FIELDS).first()
+    if row is not None:
+        caches[ALIAS].set(key(user_id), row, ttl())
+    return row
+
+
+def get_staff(user_id):
+    """A Staff instance for user_id built from the cache, or None if no such row."""
+    # token claims carry the id as a string; signals invalidate by the int pk
+    try:
+        user_id = Staff._meta.pk.to_python(user_id)
+    except ValidationError:
+        return None
+    row = get_row(user_id) or load_row(user_id)
+    if row is None:
+        return None
+    return Staff.from_db(Staff.objects.db, CACHED_FIELDS, row)
+
+
+def invalidate(user_id):
+    caches[ALIAS].delete(key(user_id))
+
+
+def clear():
+    caches[ALIAS].clear()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from Staff import outbox
+
+
+class Command(BaseCommand):
+    help = ("Send queued mail (password reset codes) in batches over one SMTP connection per batch, "
+            "retrying failed messages with exponential backoff.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE,
+                            help="Messages claimed and sent per SMTP connection.")
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Seconds an idle worker waits before checking the outbox again.")
+        parser.add_argument('--drain', action='store_true',
+                            help="Exit once nothing is due instead of waiting for new mail.")
+
+    def handle(self, *args, **options):
+        purged = outbox.purge_finished()
+        if purged:
+            self.stdout.write(f"Purged {purged} finished messages.")
+
+        sent, retrying, failed = outbox.work(
+            batch_size=options['batch_size'], poll_interval=options['poll_interval'], drain=options['drain']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent}, {retrying} to retry, {failed} failed."))
@@ -38,14 +38,46 @@ class Meta:
         verbose_name_plural = "Staff"
 
 class PasswordResetCode(models.Model):
+    LIFETIME = timedelta(minutes=10)
+
     user = models.ForeignKey('Staff', on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def is_expired(self):
-        return timezone.now() > self.created_at + timedelta(minutes=10)
+        return timezone.now() > self.created_at + self.LIFETIME
 
     def __str__(self):
         return f'{self.user.email} - {self.code}'
 
 
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('sending', 'Sending'),
+    ('sent', 'Sent'),
+    ('failed', 'Failed'),
+]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # a claimed batch is marked with its worker's token
+    claim = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # mail that is useless after this, like a reset code past its lifetime, is not sent late
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
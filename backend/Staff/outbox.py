@@ -0,0 +1,147 @@
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# the first retry waits BASE_BACKOFF, then twice as long each time up to MAX_BACKOFF
+BASE_BACKOFF = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+# a batch whose worker died is picked up again after this long
+SEND_TIMEOUT = timedelta(minutes=5)
+RETENTION = timedelta(days=1)
+
+
+def enqueue(to, subject, body, from_email='', expires_at=None):
+    return OutboundEmail.objects.create(
+        to=to, subject=subject, body=body, from_email=from_email, expires_at=expires_at
+    )
+
+
+def backoff(attempts):
+    return min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def due(now):
+    return Q(status='queued', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=now - SEND_TIMEOUT)
+
+
+def claim_batch(size=BATCH_SIZE):
+    """
+    Move up to `size` due messages to 'sending' under a fresh claim token
+    and return them. The UPDATE re-checks that each row is still due, so
+    when two workers race for the same rows only one of them gets each.
+    It also counts the attempt, so a message whose worker keeps dying
+    mid-send still runs out of attempts.
+    """
+    now = timezone.now()
+    OutboundEmail.objects.filter(status='queued', expires_at__lt=now) \
+        .update(status='failed', last_error="Expired before it could be sent.")
+    OutboundEmail.objects.filter(due(now), status='sending', attempts__gte=MAX_ATTEMPTS) \
+        .update(status='failed', claim='', last_error="Sending timed out.")
+
+    candidates = list(
+        OutboundEmail.objects.filter(due(now)).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:size]
+    )
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(due(now), pk__in=candidates).update(
+        status='sending', claim=token, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(OutboundEmail.objects.filter(pk__in=candidates, claim=token, status='sending').order_by('pk'))
+
+
+def is_permanent(exc):
+    """5xx replies (unknown mailbox, refused sender) would fail the same way on every retry."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def describe(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+
+def deliver(messages):
+    """
+    Send claimed messages over one SMTP connection, reconnecting once if
+    the server drops it mid-batch, and record how each one went. Returns
+    (sent, retrying, failed) counts.
+    """
+    sent, errors = [], {}
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for message in messages:
+            try:
+                EmailMessage(
+                    message.subject, message.body, message.from_email or None, [message.to], connection=connection
+                ).send()
+            except smtplib.SMTPServerDisconnected as exc:
+                errors[message.pk] = exc
+                connection.close()
+                connection.open()
+            except (smtplib.SMTPException, OSError) as exc:
+                errors[message.pk] = exc
+            else:
+                sent.append(message)
+    except (smtplib.SMTPException, OSError) as exc:
+        # could not (re)connect; nothing after this point went out
+        for message in messages:
+            if message not in sent:
+                errors.setdefault(message.pk, exc)
+    finally:
+        connection.close()
+    return record(messages, errors)
+
+
+def record(messages, errors):
+    now = timezone.now()
+    retrying = failed = 0
+    for message in messages:
+        message.claim = ''
+        exc = errors.get(message.pk)
+        if exc is None:
+            message.status, message.sent_at, message.last_error = 'sent', now, ''
+        elif is_permanent(exc) or message.attempts >= MAX_ATTEMPTS:
+            message.status, message.last_error = 'failed', describe(exc)
+            failed += 1
+        else:
+            message.status, message.last_error = 'queued', describe(exc)
+            message.next_attempt_at = now + backoff(message.attempts)
+            retrying += 1
+    OutboundEmail.objects.bulk_update(
+        messages, ['status', 'claim', 'sent_at', 'last_error', 'next_attempt_at']
+    )
+    return len(messages) - retrying - failed, retrying, failed
+
+
+def work(batch_size=BATCH_SIZE, poll_interval=5.0, drain=False):
+    """Claim and send batches until stopped, or until nothing is due if `drain`."""
+    totals = [0, 0, 0]
+    while True:
+        close_old_connections()
+        batch = claim_batch(batch_size)
+        if not batch:
+            if drain:
+                return tuple(totals)
+            time.sleep(poll_interval)
+            continue
+        for i, count in enumerate(deliver(batch)):
+            totals[i] += count
+
+
+def purge_finished(older_than=RETENTION):
+    """Drop delivered and abandoned mail, which may hold reset codes, once it is no use to anyone."""
+    return OutboundEmail.objects.filter(
+        status__in=['sent', 'failed'], created_at__lt=timezone.now() - older_than
+    ).delete()[0]
@@ -2,7 +2,7 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
 from .models import Staff , PasswordResetCode
 import random
-from django.core.mail import send_mail
+from . import outbox
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -112,14 +112,14 @@ class RequestPasswordResetSerializer(serializers.Serializer):
 
     def save(self):
         code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-        PasswordResetCode.objects.create(user=self.user, code=code)
+        reset_code = PasswordResetCode.objects.create(user=self.user, code=code)
 
-        send_mail(
+        # sent by the send_queued_email worker, so the request never waits on SMTP
+        outbox.enqueue(
+            to=self.user.email,
             subject='Your Password Reset Code',
-            message=f'Your password reset code is: {code}',
-            from_email='your_email@gmail.com',
-            recipient_list=[self.user.email],
-            fail_silently=False
+            body=f'Your password reset code is: {code}',
+            expires_at=reset_code.created_at + PasswordResetCode.LIFETIME,
         )
 
 class VerifyResetCodeSerializer(serializers.Serializer):
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Staff
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_cached_staff(sender, instance, **kwargs):
+    cache.invalidate(instance.pk)
+    # again once the change is visible, in case a request cached the old row in between
+    transaction.on_commit(lambda pk=instance.pk: cache.invalidate(pk))
@@ -1,3 +1,236 @@
-from django.test import TestCase
+import io
+import os
+import smtplib
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache, outbox
+from .models import Staff, OutboundEmail
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Staff.objects.create_user(
+            username='tech', email='tech@gmail.com', password='pass-1234', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def ping_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('ping'))
+        return response, len(ctx.captured_queries)
+
+    def test_user_row_is_loaded_once(self):
+        response, first = self.ping_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(first, 1)
+        response, second = self.ping_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(second, 0)
+
+    def test_cached_user_behaves_like_the_model(self):
+        self.ping_queries()
+        user = cache.get_staff(self.user.pk)
+        self.assertIsInstance(user, Staff)
+        self.assertEqual(user, self.user)
+        self.assertEqual((user.role, user.username, user.first_name), ('staff', 'tech', 'Abebe'))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass-1234'))
+
+    def test_saving_staff_invalidates_cache(self):
+        self.ping_queries()
+        Staff.objects.get(pk=self.user.pk).save()
+        self.assertIsNone(cache.get_row(self.user.pk))
+
+        self.user.role = 'admin'
+        self.user.save()
+        self.assertEqual(cache.get_staff(self.user.pk).role, 'admin')
+
+    def test_shared_backend_round_trips_rows_and_invalidation(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            cache.ALIAS: {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            response, first = self.ping_queries()
+            self.assertEqual((response.status_code, first), (200, 1))
+            self.assertEqual(cache.get_staff(self.user.pk), self.user)
+            self.assertEqual(len(os.listdir(location)), 1)
+
+            self.user.is_active = False
+            self.user.save()
+            self.assertEqual(os.listdir(location), [])
+            self.assertEqual(self.ping_queries()[0].status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.ping_queries()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.ping_queries()
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile_update_through_cached_user(self):
+        self.ping_queries()
+        response = self.client.put(reverse('update-profile'), {'username': 'tech2', 'password': 'new-pass-987'})
+        self.assertEqual(response.status_code, 200)
+        user = Staff.objects.get(pk=self.user.pk)
+        self.assertEqual(user.username, 'tech2')
+        self.assertEqual(user.first_name, 'Abebe')
+        self.assertTrue(user.check_password('new-pass-987'))
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """locmem that counts connections and raises scripted errors for chosen recipients."""
+    opened = 0
+    failures = {}
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            errors = self.failures.get(message.to[0])
+            if errors:
+                raise errors.pop(0)
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='Staff.tests.FlakyBackend')
+class OutboxTests(TestCase):
+    def setUp(self):
+        FlakyBackend.opened = 0
+        FlakyBackend.failures = {}
+
+    def enqueue(self, count, **kwargs):
+        return [outbox.enqueue(f'user{i}@gmail.com', 'Subject', f'Body {i}', **kwargs) for i in range(count)]
+
+    def make_due(self):
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_batches_share_one_connection(self):
+        self.enqueue(120)
+        self.assertEqual(outbox.work(batch_size=50, drain=True), (120, 0, 0))
+        self.assertEqual(FlakyBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 120)
+        self.assertEqual(OutboundEmail.objects.filter(status='sent', attempts=1, claim='').count(), 120)
+
+    def test_transient_failures_back_off_then_send(self):
+        message, = self.enqueue(1)
+        FlakyBackend.failures = {message.to: [smtplib.SMTPResponseException(421, b'try later')] * 2}
+
+        self.assertEqual(outbox.deliver(outbox.claim_batch()), (0, 1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('queued', 1))
+        self.assertIn('try later', message.last_error)
+        self.assertAlmostEqual(message.next_attempt_at - timezone.now(), outbox.BASE_BACKOFF,
+                               delta=timedelta(seconds=5))
+        # not due again until the backoff has passed
+        self.assertEqual(outbox.claim_batch(), [])
+
+        self.make_due()
+        outbox.deliver(outbox.claim_batch())
+        message.refresh_from_db()
+        self.assertAlmostEqual(message.next_attempt_at - timezone.now(), outbox.BASE_BACKOFF * 2,
+                               delta=timedelta(seconds=5))
+
+        self.make_due()
+        self.assertEqual(outbox.deliver(outbox.claim_batch()), (1, 0, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('sent', 3, ''))
+
+    def test_permanent_failures_and_exhausted_retries_give_up(self):
+        refused, flaky = self.enqueue(2)
+        FlakyBackend.failures = {
+            refused.to: [smtplib.SMTPRecipientsRefused({refused.to: (550, b'no such user')})],
+            flaky.to: [smtplib.SMTPResponseException(451, b'busy')] * outbox.MAX_ATTEMPTS,
+        }
+        for _ in range(outbox.MAX_ATTEMPTS):
+            self.make_due()
+            outbox.deliver(outbox.claim_batch())
+        refused.refresh_from_db()
+        flaky.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('failed', 1))
+        self.assertEqual((flaky.status, flaky.attempts), ('failed', outbox.MAX_ATTEMPTS))
+
+    def test_dropped_connection_is_reopened_for_the_rest_of_the_batch(self):
+        messages = self.enqueue(3)
+        FlakyBackend.failures = {messages[0].to: [smtplib.SMTPServerDisconnected('gone')]}
+        self.assertEqual(outbox.deliver(outbox.claim_batch()), (2, 1, 0))
+        self.assertEqual(FlakyBackend.opened, 2)
+
+    def test_claims_do_not_overlap_and_stale_claims_are_recovered(self):
+        self.enqueue(3)
+        first, second = outbox.claim_batch(2), outbox.claim_batch(2)
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse({m.pk for m in first} & {m.pk for m in second})
+        self.assertEqual(outbox.claim_batch(), [])
+
+        OutboundEmail.objects.filter(pk=first[0].pk).update(claimed_at=timezone.now() - outbox.SEND_TIMEOUT * 2)
+        self.assertEqual([m.pk for m in outbox.claim_batch()], [first[0].pk])
+
+    def test_worker_dying_mid_send_uses_up_attempts(self):
+        message, = self.enqueue(1)
+        for attempt in range(1, outbox.MAX_ATTEMPTS + 1):
+            # claimed, then never recorded
+            self.assertEqual([m.attempts for m in outbox.claim_batch()], [attempt])
+            OutboundEmail.objects.update(claimed_at=timezone.now() - outbox.SEND_TIMEOUT * 2)
+
+        self.assertEqual(outbox.claim_batch(), [])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.claim), ('failed', outbox.MAX_ATTEMPTS, ''))
+
+    def test_expired_mail_is_not_sent(self):
+        self.enqueue(1, expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.work(drain=True), (0, 0, 0))
+        self.assertEqual(OutboundEmail.objects.get().status, 'failed')
+        self.assertEqual(mail.outbox, [])
+
+
+class PasswordResetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Staff.objects.create_user(
+            username='tech', email='tech@gmail.com', password='pass-1234', first_name='Abebe', last_name='Kebede', role='staff'
+        )
+
+    def test_request_only_enqueues_and_the_worker_delivers(self):
+        response = self.client.post(reverse('request-reset'), {'email': self.user.email}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual((queued.to, queued.status), (self.user.email, 'queued'))
+        self.assertIsNotNone(queued.expires_at)
+
+        call_command('send_queued_email', drain=True, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+        code = mail.outbox[0].body.rsplit(' ', 1)[1]
+        response = self.client.post(reverse('verify-reset'),
+                                    {'email': self.user.email, 'code': code, 'new_password': 'new-pass-99'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-99'))
+
+    def test_old_mail_is_purged(self):
+        message = outbox.enqueue(self.user.email, 'Subject', 'Body')
+        OutboundEmail.objects.filter(pk=message.pk).update(status='sent', created_at=timezone.now() - timedelta(days=2))
+        outbox.enqueue(self.user.email, 'Subject', 'Body')
+        self.assertEqual(outbox.purge_finished(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
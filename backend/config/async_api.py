@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class AsyncAPIView(View):
+    """
+    The parts of DRF's APIView the async read endpoints need: its
+    authentication and permission classes, exception handler, filter
+    backends and JSON rendering, around `async def` handlers. DRF views
+    themselves are sync only, so under ASGI they tie up a thread each for
+    the whole request; these only hand the ORM calls to one.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    filter_backends = ()
+    renderer = JSONRenderer()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            # authentication may load the Staff row, so it runs in the request's sync thread
+            self.request = await sync_to_async(self.initialize_request)(request)
+            response = await super().dispatch(self.request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(response)
+
+    def initialize_request(self, request):
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        return request
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = [auth() for auth in self.authentication_classes]
+            header = authenticators and authenticators[0].authenticate_header(self.request)
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = 403
+
+        response = api_settings.EXCEPTION_HANDLER(exc, {'view': self, 'request': self.request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, response):
+        if isinstance(response, Response):
+            response.accepted_renderer = self.renderer
+            response.accepted_media_type = self.renderer.media_type
+            response.renderer_context = {'view': self, 'request': self.request, 'response': response}
+            response.render()
+        return response
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
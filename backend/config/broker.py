@@ -0,0 +1,164 @@
+import asyncio
+import atexit
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+# events a subscriber may fall behind by before its stream is ended
+QUEUE_SIZE = 1000
+DATAGRAM_SIZE = 65507
+
+
+class Subscription:
+    """One listener's queue. Events arrive on the event loop it subscribed from."""
+
+    def __init__(self, broker, accepts, loop, size=QUEUE_SIZE):
+        self.broker = broker
+        self.accepts = accepts
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def offer(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # too slow to keep up: drop what is queued and tell the reader to stop
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        """The next event, or None once the subscription has overflowed."""
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Broker:
+    """
+    Publish/subscribe for this process. Events are JSON-able dicts;
+    publish() may be called from any thread and each subscriber receives
+    them on its own event loop. When EVENT_BROKER_DIR is set, a process
+    with subscribers also listens on a localhost UDP port it records as
+    EVENT_BROKER_DIR/<pid>.port, and every publish is relayed to the
+    ports found there, so several workers on one server (or WSGI workers
+    next to an ASGI one) see each other's events without a shared broker.
+    """
+
+    def __init__(self, directory=None, pid=None):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._directory = directory
+        self._pid = pid
+        # (socket, pid, port file) while this process is listening
+        self._relay = None
+
+    @property
+    def directory(self):
+        directory = self._directory or getattr(settings, 'EVENT_BROKER_DIR', None)
+        return directory and Path(directory)
+
+    @property
+    def pid(self):
+        # looked up each time so forked workers don't listen on their parent's port
+        return self._pid or os.getpid()
+
+    def subscribe(self, accepts=None):
+        """Subscribe from the running event loop to the events `accepts` returns true for (default: all)."""
+        subscription = Subscription(self, accepts or (lambda event: True), asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        self.listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        self.deliver(event)
+        self.relay(event)
+
+    def deliver(self, event):
+        """Hand `event` to the subscribers in this process."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.accepts(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # its loop has closed
+                self.unsubscribe(subscription)
+
+    def relay(self, event):
+        directory = self.directory
+        if not directory or not directory.is_dir():
+            return
+        data = json.dumps(event).encode()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            for path in directory.glob('*.port'):
+                if path.stem == str(self.pid):
+                    continue
+                try:
+                    sender.sendto(data, ('127.0.0.1', int(path.read_text())))
+                except (OSError, ValueError):
+                    # a worker that went away without tidying up
+                    continue
+
+    def listen(self):
+        directory = self.directory
+        if not directory:
+            return
+        with self._lock:
+            if self._relay and self._relay[1] == self.pid:
+                return
+            receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            receiver.bind(('127.0.0.1', 0))
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'{self.pid}.port'
+            path.write_text(str(receiver.getsockname()[1]))
+            self._relay = (receiver, self.pid, path)
+        threading.Thread(target=self.receive, args=(receiver,), daemon=True, name='event-relay').start()
+
+    def receive(self, receiver):
+        while True:
+            try:
+                data, _ = receiver.recvfrom(DATAGRAM_SIZE)
+            except OSError:
+                # stop() closed the socket
+                return
+            try:
+                self.deliver(json.loads(data))
+            except ValueError:
+                continue
+
+    def stop(self):
+        """Stop listening for other processes' events and withdraw the port file."""
+        with self._lock:
+            relay, self._relay = self._relay, None
+        if relay:
+            receiver, pid, path = relay
+            receiver.close()
+            if pid == self.pid:
+                path.unlink(missing_ok=True)
+
+
+broker = Broker()
+atexit.register(broker.stop)
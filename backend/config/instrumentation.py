@@ -0,0 +1,190 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+
+current_collector = ContextVar('current_collector', default=None)
+
+
+def fingerprint(sql):
+    """Collapse variable-length IN lists so the same query shape matches itself."""
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+class QueryCollector:
+    """A connection.execute_wrapper that counts and times every query of a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.duration += time.perf_counter() - started
+                self.count += 1
+                self.shapes[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Queries that repeat an earlier shape in the same request, the N+1 signature."""
+        return sum(n - 1 for n in self.shapes.values() if n > 1)
+
+    def wrap(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+@contextmanager
+def collecting():
+    """Count this thread's queries against the request being served, for work it hands to other threads."""
+    collector = current_collector.get()
+    if collector is None:
+        yield
+        return
+    with collector.wrap():
+        yield
+
+
+class RouteMetrics:
+    """Per-route totals and maxima, aggregated in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, queries, sql_time, duplicates, size):
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_time': 0.0, 'max_sql_time': 0.0,
+                'duplicates': 0, 'response_bytes': 0,
+            })
+            entry['requests'] += 1
+            entry['queries'] += queries
+            entry['max_queries'] = max(entry['max_queries'], queries)
+            entry['sql_time'] += sql_time
+            entry['max_sql_time'] = max(entry['max_sql_time'], sql_time)
+            entry['duplicates'] += duplicates
+            entry['response_bytes'] += size
+
+    def snapshot(self):
+        with self._lock:
+            return {route: dict(entry) for route, entry in self._routes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match and match.view_name) or 'unresolved'
+
+
+class QueryMetricsMiddleware:
+    """
+    Counts and times the SQL each request runs and records it against the
+    route name. With QUERY_METRICS_HEADERS on (DEBUG by default) the numbers
+    are also returned as X-DB-* response headers. Requests over their
+    QUERY_BUDGETS entry are logged as warnings. Latency and query totals
+    also feed the /metrics histograms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        collector = QueryCollector()
+        token = current_collector.set(collector)
+        try:
+            with collector.wrap():
+                response = self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.respond(request, response, collector, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        collector = QueryCollector()
+        token = current_collector.set(collector)
+        # the ORM runs in the request's sync_to_async thread, so that is whose connections get wrapped
+        hooks = await sync_to_async(collector.wrap)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(hooks.close)()
+            current_collector.reset(token)
+        return self.respond(request, response, collector, started)
+
+    def respond(self, request, response, collector, started):
+        if response.streaming:
+            # the body, and the queries behind it, are produced after we return
+            stream = self.astream if response.is_async else self.stream
+            response.streaming_content = stream(request, response.streaming_content, collector, started)
+            return response
+
+        self.finish(request, response, collector, started, len(response.content))
+        if getattr(settings, 'QUERY_METRICS_HEADERS', settings.DEBUG):
+            response['X-DB-Queries'] = collector.count
+            response['X-DB-Time'] = f'{collector.duration * 1000:.2f}ms'
+            response['X-DB-Duplicates'] = collector.duplicates
+        return response
+
+    def stream(self, request, content, collector, started):
+        size = 0
+        with collector.wrap():
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.finish(request, None, collector, started, size)
+
+    async def astream(self, request, content, collector, started):
+        size = 0
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        self.finish(request, None, collector, started, size)
+
+    def finish(self, request, response, collector, started, size):
+        route = route_name(request)
+        route_metrics.record(route, collector.count, collector.duration, collector.duplicates, size)
+        metrics.registry.observe('http_request_duration_seconds', [route, request.method], time.perf_counter() - started)
+        metrics.registry.inc('http_request_queries_total', [route], collector.count)
+        if response is not None:
+            response.query_metrics = collector
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(route)
+        if budget is not None and collector.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d, %d duplicates)", route, collector.count, budget, collector.duplicates
+            )
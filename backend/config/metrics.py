@@ -0,0 +1,170 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+WAIT_BUCKETS = (60, 300, 900, 3600, 4 * 3600, 12 * 3600, 86400, 3 * 86400, 7 * 86400, 14 * 86400, 30 * 86400)
+
+# name -> (type, help, label names, histogram buckets)
+METRICS = {
+    'repairs_total': (
+        'counter', "Repair workflow transitions.", ('event',), None,
+    ),
+    'repair_wait_seconds': (
+        'histogram', "Time a repair spent waiting for approval, for the repair itself, and in total.",
+        ('stage',), WAIT_BUCKETS,
+    ),
+    'http_request_duration_seconds': (
+        'histogram', "Request latency per route.", ('route', 'method'), LATENCY_BUCKETS,
+    ),
+    'http_request_queries_total': (
+        'counter', "SQL queries run per route.", ('route',), None,
+    ),
+}
+
+
+class Registry:
+    """
+    Counters and histograms for this process. When METRICS_DIR is set each
+    process also writes its values to METRICS_DIR/<pid>.json (at most once
+    per METRICS_FLUSH_INTERVAL, and at exit), and a scrape sums every file,
+    so any worker can answer for the whole deployment.
+    """
+
+    def __init__(self, directory=None, pid=None):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._last_flush = 0.0
+        self._directory = directory
+        self._pid = pid
+
+    @property
+    def directory(self):
+        directory = self._directory or getattr(settings, 'METRICS_DIR', None)
+        return directory and Path(directory)
+
+    @property
+    def pid(self):
+        # looked up each time so forked workers don't share their parent's file
+        return self._pid or os.getpid()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        key = (name, tuple(labels))
+        with self._lock:
+            # per-bucket counts with +Inf last, then sum and count
+            entry = self._values.setdefault(key, [0] * (len(buckets) + 1) + [0.0, 0])
+            entry[bisect_left(buckets, value)] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        self.maybe_flush()
+
+    def dump(self):
+        with self._lock:
+            return [[name, list(labels), value] for (name, labels), value in self._values.items()]
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            self.flush()
+
+    def flush(self):
+        directory = self.directory
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(self.dump(), tmp)
+        os.replace(tmp_path, directory / f'{self.pid}.json')
+
+    def collect(self):
+        """Values summed over every process, with this one's taken live."""
+        dumps = [self.dump()]
+        if self.directory:
+            for path in self.directory.glob('*.json'):
+                if path.stem == str(self.pid):
+                    continue
+                try:
+                    dumps.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        totals = {}
+        for dump in dumps:
+            for name, labels, value in dump:
+                key = (name, tuple(labels))
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    totals[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def label_text(names, values, extra=()):
+    pairs = [f'{n}="{escape(v)}"' for n, v in [*zip(names, values), *extra]]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def exposition(totals):
+    """Render collected values in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (metric, labels), value in sorted(totals.items()):
+            if metric != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{label_text(label_names, labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], value):
+                cumulative += count
+                lines.append(f'{name}_bucket{label_text(label_names, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{label_text(label_names, labels)} {value[-2]}')
+            lines.append(f'{name}_count{label_text(label_names, labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def repair_event(event):
+    registry.inc('repairs_total', [event])
+
+
+def repair_wait(stage, start, end):
+    if start and end:
+        registry.observe('repair_wait_seconds', [stage], max((end - start).total_seconds(), 0))
@@ -0,0 +1,33 @@
+"""Independent blocking database work run side by side from async code."""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+from .instrumentation import collecting
+
+
+def in_own_connection(function):
+    def run():
+        with collecting():
+            try:
+                return function()
+            finally:
+                # worker threads never see request_finished, so expire their connections here
+                close_old_connections()
+    return run
+
+
+async def gather(*functions):
+    """
+    Run independent blocking ORM functions at the same time, each in a
+    worker thread with its own database connection, and return their
+    results in order. Inside a transaction (ATOMIC_REQUESTS, tests) other
+    connections can't see its writes, so the functions run one after
+    another on the request's own connection instead.
+    """
+    if await sync_to_async(lambda: connection.in_atomic_block)():
+        return [await sync_to_async(function)() for function in functions]
+    return await asyncio.gather(
+        *(sync_to_async(in_own_connection(function), thread_sensitive=False)() for function in functions)
+    )
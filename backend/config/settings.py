@@ -1,8 +1,10 @@
+import importlib.util
 import os
 from decouple import config, Csv
 from pathlib import Path 
 from datetime import timedelta
 from django.core.mail import send_mail
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.instrumentation.QueryMetricsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,12 +70,57 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+DATABASE_ENGINE = config("DATABASE_ENGINE", default="sqlite")
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config("DATABASE_NAME"),
+            "USER": config("DATABASE_USER"),
+            "PASSWORD": config("DATABASE_PASSWORD"),
+            "HOST": config("DATABASE_HOST", default="localhost"),
+            "PORT": config("DATABASE_PORT", default="5432"),
+            # keep connections open between requests instead of reconnecting every time
+            "CONN_MAX_AGE": config("DATABASE_CONN_MAX_AGE", default=60, cast=int),
+            "CONN_HEALTH_CHECKS": True,
+        }
     }
-}
+    if config("DATABASE_POOL", default=False, cast=bool):
+        # Django's built-in pool needs psycopg 3 with psycopg-pool, and replaces persistent connections
+        if importlib.util.find_spec("psycopg_pool") is None:
+            raise ImproperlyConfigured('DATABASE_POOL needs psycopg 3: pip install "psycopg[binary,pool]"')
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": config("DATABASE_POOL_MIN_SIZE", default=2, cast=int),
+                "max_size": config("DATABASE_POOL_MAX_SIZE", default=10, cast=int),
+                "timeout": config("DATABASE_POOL_TIMEOUT", default=10, cast=int),
+            },
+        }
+elif DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config("DATABASE_NAME", default=str(BASE_DIR / "db.sqlite3")),
+        }
+    }
+    if config("DATABASE_SQLITE_TUNING", default=True, cast=bool):
+        DATABASES["default"]["OPTIONS"] = {
+            # run on every new connection
+            "init_command": ";".join([
+                "PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=NORMAL",
+                f"PRAGMA busy_timeout={config('DATABASE_SQLITE_BUSY_TIMEOUT', default=5000, cast=int)}",
+                f"PRAGMA mmap_size={config('DATABASE_SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int)}",
+                "PRAGMA temp_store=MEMORY",
+            ]),
+            # take the write lock when a transaction starts, so concurrent
+            # writers queue on busy_timeout instead of failing mid-transaction
+            "transaction_mode": "IMMEDIATE",
+        }
+else:
+    raise ImproperlyConfigured(f"DATABASE_ENGINE must be 'postgresql' or 'sqlite', not '{DATABASE_ENGINE}'.")
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -82,12 +130,14 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'yohanness1621@gmail.com'  
 EMAIL_HOST_PASSWORD = 'hnvu dygg znua erzn' 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# only the send_queued_email worker talks to SMTP; don't let a dead server hang it
+EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", default=30, cast=int)
 
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  
+        'Staff.authentication.CachedJWTAuthentication',  
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',  
@@ -119,13 +169,67 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
+# the Staff rows CachedJWTAuthentication builds request users from. A save or delete
+# drops the row from this cache, which only reaches every worker when the backend is
+# shared (e.g. django.core.cache.backends.redis.RedisCache); with the per-process
+# default, other workers may go on using a changed row for up to STAFF_CACHE_TTL seconds
+STAFF_CACHE_TTL = config("STAFF_CACHE_TTL", default=30, cast=int)
+STAFF_CACHE_BACKEND = config("STAFF_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "staff": {
+        "BACKEND": STAFF_CACHE_BACKEND,
+        "LOCATION": config("STAFF_CACHE_LOCATION", default="staff"),
+        "TIMEOUT": STAFF_CACHE_TTL,
+    },
+}
+if STAFF_CACHE_BACKEND.endswith(".LocMemCache"):
+    CACHES["staff"]["OPTIONS"] = {"MAX_ENTRIES": 10_000}
 
 
 
+# repair SLAs: a decision on each request, and completion, within this long of the request
+REPAIR_DECISION_SLA = timedelta(hours=config("REPAIR_DECISION_SLA_HOURS", default=24, cast=float))
+REPAIR_TURNAROUND_SLA = timedelta(hours=config("REPAIR_TURNAROUND_SLA_HOURS", default=120, cast=float))
+
 CORS_ALLOW_ALL_ORIGINS = True
 AUTH_USER_MODEL = "Staff.Staff"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+PDF_CACHE_MAX_BYTES = config("PDF_CACHE_MAX_BYTES", default=200 * 1024 * 1024, cast=int)
+# render processes for branch PDF exports, shared by the requests of one web process; 0 renders in the request.
+# Every web worker starts its own pool, so keep workers x processes within the cores the server has.
+PDF_EXPORT_PROCESSES = config("PDF_EXPORT_PROCESSES", default=0, cast=int)
+# most equipment histories in one merged branch PDF, which is built in memory; the ZIP has no limit
+PDF_MERGE_MAX_DOCUMENTS = config("PDF_MERGE_MAX_DOCUMENTS", default=200, cast=int)
+
+# build list and history responses from .values() rows instead of DRF serializers (config/rows.py); same output
+FAST_READ_SERIALIZERS = config("FAST_READ_SERIALIZERS", default=False, cast=bool)
+QUERY_METRICS_HEADERS = config("QUERY_METRICS_HEADERS", default=DEBUG, cast=bool)
+# set METRICS_DIR when running several worker processes so /metrics sums all of them
+METRICS_DIR = config("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=1.0, cast=float)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# set EVENT_BROKER_DIR when running several worker processes so every live stream sees every repair change
+EVENT_BROKER_DIR = config("EVENT_BROKER_DIR", default="")
+# seconds between keep-alive comments on an idle stream
+EVENT_STREAM_KEEPALIVE = config("EVENT_STREAM_KEEPALIVE", default=15.0, cast=float)
+# most queries a request to each route may run, including the Staff row
+# lookup on a cold authentication cache
+QUERY_BUDGETS = {
+    'equipment-list': 2,
+    'equipment-list-async': 2,
+    'equipment-detail': 2,
+    'equipment-repair-history': 4,
+    'equipment-repair-history-async': 4,
+    'equipment-repair-history-batch': 4,
+    'admin-stats': 8,
+    'admin-stats-async': 8,
+    'repair-request': 13,
+    'repair-approve': 15,
+    'repair-approve-bulk': 15,
+    'repair-complete': 28,
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -0,0 +1,18 @@
+from django.conf import settings
+
+
+class QueryBudgetMixin:
+    """Assertions against the numbers QueryMetricsMiddleware attaches to test client responses."""
+
+    def assertWithinQueryBudget(self, response, allow_duplicates=0):
+        route = response.resolver_match.view_name
+        metrics = response.query_metrics
+        budget = settings.QUERY_BUDGETS[route]
+        self.assertLessEqual(
+            metrics.count, budget,
+            f"{route} ran {metrics.count} queries, budget {budget}:\n" + "\n".join(metrics.shapes),
+        )
+        self.assertLessEqual(
+            metrics.duplicates, allow_duplicates,
+            f"{route} repeated queries: " + "\n".join(s for s, n in metrics.shapes.items() if n > 1),
+        )
@@ -5,6 +5,7 @@ from django.conf import settings
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
+from config.metrics import metrics_view
 
 
 schema_view = get_schema_view(
@@ -25,6 +26,7 @@ urlpatterns = [
     path('api/Staff/', include('Staff.urls')),
     path('api/', include('Equipments.urls')),
     path('api/Repairs/', include('Repairs.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),